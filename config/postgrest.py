@@ -0,0 +1,277 @@
+"""Async PostgREST client on one shared, pooled HTTP client.
+
+supabase-py 2.3's query builders are synchronous, so awaiting them blocked
+the event loop and every call went out on its own connection. Here every
+query goes through a single httpx.AsyncClient per event loop, with HTTP/2
+(when the server offers it over TLS) and keep-alive, so concurrent queries
+share a few warm connections. Independent queries can then be fanned out
+with asyncio.gather().
+
+    db = AsyncPostgrest(url, key)
+    profile, beats = await asyncio.gather(
+        db.table('profiles').select('*').eq('id', user_id).single().execute(),
+        db.table('beats').select('*').eq('created_by', user_id).order('created_at', desc=True).limit(20).execute(),
+    )
+
+Requests carry the project key; call auth(access_token) on a query to send
+it as a signed-in user instead, so row level security applies to them.
+
+Reads are retried on timeouts, dropped connections and 429/502/503/504
+responses, with exponential backoff and full jitter. Writes are only
+retried when the connection failed before the request was sent, so they
+never run twice.
+"""
+import asyncio
+import random
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import httpx
+
+RETRY_STATUSES = {429, 502, 503, 504}
+# Failures where the server never saw the request, so even writes can be resent
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+RETRYABLE_ERRORS = UNSENT_ERRORS + (httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+
+class PostgrestError(Exception):
+    """An error response from PostgREST"""
+
+    def __init__(self, status: int, message: str, code: Optional[str] = None,
+                 details: Optional[str] = None, hint: Optional[str] = None):
+        super().__init__(f'{status} {code}: {message}' if code else f'{status}: {message}')
+        self.status = status
+        self.message = message
+        self.code = code
+        self.details = details
+        self.hint = hint
+
+
+class Response:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _value(value: Any) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _quote(text: str) -> str:
+    # PostgREST reads \ and " inside a double-quoted list item as escapes, and commas and parentheses as text
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class Query:
+    """One request to a table or function, built up by chaining then sent with execute()"""
+
+    def __init__(self, client: 'AsyncPostgrest', table: str):
+        self._client = client
+        self._path = table
+        self._method = 'GET'
+        self._params: List[tuple] = []
+        self._headers: Dict[str, str] = {}
+        self._body: Any = None
+        self._read_only = True
+
+    # Verbs
+
+    def select(self, columns: str = '*', count: Optional[str] = None) -> 'Query':
+        self._params.append(('select', columns))
+        if count:
+            self._prefer(f'count={count}')
+        return self
+
+    def insert(self, rows: Union[Dict, List[Dict]], returning: bool = True) -> 'Query':
+        self._method, self._body = 'POST', rows
+        self._read_only = False
+        self._prefer('return=representation' if returning else 'return=minimal')
+        return self
+
+    def upsert(self, rows: Union[Dict, List[Dict]], on_conflict: str, ignore_duplicates: bool = False,
+               returning: bool = True) -> 'Query':
+        """Insert `rows`; those clashing with an existing row on the unique `on_conflict`
+        columns update it, or are skipped (and not returned) with `ignore_duplicates`"""
+        self.insert(rows, returning)
+        self._params.append(('on_conflict', on_conflict))
+        self._prefer('resolution=ignore-duplicates' if ignore_duplicates else 'resolution=merge-duplicates')
+        return self
+
+    def update(self, values: Dict, returning: bool = True) -> 'Query':
+        self._method, self._body = 'PATCH', values
+        self._read_only = False
+        self._prefer('return=representation' if returning else 'return=minimal')
+        return self
+
+    def delete(self, returning: bool = False) -> 'Query':
+        self._method = 'DELETE'
+        self._read_only = False
+        self._prefer('return=representation' if returning else 'return=minimal')
+        return self
+
+    # Filters
+
+    def eq(self, column: str, value: Any) -> 'Query':
+        return self._filter(column, f'eq.{_value(value)}')
+
+    def neq(self, column: str, value: Any) -> 'Query':
+        return self._filter(column, f'neq.{_value(value)}')
+
+    def gt(self, column: str, value: Any) -> 'Query':
+        return self._filter(column, f'gt.{_value(value)}')
+
+    def lt(self, column: str, value: Any) -> 'Query':
+        return self._filter(column, f'lt.{_value(value)}')
+
+    def in_(self, column: str, values: Iterable[Any]) -> 'Query':
+        quoted = ','.join(f'"{_quote(_value(value))}"' for value in values)
+        return self._filter(column, f'in.({quoted})')
+
+    def is_(self, column: str, value: Optional[bool]) -> 'Query':
+        return self._filter(column, f'is.{_value(value)}')
+
+    # Shaping
+
+    def order(self, column: str, desc: bool = False, nulls_last: bool = False) -> 'Query':
+        direction = f'{column}.{"desc" if desc else "asc"}{".nullslast" if nulls_last else ""}'
+        self._params.append(('order', direction))
+        return self
+
+    def limit(self, count: int) -> 'Query':
+        self._params.append(('limit', str(count)))
+        return self
+
+    def range(self, start: int, end: int) -> 'Query':
+        """Rows `start` to `end`, both inclusive, like supabase-py"""
+        self._params.append(('offset', str(start)))
+        self._params.append(('limit', str(end - start + 1)))
+        return self
+
+    def auth(self, access_token: Optional[str]) -> 'Query':
+        """Send as the user a Supabase session JWT belongs to; None keeps the project key"""
+        if access_token:
+            self._headers['Authorization'] = f'Bearer {access_token}'
+        return self
+
+    def single(self) -> 'Query':
+        """Return one object instead of a list; an error unless exactly one row matches"""
+        self._headers['Accept'] = 'application/vnd.pgrst.object+json'
+        return self
+
+    async def execute(self) -> Response:
+        return await self._client.request(self._method, self._path, self._params, self._headers, self._body,
+                                          retry=self._read_only)
+
+    def _filter(self, column: str, expression: str) -> 'Query':
+        self._params.append((column, expression))
+        return self
+
+    def _prefer(self, preference: str):
+        existing = self._headers.get('Prefer')
+        self._headers['Prefer'] = f'{existing},{preference}' if existing else preference
+
+
+class AsyncPostgrest:
+    """PostgREST at `url` (a Supabase project URL or a bare PostgREST server)"""
+
+    def __init__(self, url: str, key: Optional[str] = None, rest_path: str = '/rest/v1',
+                 timeout: float = 10.0, connect_timeout: float = 3.0,
+                 max_connections: int = 100, max_keepalive: int = 20, keepalive_expiry: float = 30.0,
+                 retries: int = 3, backoff: float = 0.1, backoff_cap: float = 2.0, http2: bool = True):
+        self.base_url = url.rstrip('/') + rest_path
+        self.headers = {'Accept': 'application/json'}
+        if key:
+            self.headers.update({'apikey': key, 'Authorization': f'Bearer {key}'})
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.http2 = http2
+        self.retried = 0
+        # An AsyncClient's connections belong to the event loop that opened them
+        self._clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+    def table(self, name: str) -> Query:
+        return Query(self, name)
+
+    from_ = table
+
+    def rpc(self, function: str, params: Optional[Dict] = None, read_only: bool = False) -> Query:
+        """Call a database function; `read_only` ones are retried like reads"""
+        query = Query(self, f'rpc/{function}')
+        query._method, query._body, query._read_only = 'POST', params or {}, read_only
+        return query
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            # Loops that asyncio.run() has finished with can no longer use theirs
+            for finished in [other for other in self._clients if other.is_closed()]:
+                del self._clients[finished]
+            client = self._clients[loop] = httpx.AsyncClient(
+                base_url=self.base_url, headers=self.headers, timeout=self.timeout,
+                limits=self.limits, http2=self.http2)
+        return client
+
+    async def request(self, method: str, path: str, params=(), headers=None, body=None,
+                      retry: Optional[bool] = None) -> Response:
+        """Send one request; `retry` failed ones that may have reached the server (default: GET only)"""
+        idempotent = method in ('GET', 'HEAD') if retry is None else retry
+        attempt = 0
+        while True:
+            try:
+                response = await self.http.request(method, f'/{path}', params=list(params),
+                                                   headers=headers, json=body)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.retries or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                    raise
+                delay = None
+            else:
+                if response.status_code < 400:
+                    return Response(response.json() if response.content else None, _count(response))
+                if attempt >= self.retries or not idempotent or response.status_code not in RETRY_STATUSES:
+                    raise _error(response)
+                delay = _retry_after(response)
+            attempt += 1
+            self.retried += 1
+            # Full jitter: spread retries from many callers instead of having them stampede together
+            await asyncio.sleep(delay if delay is not None else
+                                random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt)))
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for loop, client in clients.items():
+            if loop is asyncio.get_running_loop():
+                await client.aclose()
+
+
+def _count(response: httpx.Response) -> Optional[int]:
+    # Content-Range: 0-19/342 when a count was asked for
+    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get('Retry-After', '')
+    try:
+        return min(float(value), 30.0)
+    except ValueError:
+        return None
+
+
+def _error(response: httpx.Response) -> PostgrestError:
+    try:
+        body = response.json()
+    except ValueError:
+        body = {'message': response.text}
+    if not isinstance(body, dict):
+        body = {'message': str(body)}
+    return PostgrestError(response.status_code, body.get('message') or response.reason_phrase,
+                          body.get('code'), body.get('details'), body.get('hint'))
@@ -1,7 +1,9 @@
 import os
 from typing import Optional
 from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
 from dotenv import load_dotenv
+from config.postgrest import AsyncPostgrest
 
 load_dotenv()
 
@@ -29,20 +31,52 @@ class SupabaseConfig:
         # Storage settings
         self.storage_bucket: str = os.getenv('STORAGE_BUCKET', 'beats')
         self.max_file_size: int = int(os.getenv('MAX_FILE_SIZE', '50000000'))  # 50MB
-        
+
+        # Data API (PostgREST) client settings
+        self.data_timeout: float = float(os.getenv('SUPABASE_DATA_TIMEOUT', '10'))  # seconds
+        self.data_connect_timeout: float = float(os.getenv('SUPABASE_DATA_CONNECT_TIMEOUT', '3'))
+        self.data_retries: int = int(os.getenv('SUPABASE_DATA_RETRIES', '3'))
+        self.data_max_connections: int = int(os.getenv('SUPABASE_DATA_MAX_CONNECTIONS', '100'))
+        self.data_http2: bool = os.getenv('SUPABASE_DATA_HTTP2', 'true').lower() == 'true'
+        # Reads shared between concurrent callers and cached briefly; writes and realtime events invalidate them
+        self.read_cache_ttl: float = float(os.getenv('SUPABASE_READ_CACHE_TTL', '5'))  # seconds
+        self.read_cache_size: int = int(os.getenv('SUPABASE_READ_CACHE_SIZE', '2048'))
+        # Single-row likes, follows, comments and notifications arriving within this window share one insert; 0 turns it off
+        self.write_batch_window: float = float(os.getenv('SUPABASE_WRITE_BATCH_MS', '5')) / 1000
+        self.write_batch_max: int = int(os.getenv('SUPABASE_WRITE_BATCH_MAX', '500'))
+
+        self._client: Optional[Client] = None
+        self._data_client: Optional[AsyncPostgrest] = None
+
     def get_client(self) -> Client:
-        """Get Supabase client instance with current configuration"""
-        options = {
-            'auto_refresh_token': self.auto_refresh_token,
-            'persist_session': self.persist_session,
-            'realtime': {
+        """Shared Supabase client (auth, storage, realtime) with current configuration"""
+        if self._client is not None:
+            return self._client
+        options = ClientOptions(
+            auto_refresh_token=self.auto_refresh_token,
+            persist_session=self.persist_session,
+            realtime={
                 'enabled': self.enable_realtime,
                 'timeout': self.realtime_timeout
             }
-        }
-        
-        return create_client(self.url, self.key, options)
-        
+        )
+
+        self._client = create_client(self.url, self.key, options)
+        return self._client
+
+    def get_data_client(self) -> AsyncPostgrest:
+        """Shared async client for the tables and functions behind the Data API"""
+        if self._data_client is None:
+            self._data_client = AsyncPostgrest(
+                self.url, self.key,
+                timeout=self.data_timeout,
+                connect_timeout=self.data_connect_timeout,
+                retries=self.data_retries,
+                max_connections=self.data_max_connections,
+                http2=self.data_http2,
+            )
+        return self._data_client
+
     def get_storage_client(self) -> Optional[Client]:
         """Get Supabase storage client if storage is configured"""
         if not self.storage_bucket:
@@ -1,36 +1,148 @@
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+import asyncio
+import copy
 import json
+import threading
 from supabase import create_client, Client
-from config.supabase import supabase_config
+from config.postgrest import AsyncPostgrest, PostgrestError
+from config.supabase import supabase_config, CHANNELS
+from services.read_cache import ReadCache
+from services.write_batcher import WriteBatcher
+from services.waveform import peaks_to_json
+
+# Tables each cached read draws on, so writes to any of them invalidate it
+FEED_TABLES = ("beats", "profiles", "likes", "comments")
+TIMELINE_TABLES = FEED_TABLES + ("follows", "timelines")
+# Unique constraints (migrations 002) that repeated likes and follows are skipped on
+UNIQUE_KEYS = {
+    "likes": ("beat_id", "user_id"),
+    "follows": ("follower_id", "following_id"),
+}
 
 class SupabaseClient:
-    def __init__(self):
-        self.client: Client = supabase_config.get_client()
-        
+    """Musicstagram's data access on Supabase.
+
+    Table and function calls go through the shared async PostgREST client
+    (config/postgrest.py), so they never block the event loop and can be
+    awaited together. supabase-py's auth client is synchronous, so auth
+    calls run in a worker thread.
+
+    Profile, beat and feed reads go through a ReadCache: concurrent
+    identical reads share one request and results are kept for a few
+    seconds. Row level security can show each user different rows, so
+    reads are only shared between callers with the same access token. Write methods invalidate the tables they touch, and
+    listen_for_changes() does the same for changes made elsewhere.
+
+    Likes, follows, comments and notifications can be written many rows
+    to a request (like_beats(), notify_users(), ...). The single-row
+    methods go through a WriteBatcher, so concurrent ones made within a
+    few milliseconds of each other also share one insert.
+
+    Requests go out with the project key unless the client is acting for
+    a user: as_user(session access token) returns one whose requests carry
+    that user's JWT, so row level security sees auth.uid(). Batched writes
+    are grouped per token, so one request never mixes users' rows.
+    """
+
+    def __init__(self, client: Optional[Client] = None, db: Optional[AsyncPostgrest] = None,
+                 cache: Optional[ReadCache] = None, batch_window: Optional[float] = None,
+                 access_token: Optional[str] = None):
+        self.client: Client = client or supabase_config.get_client()
+        self.db: AsyncPostgrest = db or supabase_config.get_data_client()
+        self.cache = cache or ReadCache(maxsize=supabase_config.read_cache_size,
+                                        ttl=supabase_config.read_cache_ttl)
+        if batch_window is None:
+            batch_window = supabase_config.write_batch_window
+        # A rejected batch (say one comment on a deleted beat) is retried row by row; outages are not
+        self.access_token = access_token
+        self.writer: Optional[WriteBatcher] = WriteBatcher(
+            self._send_batch, window=batch_window, max_batch=supabase_config.write_batch_max,
+            isolate=lambda e: isinstance(e, PostgrestError) and e.status < 500,
+        ) if batch_window > 0 else None
+
+    def as_user(self, access_token: Optional[str]) -> "SupabaseClient":
+        """This client acting for the signed-in user `access_token` (their session JWT) belongs to;
+        it shares connections, cache and write batches with this one"""
+        user = copy.copy(self)
+        user.access_token = access_token
+        return user
+
+    def _table(self, name: str):
+        return self.db.table(name).auth(self.access_token)
+
+    def _rpc(self, function: str, params: Dict[str, Any], read_only: bool = False):
+        return self.db.rpc(function, params, read_only=read_only).auth(self.access_token)
+
+    async def _read(self, key: tuple, tables: tuple, query) -> Any:
+        async def fetch():
+            return (await query.execute()).data
+        # The token itself, not its unverified subject, so a forged JWT cannot hit another user's entry
+        return await self.cache.get((self.access_token,) + key, tables, fetch)
+
+    async def _write(self, query, *tables: str):
+        try:
+            return await query.execute()
+        finally:
+            # Even a failed write may have been applied
+            self.cache.invalidate(*tables)
+
+    async def _insert_many(self, table: str, rows: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Insert `rows` in one request; the stored row for each, or None for a duplicate that was skipped"""
+        if not rows:
+            return []
+        keys = UNIQUE_KEYS.get(table)
+        if keys is None:
+            response = await self._write(self._table(table).insert(rows), table)
+            return response.data
+        response = await self._write(self._table(table).upsert(
+            rows, on_conflict=",".join(keys), ignore_duplicates=True), table)
+        written = {tuple(str(row[key]) for key in keys): row for row in response.data}
+        return [written.get(tuple(str(row[key]) for key in keys)) for row in rows]
+
+    async def _send_batch(self, key: tuple, rows: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        table, access_token = key
+        return await self.as_user(access_token)._insert_many(table, rows)
+
+    async def _insert(self, table: str, row: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Insert one row, batched with the same user's concurrent inserts into `table`;
+        [stored row], or [] if a duplicate"""
+        if self.writer is not None:
+            stored = await self.writer.submit((table, self.access_token), row)
+        else:
+            stored = (await self._insert_many(table, [row]))[0]
+        return [stored] if stored is not None else []
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Read cache hits, misses, coalesced reads and invalidations"""
+        return self.cache.stats()
+
     # Authentication Methods
     async def sign_up(self, email: str, password: str, username: str) -> Dict[str, Any]:
         """Register a new user"""
         try:
             # Create auth user
-            auth_response = await self.client.auth.sign_up({
+            auth_response = await asyncio.to_thread(self.client.auth.sign_up, {
                 "email": email,
                 "password": password
             })
             
             if auth_response.user:
-                # Create profile
+                # Create profile, as the new user so the insert policy applies
+                session = auth_response.session
+                user = self.as_user(session.access_token if session else None)
                 profile_data = {
                     "id": auth_response.user.id,
                     "email": email,
                     "username": username
                 }
                 
-                await self.client.from_("profiles").insert(profile_data)
+                await user._write(user._table("profiles").insert(profile_data), "profiles")
                 
                 return {
                     "success": True,
                     "user": auth_response.user,
+                    "session": session,
                     "profile": profile_data
                 }
             
@@ -42,16 +154,18 @@ class SupabaseClient:
     async def sign_in(self, email: str, password: str) -> Dict[str, Any]:
         """Sign in a user"""
         try:
-            auth_response = await self.client.auth.sign_in_with_password({
+            auth_response = await asyncio.to_thread(self.client.auth.sign_in_with_password, {
                 "email": email,
                 "password": password
             })
             
             if auth_response.user:
-                profile = await self.get_profile(auth_response.user.id)
+                session = auth_response.session
+                profile = await self.as_user(session.access_token).get_profile(auth_response.user.id)
                 return {
                     "success": True,
                     "user": auth_response.user,
+                    "session": session,
                     "profile": profile
                 }
                 
@@ -63,7 +177,7 @@ class SupabaseClient:
     async def sign_out(self) -> Dict[str, Any]:
         """Sign out the current user"""
         try:
-            await self.client.auth.sign_out()
+            await asyncio.to_thread(self.client.auth.sign_out)
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -72,15 +186,15 @@ class SupabaseClient:
     async def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get a user's profile"""
         try:
-            response = await self.client.from_("profiles").select("*").eq("id", user_id).single()
-            return response.data
+            return await self._read(("profile", user_id), ("profiles",),
+                                    self._table("profiles").select("*").eq("id", user_id).single())
         except Exception:
             return None
             
     async def update_profile(self, user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Update a user's profile"""
         try:
-            response = await self.client.from_("profiles").update(data).eq("id", user_id)
+            response = await self._write(self._table("profiles").update(data).eq("id", user_id), "profiles")
             return {"success": True, "profile": response.data}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -95,7 +209,7 @@ class SupabaseClient:
                 "pattern": json.dumps(data.get("pattern", {}))
             }
             
-            response = await self.client.from_("beats").insert(beat_data)
+            response = await self._write(self._table("beats").insert(beat_data), "beats")
             return {"success": True, "beat": response.data}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -103,8 +217,8 @@ class SupabaseClient:
     async def get_beat(self, beat_id: str) -> Optional[Dict[str, Any]]:
         """Get a beat by ID"""
         try:
-            response = await self.client.from_("beats").select("*, profiles(*)").eq("id", beat_id).single()
-            return response.data
+            return await self._read(("beat", beat_id), ("beats", "profiles"),
+                                    self._table("beats").select("*, profiles(*)").eq("id", beat_id).single())
         except Exception:
             return None
             
@@ -114,7 +228,17 @@ class SupabaseClient:
             if "pattern" in data:
                 data["pattern"] = json.dumps(data["pattern"])
                 
-            response = await self.client.from_("beats").update(data).eq("id", beat_id).eq("created_by", user_id)
+            response = await self._write(self._table("beats").update(data).eq("id", beat_id).eq("created_by", user_id), "beats")
+            return {"success": True, "beat": response.data}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+            
+    async def update_waveform(self, beat_id: str, peaks: bytes) -> Dict[str, Any]:
+        """Store precomputed waveform peaks (services.waveform format) in beats.waveform_data"""
+        try:
+            response = await self._write(self._table("beats").update({
+                "waveform_data": peaks_to_json(peaks)
+            }).eq("id", beat_id), "beats")
             return {"success": True, "beat": response.data}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -122,7 +246,7 @@ class SupabaseClient:
     async def delete_beat(self, beat_id: str, user_id: str) -> Dict[str, Any]:
         """Delete a beat"""
         try:
-            await self.client.from_("beats").delete().eq("id", beat_id).eq("created_by", user_id)
+            await self._write(self._table("beats").delete().eq("id", beat_id).eq("created_by", user_id), "beats")
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -137,7 +261,7 @@ class SupabaseClient:
                 "role": role
             }
             
-            response = await self.client.from_("collaborations").insert(collab_data)
+            response = await self._write(self._table("collaborations").insert(collab_data), "collaborations")
             return {"success": True, "collaboration": response.data}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -145,29 +269,29 @@ class SupabaseClient:
     async def get_collaborations(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all collaborations for a user"""
         try:
-            response = await self.client.from_("collaborations").select("*, beats(*), profiles(*)").eq("user_id", user_id)
+            response = await self._table("collaborations").select("*, beats(*), profiles(*)").eq("user_id", user_id).execute()
             return response.data
         except Exception:
             return []
             
     # Social Methods
     async def like_beat(self, beat_id: str, user_id: str) -> Dict[str, Any]:
-        """Like a beat"""
+        """Like a beat; liking it again changes nothing"""
         try:
             like_data = {
                 "beat_id": beat_id,
                 "user_id": user_id
             }
             
-            response = await self.client.from_("likes").insert(like_data)
-            return {"success": True, "like": response.data}
+            stored = await self._insert("likes", like_data)
+            return {"success": True, "like": stored}
         except Exception as e:
             return {"success": False, "error": str(e)}
             
     async def unlike_beat(self, beat_id: str, user_id: str) -> Dict[str, Any]:
         """Unlike a beat"""
         try:
-            await self.client.from_("likes").delete().eq("beat_id", beat_id).eq("user_id", user_id)
+            await self._write(self._table("likes").delete().eq("beat_id", beat_id).eq("user_id", user_id), "likes")
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -181,41 +305,72 @@ class SupabaseClient:
                 "content": content
             }
             
-            response = await self.client.from_("comments").insert(comment_data)
-            return {"success": True, "comment": response.data}
+            stored = await self._insert("comments", comment_data)
+            return {"success": True, "comment": stored}
         except Exception as e:
             return {"success": False, "error": str(e)}
             
     async def follow_user(self, follower_id: str, following_id: str) -> Dict[str, Any]:
-        """Follow a user"""
+        """Follow a user; following them again changes nothing"""
         try:
             follow_data = {
                 "follower_id": follower_id,
                 "following_id": following_id
             }
             
-            response = await self.client.from_("follows").insert(follow_data)
-            return {"success": True, "follow": response.data}
+            stored = await self._insert("follows", follow_data)
+            return {"success": True, "follow": stored}
         except Exception as e:
             return {"success": False, "error": str(e)}
             
     async def unfollow_user(self, follower_id: str, following_id: str) -> Dict[str, Any]:
         """Unfollow a user"""
         try:
-            await self.client.from_("follows").delete().eq("follower_id", follower_id).eq("following_id", following_id)
+            await self._write(self._table("follows").delete().eq("follower_id", follower_id).eq("following_id", following_id), "follows")
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
             
+    async def like_beats(self, likes: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Like many beats in one request; `likes` are {"beat_id", "user_id"} rows, repeats are skipped"""
+        try:
+            stored = await self._insert_many("likes", likes)
+            return {"success": True, "likes": [row for row in stored if row is not None]}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+            
+    async def add_comments(self, comments: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Add many comments in one request; `comments` are {"beat_id", "user_id", "content"} rows"""
+        try:
+            stored = await self._insert_many("comments", comments)
+            return {"success": True, "comments": stored}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+            
+    async def follow_users(self, follower_id: str, following_ids: List[str]) -> Dict[str, Any]:
+        """Follow many users in one request; ones already followed are skipped"""
+        try:
+            stored = await self._insert_many("follows", [
+                {"follower_id": follower_id, "following_id": following_id}
+                for following_id in following_ids
+            ])
+            return {"success": True, "follows": [row for row in stored if row is not None]}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+            
     # Feed Methods
-    async def get_feed(self, user_id: str, page: int = 1, limit: int = 20) -> List[Dict[str, Any]]:
-        """Get user's feed"""
+    async def get_feed(self, user_id: str, limit: int = 20, before_at: Optional[str] = None,
+                       before_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get user's home feed (migration 006), newest first, or everyone's public beats while
+        they follow nobody; pass the created_at and id of the last beat shown as `before_at`
+        and `before_id` for the next page"""
         try:
-            offset = (page - 1) * limit
-            response = await self.client.from_("beats").select(
-                "*, profiles(*), likes(count), comments(count)"
-            ).order("created_at", desc=True).range(offset, offset + limit)
-            return response.data
+            return await self._read(("feed", user_id, before_at, before_id, limit), TIMELINE_TABLES, self._rpc("home_feed", {
+                "viewer": user_id,
+                "before_at": before_at,
+                "before_id": before_id,
+                "result_limit": limit
+            }, read_only=True).select("*, profiles(*), likes(count), comments(count)"))
         except Exception:
             return []
             
@@ -223,9 +378,33 @@ class SupabaseClient:
         """Get a specific user's beats"""
         try:
             offset = (page - 1) * limit
-            response = await self.client.from_("beats").select(
+            return await self._read(("user_feed", user_id, offset, limit), FEED_TABLES, self._table("beats").select(
                 "*, profiles(*), likes(count), comments(count)"
-            ).eq("created_by", user_id).order("created_at", desc=True).range(offset, offset + limit)
+            ).eq("created_by", user_id).order("created_at", desc=True).range(offset, offset + limit - 1))
+        except Exception:
+            return []
+            
+    # Search Methods
+    async def search_profiles(self, query: str, page: int = 1, limit: int = 20) -> List[Dict[str, Any]]:
+        """Full-text search over usernames and bios, best match first"""
+        try:
+            response = await self._rpc("search_profiles", {
+                "query": query,
+                "result_limit": limit,
+                "result_offset": (page - 1) * limit
+            }, read_only=True).execute()
+            return response.data
+        except Exception:
+            return []
+            
+    async def search_beats(self, query: str, page: int = 1, limit: int = 20) -> List[Dict[str, Any]]:
+        """Full-text search over beat titles, styles and descriptions, best match first"""
+        try:
+            response = await self._rpc("search_beats", {
+                "query": query,
+                "result_limit": limit,
+                "result_offset": (page - 1) * limit
+            }, read_only=True).execute()
             return response.data
         except Exception:
             return []
@@ -241,17 +420,33 @@ class SupabaseClient:
                 "beat_id": beat_id
             }
             
-            response = await self.client.from_("notifications").insert(notification_data)
-            return {"success": True, "notification": response.data}
+            stored = await self._insert("notifications", notification_data)
+            return {"success": True, "notification": stored}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+            
+    async def create_notifications(self, notifications: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create many notifications in one request; each row has user_id, type, actor_id and beat_id"""
+        try:
+            stored = await self._insert_many("notifications", notifications)
+            return {"success": True, "notifications": stored}
         except Exception as e:
             return {"success": False, "error": str(e)}
             
+    async def notify_users(self, user_ids: List[str], type: str, actor_id: str,
+                           beat_id: Optional[str] = None) -> Dict[str, Any]:
+        """Send the same notification to several users (say a beat's collaborators) in one request"""
+        return await self.create_notifications([
+            {"user_id": user_id, "type": type, "actor_id": actor_id, "beat_id": beat_id}
+            for user_id in dict.fromkeys(user_ids) if user_id != actor_id
+        ])
+            
     async def get_notifications(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
         """Get user's notifications"""
         try:
-            response = await self.client.from_("notifications").select(
+            response = await self._table("notifications").select(
                 "*, actor:profiles(*), beats(*)"
-            ).eq("user_id", user_id).order("created_at", desc=True).limit(limit)
+            ).eq("user_id", user_id).order("created_at", desc=True).limit(limit).execute()
             return response.data
         except Exception:
             return []
@@ -259,12 +454,56 @@ class SupabaseClient:
     async def mark_notifications_read(self, user_id: str) -> Dict[str, Any]:
         """Mark all notifications as read"""
         try:
-            await self.client.from_("notifications").update(
-                {"is_read": True}
-            ).eq("user_id", user_id).eq("is_read", False)
+            await self._write(self._table("notifications").update(
+                {"is_read": True}, returning=False
+            ).eq("user_id", user_id).eq("is_read", False), "notifications")
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    # Composite Pages
+    async def get_profile_page(self, user_id: str, viewer_id: Optional[str] = None,
+                               limit: int = 20) -> Dict[str, Any]:
+        """Profile, latest beats and (on your own profile) notifications, fetched concurrently"""
+        own_profile = viewer_id is not None and viewer_id == user_id
+        profile, beats, notifications = await asyncio.gather(
+            self.get_profile(user_id),
+            self.get_user_feed(user_id, limit=limit),
+            self.get_notifications(user_id) if own_profile else asyncio.sleep(0, result=[]),
+        )
+        return {"profile": profile, "beats": beats, "notifications": notifications}
+
+    # Realtime Invalidation
+    def handle_change(self, payload: Dict[str, Any]):
+        """Invalidate cached reads of the table a realtime change event is about"""
+        table = payload.get("table")
+        if table:
+            self.cache.invalidate(table)
+
+    def listen_for_changes(self) -> Optional[threading.Thread]:
+        """Invalidate on changes to the CHANNELS tables made by other servers, from a background thread"""
+        if not supabase_config.enable_realtime:
+            return None
+        from realtime.connection import Socket
+        ws_url = supabase_config.url.replace("http", "ws", 1)
+        socket = Socket(f"{ws_url}/realtime/v1/websocket?apikey={supabase_config.key}&vsn=1.0.0")
+
+        def run():
+            # realtime-py drives its websocket with the thread's event loop
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            socket.connect()
+            for table in CHANNELS.values():
+                if table != CHANNELS["PRESENCE"]:
+                    socket.set_channel(f"realtime:public:{table}").join().on("*", self.handle_change)
+            socket.listen()
+
+        thread = threading.Thread(target=run, name="supabase-realtime", daemon=True)
+        thread.start()
+        return thread
+
+    async def aclose(self):
+        """Close pooled connections held for the running event loop"""
+        await self.db.aclose()
+
 # Create a singleton instance
 supabase = SupabaseClient() 
\ No newline at end of file
@@ -41,7 +41,10 @@ reload_engine = 'auto'
 
 # Server hooks
 def on_starting(server):
-    """Log when server starts."""
+    """Log when server starts, and drop metrics snapshots left by a previous run."""
+    import shutil
+    from musicstagram import app
+    shutil.rmtree(app.config['METRICS_DIR'], ignore_errors=True)
     server.log.info("Starting Musicstagram server with Gunicorn 🚀")
 
 def on_reload(server):
@@ -49,7 +52,15 @@ def on_reload(server):
     server.log.info("Reloading Musicstagram server")
 
 def post_fork(server, worker):
-    """Log when worker spawns."""
+    """Give the worker its own database connections, green them under gevent, and log it."""
+    from musicstagram import app, db
+    from services.db_engine import make_green
+    with app.app_context():
+        # Connections opened by the preloaded app belong to the master; leave them to it
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        if worker_class == 'gevent' and any(engine.dialect.name == 'postgresql' for engine in db.engines.values()):
+            make_green()
     server.log.info(f"Worker spawned (pid: {worker.pid})")
 
 def pre_fork(server, worker):
@@ -67,4 +78,13 @@ def worker_int(worker):
     worker.log.info("worker received INT or QUIT signal")
 
 def worker_abort(worker):
-    worker.log.info("worker received SIGABRT signal") 
\ No newline at end of file
+    worker.log.info("worker received SIGABRT signal")
+
+def worker_exit(server, worker):
+    """Flush buffered play counts, metrics and queued logs and finish transcodes before the worker goes away."""
+    from musicstagram import play_buffer, audio_jobs, log_handler, metrics
+    play_buffer.stop()
+    audio_jobs.stop()
+    metrics.stop()
+    log_handler.stop()
+    server.log.info(f"Flushed play counts for worker (pid: {worker.pid})") 
\ No newline at end of file
@@ -0,0 +1,47 @@
+-- Full-text search for profiles and beats
+-- The 'simple' configuration keeps usernames and beat styles unstemmed so
+-- prefix queries like 'tech:*' behave the same for every language.
+alter table profiles add column search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('simple', coalesce(username, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(bio, '')), 'C')
+    ) stored;
+
+alter table beats add column search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(pattern->>'style', '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+    ) stored;
+
+create index profiles_search_vector_idx on profiles using gin(search_vector);
+create index beats_search_vector_idx on beats using gin(search_vector);
+
+-- Turn free text into a prefix tsquery: 'tech hou' -> 'tech':* & 'hou':*
+create or replace function prefix_tsquery(query text)
+returns tsquery as $$
+    select coalesce(
+        to_tsquery('simple', string_agg(quote_literal(word) || ':*', ' & ')),
+        ''::tsquery
+    )
+    from regexp_split_to_table(lower(query), '[^[:alnum:]_]+') as word
+    where word <> '';
+$$ language sql immutable;
+
+create or replace function search_profiles(query text, result_limit integer default 20, result_offset integer default 0)
+returns setof profiles as $$
+    select p.*
+    from profiles p
+    where p.search_vector @@ prefix_tsquery(query)
+    order by ts_rank(p.search_vector, prefix_tsquery(query)) desc, p.username
+    limit result_limit offset result_offset;
+$$ language sql stable;
+
+create or replace function search_beats(query text, result_limit integer default 20, result_offset integer default 0)
+returns setof beats as $$
+    select b.*
+    from beats b
+    where b.search_vector @@ prefix_tsquery(query)
+    order by ts_rank(b.search_vector, prefix_tsquery(query)) desc, b.created_at desc
+    limit result_limit offset result_offset;
+$$ language sql stable;
@@ -0,0 +1,227 @@
+-- Home timelines, fanned out on write
+-- A new public beat is copied into the timeline of its creator and each of
+-- their followers, so a feed page is one index range scan; making a beat
+-- public or private later adds it to or removes it from their timelines.
+-- Creators with timeline_fanout_limit() or more followers are skipped;
+-- home_feed() pulls their latest beats in at read time instead. Timelines hold at most
+-- timeline_length() entries once trim_timelines() has run (schedule it).
+
+create or replace function timeline_length()
+returns integer as $$ select 800 $$ language sql immutable;
+
+create or replace function timeline_fanout_limit()
+returns integer as $$ select 10000 $$ language sql immutable;
+
+-- Kept by the follows triggers below, so the fan-out check is one row lookup
+alter table profiles add column followers_count integer not null default 0;
+update profiles p set followers_count = (select count(*) from follows f where f.following_id = p.id);
+
+create table timelines (
+    user_id uuid references profiles(id) on delete cascade,
+    beat_id uuid references beats(id) on delete cascade,
+    author_id uuid references profiles(id) on delete cascade,
+    created_at timestamp with time zone not null,  -- the beat's, so pages need no join
+    primary key (user_id, beat_id)
+);
+
+create index timelines_user_created_idx on timelines(user_id, created_at, beat_id);
+create index timelines_user_author_idx on timelines(user_id, author_id);
+create index timelines_beat_id_idx on timelines(beat_id);
+-- Latest beats per creator: fan-out on read and follow backfill
+create index beats_created_by_created_at_idx on beats(created_by, created_at, id);
+
+alter table timelines enable row level security;
+
+create policy "Users can view their own timeline"
+    on timelines for select
+    using (auth.uid() = user_id);
+
+create or replace function fan_out_beat()
+returns trigger as $$
+begin
+    insert into timelines (user_id, beat_id, author_id, created_at)
+    select new.created_by, new.id, new.created_by, new.created_at
+    union
+    select f.follower_id, new.id, new.created_by, new.created_at
+    from follows f
+    join profiles author on author.id = new.created_by
+    where f.following_id = new.created_by
+      and new.is_public
+      and author.followers_count < timeline_fanout_limit();
+    return new;
+end;
+$$ language plpgsql security definer;
+
+create trigger beats_fan_out
+    after insert on beats
+    for each row
+    execute procedure fan_out_beat();
+
+-- The creator's own entry stays either way; followers only see public beats
+create or replace function timeline_visibility()
+returns trigger as $$
+begin
+    if new.is_public then
+        insert into timelines (user_id, beat_id, author_id, created_at)
+        select f.follower_id, new.id, new.created_by, new.created_at
+        from follows f
+        join profiles author on author.id = new.created_by
+        where f.following_id = new.created_by
+          and author.followers_count < timeline_fanout_limit()
+        on conflict do nothing;
+    else
+        delete from timelines
+        where beat_id = new.id and user_id <> new.created_by;
+    end if;
+    return new;
+end;
+$$ language plpgsql security definer;
+
+create trigger beats_timeline_visibility
+    after update of is_public on beats
+    for each row
+    when (old.is_public is distinct from new.is_public)
+    execute procedure timeline_visibility();
+
+create or replace function timeline_follow()
+returns trigger as $$
+declare
+    author_followers integer;
+begin
+    update profiles set followers_count = followers_count + 1
+    where id = new.following_id
+    returning followers_count into author_followers;
+
+    if author_followers < timeline_fanout_limit() then
+        insert into timelines (user_id, beat_id, author_id, created_at)
+        select new.follower_id, b.id, b.created_by, b.created_at
+        from beats b
+        where b.created_by = new.following_id and b.is_public
+        order by b.created_at desc, b.id desc
+        limit timeline_length()
+        on conflict do nothing;
+    end if;
+    return new;
+end;
+$$ language plpgsql security definer;
+
+create or replace function timeline_unfollow()
+returns trigger as $$
+begin
+    update profiles set followers_count = greatest(followers_count - 1, 0)
+    where id = old.following_id;
+
+    delete from timelines
+    where user_id = old.follower_id and author_id = old.following_id;
+    return old;
+end;
+$$ language plpgsql security definer;
+
+create trigger follows_timeline_insert
+    after insert on follows
+    for each row
+    execute procedure timeline_follow();
+
+create trigger follows_timeline_delete
+    after delete on follows
+    for each row
+    execute procedure timeline_unfollow();
+
+-- One page of viewer's home feed, newest first: their timeline merged with
+-- the latest beats of the big accounts they follow, or everyone's public
+-- beats while they follow nobody. Pass the created_at and id of the last
+-- beat shown to get the next page.
+create or replace function home_feed(viewer uuid, before_at timestamp with time zone default null,
+                                     before_id uuid default null, result_limit integer default 20)
+returns setof beats as $$
+    with page as (
+        (select t.created_at, t.beat_id
+         from timelines t
+         where t.user_id = viewer
+           and (before_at is null or (t.created_at, t.beat_id) < (before_at, before_id))
+         order by t.created_at desc, t.beat_id desc
+         limit result_limit)
+        union
+        (select latest.created_at, latest.id
+         from follows f
+         join profiles author on author.id = f.following_id
+         cross join lateral (
+             select b.created_at, b.id
+             from beats b
+             where b.created_by = f.following_id and b.is_public
+               and (before_at is null or (b.created_at, b.id) < (before_at, before_id))
+             order by b.created_at desc, b.id desc
+             limit result_limit
+         ) latest
+         where f.follower_id = viewer
+           and author.followers_count >= timeline_fanout_limit())
+        union
+        (select b.created_at, b.id
+         from beats b
+         where not exists (select from follows f where f.follower_id = viewer)
+           and b.is_public
+           and (before_at is null or (b.created_at, b.id) < (before_at, before_id))
+         order by b.created_at desc, b.id desc
+         limit result_limit)
+    )
+    select b.*
+    from page
+    join beats b on b.id = page.beat_id
+    order by page.created_at desc, page.beat_id desc
+    limit result_limit;
+$$ language sql stable;
+
+-- Refill timelines from follows, e.g. after changing timeline_fanout_limit();
+-- null rebuilds every one. Returns the number of entries written.
+create or replace function rebuild_timelines(target uuid default null)
+returns bigint as $$
+declare
+    written bigint;
+begin
+    delete from timelines where target is null or user_id = target;
+
+    insert into timelines (user_id, beat_id, author_id, created_at)
+    select reader.id, latest.id, latest.created_by, latest.created_at
+    from profiles reader
+    cross join lateral (
+        select b.id, b.created_by, b.created_at
+        from beats b
+        where b.created_by = reader.id
+           or (b.is_public and b.created_by in (
+               select f.following_id
+               from follows f
+               join profiles author on author.id = f.following_id
+               where f.follower_id = reader.id
+                 and author.followers_count < timeline_fanout_limit()))
+        order by b.created_at desc, b.id desc
+        limit timeline_length()
+    ) latest
+    where target is null or reader.id = target;
+
+    get diagnostics written = row_count;
+    return written;
+end;
+$$ language plpgsql security definer;
+
+-- Cut every timeline back to its newest timeline_length() entries
+create or replace function trim_timelines()
+returns bigint as $$
+declare
+    removed bigint;
+begin
+    delete from timelines t
+    using (
+        select user_id, beat_id,
+               row_number() over (partition by user_id order by created_at desc, beat_id desc) as rank
+        from timelines
+    ) ranked
+    where ranked.user_id = t.user_id and ranked.beat_id = t.beat_id
+      and ranked.rank > timeline_length();
+
+    get diagnostics removed = row_count;
+    return removed;
+end;
+$$ language plpgsql security definer;
+
+-- Maintenance only; not callable through the API
+revoke execute on function rebuild_timelines(uuid), trim_timelines() from public, anon, authenticated;
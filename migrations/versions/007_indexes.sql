@@ -0,0 +1,30 @@
+-- Composite, partial and covering indexes for the queries in config/supabase_client.py
+-- scripts/test_indexes.py EXPLAINs each of those queries and fails on sequential scans.
+--
+-- Already served by earlier migrations:
+--   unlike_beat / like_beats       likes unique (beat_id, user_id), also index-only likes(count)
+--   unfollow_user / follow_users   follows unique (follower_id, following_id)
+--   get_user_feed, follow backfill beats_created_by_created_at_idx (006)
+--   get_feed                       timelines_user_created_idx (006)
+--   comments(count)                comments_beat_id_idx (003), index-only
+--   search_*                       the GIN indexes (005)
+
+-- get_notifications: one user's newest first, read straight off the index in order
+create index notifications_user_created_at_idx on notifications(user_id, created_at desc);
+
+-- mark_notifications_read: only unread rows are indexed, and they stay few
+create index notifications_unread_idx on notifications(user_id) where is_read = false;
+
+-- get_collaborations: a user's collaborations, with the beat_id the beats(*) embed joins on
+create index collaborations_user_id_idx on collaborations(user_id) include (beat_id);
+
+-- home_feed checks followers_count for every account the viewer follows; with it in
+-- the index that is an index-only scan instead of a fetch of each whole profile row
+create index profiles_id_followers_count_idx on profiles(id) include (followers_count);
+
+-- Single-column indexes from 003 that lead a composite index above or a unique
+-- constraint: the planner never needs them, and every write still updates them
+drop index if exists notifications_user_id_idx;
+drop index if exists likes_beat_id_idx;
+drop index if exists follows_follower_id_idx;
+drop index if exists beats_created_by_idx;
@@ -1,21 +1,50 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort, \
+    has_request_context, g, before_render_template, template_rendered, send_from_directory
+from flask.logging import default_handler
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import deferred, joinedload, selectinload
+from sqlalchemy.schema import CreateColumn
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
+import click
+from concurrent.futures import ProcessPoolExecutor
 import os
+import sys
 import uuid
 import logging
-from logging.handlers import RotatingFileHandler
-from functools import wraps
+from functools import partial, wraps
 import time
-from collections import defaultdict
+import hmac
 import json
+import math
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_compress import Compress
 from flask_caching import Cache
 from flask_talisman import Talisman
+from services.feed import keyset_page, clamp_page_size, encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE
+from services.jobs import JobQueue
+from services.log_queue import JsonFormatter, LogQueueHandler, SharedRotatingFileHandler
+from services.metrics import Metrics, labels as metric_labels
+from services.play_buffer import PlayCounterBuffer
+from services.rate_limit import SharedRateLimiter, parse_policy
+from services.ttl_cache import TTLCache
+from services.view_cache import ViewCache
+from services import db_engine, db_routing
+from services.content_store import ContentStore, sha256_file
+from services.media import send_file_range
+from services.uploads import ChunkedUploadStore, UploadError, UploadNotFound, OffsetMismatch, save_stream
+from services import search as full_text
+from services import pattern_codec
+from services import profiler
+from services.beat_presets import PRESETS as BEAT_PRESETS, TEST_PATTERN
+from services import beat_render
+from services.render_cache import RenderCache, pattern_hash
+from services import transcode
+from services import waveform
 
 # Initialize Flask app
 app = Flask(__name__, 
@@ -27,22 +56,117 @@ app = Flask(__name__,
 # Configure app
 app.config.update(
     SECRET_KEY=os.environ.get('SECRET_KEY', 'dev_key_123'),
-    SQLALCHEMY_DATABASE_URI='sqlite:///musicstagram.db',
+    SQLALCHEMY_DATABASE_URI=db_engine.normalize_uri(
+        os.environ.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///musicstagram.db')),
     SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    # Postgres connection pool, per worker process (SQLite connections get WAL pragmas instead)
+    DB_POOL_SIZE=int(os.environ.get('DB_POOL_SIZE', '10')),
+    DB_MAX_OVERFLOW=int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+    DB_POOL_TIMEOUT=float(os.environ.get('DB_POOL_TIMEOUT', '10')),  # seconds to wait for a free connection
+    DB_POOL_RECYCLE=int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+    DB_STATEMENT_TIMEOUT_MS=int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '15000')),
+    # Overrides for services.db_engine.SQLITE_PRAGMAS, e.g. 'mmap_size=0,synchronous=FULL'
+    SQLITE_PRAGMAS=dict(item.split('=', 1) for item in os.environ.get('SQLITE_PRAGMAS', '').split(',') if item),
+    # Read replicas (comma-separated URIs) that serve GET requests; after a write, that user's
+    # requests read from the primary for REPLICA_STICKY_SECONDS so they see what they just did
+    SQLALCHEMY_REPLICA_URIS=[uri for uri in os.environ.get('SQLALCHEMY_REPLICA_URIS', '').split(',') if uri],
+    REPLICA_STICKY_SECONDS=float(os.environ.get('REPLICA_STICKY_SECONDS', '5')),
     UPLOAD_FOLDER=os.path.join('static', 'uploads'),
     MAX_CONTENT_LENGTH=50 * 1024 * 1024,  # 50MB
     ALLOWED_EXTENSIONS={'mp3', 'wav', 'ogg', 'm4a', 'aac'},
+    # Uploads are staged here until complete, then moved into UPLOAD_FOLDER
+    UPLOAD_CHUNK_FOLDER=os.environ.get('UPLOAD_CHUNK_FOLDER', os.path.join(app.instance_path, 'uploads')),
+    UPLOAD_CHUNK_SIZE=int(os.environ.get('UPLOAD_CHUNK_SIZE', str(2 * 1024 * 1024))),  # bytes
+    TRANSCODE_BITRATE=os.environ.get('TRANSCODE_BITRATE', '192k'),
+    TRANSCODE_WORKERS=int(os.environ.get('TRANSCODE_WORKERS', '1')),
+    WAVEFORM_BITS=int(os.environ.get('WAVEFORM_BITS', '8')),  # 8 or 16 bits per peak
+    # Beats are rendered on the server when the client sends no audio, or always
+    # when client-rendered audio is not trusted
+    BEAT_RENDER_REPEATS=int(os.environ.get('BEAT_RENDER_REPEATS', '4')),  # loops per rendered track
+    TRUST_CLIENT_BEAT_AUDIO=os.environ.get('TRUST_CLIENT_BEAT_AUDIO', 'true').lower() == 'true',
+    RENDER_CACHE_FOLDER=os.environ.get('RENDER_CACHE_FOLDER', os.path.join(app.instance_path, 'render_cache')),
+    RENDER_CACHE_MAX_BYTES=int(os.environ.get('RENDER_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
     TEMPLATES_AUTO_RELOAD=True,
     DEBUG=True,
     PERMANENT_SESSION_LIFETIME=timedelta(days=1),
     SESSION_COOKIE_SECURE=False,
     SESSION_COOKIE_HTTPONLY=True,
     SESSION_COOKIE_SAMESITE='Lax',
-    SERVER_PORT=5001
+    # Only re-issue the session cookie when it actually changes
+    SESSION_REFRESH_EACH_REQUEST=False,
+    SESSION_ACTIVITY_REFRESH=int(os.environ.get('SESSION_ACTIVITY_REFRESH', '300')),  # seconds
+    SESSION_USER_CACHE_TTL=int(os.environ.get('SESSION_USER_CACHE_TTL', '60')),  # seconds
+    SERVER_PORT=5001,
+    # Play counts are buffered in memory and written back in batches
+    PLAY_FLUSH_INTERVAL=float(os.environ.get('PLAY_FLUSH_INTERVAL', '5')),
+    PLAY_FLUSH_THRESHOLD=int(os.environ.get('PLAY_FLUSH_THRESHOLD', '1000')),
+    PLAY_SPOOL_PATH=os.environ.get('PLAY_SPOOL_PATH'),  # shared across workers when set
+    # Home timelines: a new post is copied into each follower's timeline, except for authors with
+    # TIMELINE_FANOUT_LIMIT or more followers, whose posts are merged in when a timeline is read.
+    # `flask trim-timelines` (cron) cuts each one back to its newest TIMELINE_LENGTH entries
+    TIMELINE_LENGTH=int(os.environ.get('TIMELINE_LENGTH', '800')),
+    TIMELINE_FANOUT_LIMIT=int(os.environ.get('TIMELINE_FANOUT_LIMIT', '10000')),
+    # Shared cache backend: FileSystemCache works across workers on one host,
+    # RedisCache (with CACHE_REDIS_URL) across hosts
+    CACHE_TYPE=os.environ.get('CACHE_TYPE', 'FileSystemCache'),
+    CACHE_DIR=os.environ.get('CACHE_DIR', os.path.join(app.instance_path, 'cache')),
+    CACHE_REDIS_URL=os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+    CACHE_DEFAULT_TIMEOUT=int(os.environ.get('CACHE_DEFAULT_TIMEOUT', '300')),
+    CACHE_THRESHOLD=int(os.environ.get('CACHE_THRESHOLD', '5000')),
+    # Page cache scope versions, kept apart so CACHE_THRESHOLD pruning never drops them
+    VIEW_CACHE_VERSION_DIR=os.environ.get('VIEW_CACHE_VERSION_DIR', os.path.join(app.instance_path, 'cache-versions')),
+    # Full-text search ranks every match unless this caps it to the newest N: faster on very
+    # broad queries, but an older, better match then never shows up on any page
+    SEARCH_RANK_WINDOW=int(os.environ['SEARCH_RANK_WINDOW']) if os.environ.get('SEARCH_RANK_WINDOW') else None,
+    # compress_response() applies flask_compress itself so audio can skip it
+    COMPRESS_REGISTER=False,
+    # Per-route limits (see rate_limit()), counted in a table shared by all
+    # workers on the host; /dev/shm keeps it in memory
+    RATE_LIMITS={'like': '60/minute', 'comment': '10/minute', 'follow': '30/minute', 'play': '120/minute'},
+    RATE_LIMIT_FILE=os.environ.get('RATE_LIMIT_FILE', '/dev/shm/musicstagram-ratelimit'
+                                   if os.path.isdir('/dev/shm') else os.path.join(app.instance_path, 'ratelimit')),
+    RATE_LIMIT_SLOTS=int(os.environ.get('RATE_LIMIT_SLOTS', '65536')),  # 24 bytes each
+    # Storage for flask_limiter's default limits; memory:// is per worker, so
+    # use e.g. redis://host:6379 when running several
+    RATELIMIT_STORAGE_URI=os.environ.get('RATELIMIT_STORAGE_URI', 'memory://'),
+    # Logs are queued and written as JSON lines by a background thread
+    LOG_FILE=os.environ.get('LOG_FILE', os.path.join('logs', 'musicstagram.log')),
+    LOG_LEVEL=os.environ.get('LOG_LEVEL', 'INFO'),
+    LOG_MAX_BYTES=int(os.environ.get('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+    LOG_BACKUP_COUNT=int(os.environ.get('LOG_BACKUP_COUNT', '5')),
+    LOG_QUEUE_SIZE=int(os.environ.get('LOG_QUEUE_SIZE', '10000')),  # records beyond this are dropped
+    # Fraction of INFO/DEBUG records kept for busy endpoints; warnings and errors are always kept
+    LOG_SAMPLE_RATES={'index': 0.1, 'api_feed': 0.1, 'track_play': 0.01, 'search': 0.1, 'profile': 0.1},
+    # Request metrics; each worker snapshots its values into METRICS_DIR for /metrics to sum
+    METRICS_ENABLED=os.environ.get('METRICS_ENABLED', 'true').lower() == 'true',
+    METRICS_DIR=os.environ.get('METRICS_DIR', os.path.join(app.instance_path, 'metrics')),
+    METRICS_TOKEN=os.environ.get('METRICS_TOKEN'),
+    # Admin-only profiling (/admin/profile and signed X-Profile requests); off unless a key is set
+    PROFILING_KEY=os.environ.get('PROFILING_KEY'),
+    PROFILE_DIR=os.environ.get('PROFILE_DIR', os.path.join(app.instance_path, 'profiles')),
+    PROFILE_MAX_SECONDS=int(os.environ.get('PROFILE_MAX_SECONDS', '60'))
 )
 
+def engine_options(uri):
+    return db_engine.engine_options(
+        uri,
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pool_recycle=app.config['DB_POOL_RECYCLE'],
+        statement_timeout_ms=app.config['DB_STATEMENT_TIMEOUT_MS'],
+    )
+
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+REPLICA_BINDS = {f'replica{i}': dict(engine_options(uri), url=uri)
+                 for i, uri in enumerate(map(db_engine.normalize_uri, app.config['SQLALCHEMY_REPLICA_URIS']))}
+app.config.setdefault('SQLALCHEMY_BINDS', {}).update(REPLICA_BINDS)
+
 # Initialize extensions
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': db_routing.RoutingSession})
+with app.app_context():
+    for engine in db.engines.values():
+        db_engine.install(engine, app.config['SQLITE_PRAGMAS'])
 
 # Models that SLAP 🔥
 class User(db.Model):
@@ -53,6 +177,10 @@ class User(db.Model):
     bio = db.Column(db.String(500))
     instrument = db.Column(db.String(100))
     genre = db.Column(db.String(100))
+    # Denormalized counters, kept in step by bump_counter()
+    posts_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    followers_count = db.Column(db.Integer, default=0, server_default='0', nullable=False, index=True)
+    following_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     posts = db.relationship('Post', backref='author', lazy=True)
     comments = db.relationship('Comment', backref='author', lazy=True)
     followers = db.relationship(
@@ -66,7 +194,10 @@ class User(db.Model):
 # Followers association table
 followers = db.Table('followers',
     db.Column('follower_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'))
+    db.Column('followed_id', db.Integer, db.ForeignKey('user.id')),
+    # Both directions: who I follow (timeline reads) and who follows me (fan-out)
+    db.Index('ix_followers_follower', 'follower_id', 'followed_id'),
+    db.Index('ix_followers_followed', 'followed_id', 'follower_id')
 )
 
 class Post(db.Model):
@@ -79,29 +210,78 @@ class Post(db.Model):
     likes = db.relationship('Like', backref='post', lazy=True)
     comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
     play_count = db.Column(db.Integer, default=0)
-    beat_data = db.Column(db.Text)  # Store beat pattern data
+    likes_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    comments_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Beat pattern and effects, encoded with services.pattern_codec. Deferred,
+    # so lists never load them; use the `pattern` and `effects` properties
+    pattern_blob = deferred(db.Column(db.LargeBinary))
+    effects_blob = deferred(db.Column(db.LargeBinary))
+    # Legacy JSON text, moved into the blobs by `flask migrate-patterns`
+    beat_data = deferred(db.Column(db.Text))
+    effects_data = deferred(db.Column(db.Text))
     bpm = db.Column(db.Integer, default=128)  # Beats per minute
     style = db.Column(db.String(50))  # Beat style/genre
-    effects_data = db.Column(db.Text)  # Store effects settings
     is_beat_pattern = db.Column(db.Boolean, default=False)  # Flag for beat vs regular upload
+    # Filled in by process_audio() once the upload has been normalized
+    duration = db.Column(db.Float)  # seconds
+    bitrate = db.Column(db.Integer)  # kbps
+    audio_status = db.Column(db.String(20), default='ready', server_default='ready', nullable=False)
+    pattern_hash = db.Column(db.String(64), index=True)  # canonical beat hash, see services.render_cache
+    # Rendered here from the pattern rather than uploaded, so identical beats may share it
+    audio_rendered = db.Column(db.Boolean, default=False, server_default='0', nullable=False)
+
+    # Serve the keyset-paginated feed (ORDER BY timestamp DESC, id DESC),
+    # overall and per author
+    __table_args__ = (
+        db.Index('ix_post_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_post_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
+    @property
+    def pattern(self):
+        """The beat pattern as a dict, decoded on access"""
+        if self.pattern_blob is not None:
+            return pattern_codec.decode(self.pattern_blob)
+        return json.loads(self.beat_data) if self.beat_data else None
+
+    @pattern.setter
+    def pattern(self, value):
+        self.pattern_blob = pattern_codec.encode_pattern(value) if value is not None else None
+        self.beat_data = None
 
-    def to_dict(self):
-        """Convert post to dictionary with all beat info"""
-        return {
+    @property
+    def effects(self):
+        if self.effects_blob is not None:
+            return pattern_codec.decode(self.effects_blob)
+        return json.loads(self.effects_data) if self.effects_data else None
+
+    @effects.setter
+    def effects(self, value):
+        self.effects_blob = pattern_codec.encode_effects(value) if value is not None else None
+        self.effects_data = None
+
+    def to_dict(self, include_pattern=True):
+        """Convert post to dictionary with all beat info; lists skip the pattern"""
+        data = {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'timestamp': self.timestamp.isoformat(),
             'author': self.author.username,
             'play_count': self.play_count,
-            'likes_count': len(self.likes),
-            'comments_count': len(self.comments),
-            'beat_data': json.loads(self.beat_data) if self.beat_data else None,
+            'likes_count': self.likes_count,
+            'comments_count': self.comments_count,
             'bpm': self.bpm,
             'style': self.style,
-            'effects_data': json.loads(self.effects_data) if self.effects_data else None,
-            'is_beat_pattern': self.is_beat_pattern
+            'is_beat_pattern': self.is_beat_pattern,
+            'duration': self.duration,
+            'bitrate': self.bitrate,
+            'audio_status': self.audio_status
         }
+        if include_pattern:
+            data['beat_data'] = self.pattern
+            data['effects_data'] = self.effects
+        return data
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -115,6 +295,27 @@ class Like(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
 
+class TimelineEntry(db.Model):
+    """A post in one user's home timeline, copied there when it was posted (see fan_out_post)"""
+    __tablename__ = 'timeline'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    author_id = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)  # the post's, so pages need no join
+
+    __table_args__ = (
+        db.Index('ix_timeline_user_timestamp_post', 'user_id', 'timestamp', 'post_id'),
+        db.Index('ix_timeline_post', 'post_id'),
+    )
+
+class AudioBlob(db.Model):
+    """One stored audio file, shared by every post whose upload had the same bytes"""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    path = db.Column(db.String(200), unique=True, nullable=False)  # what Post.music_file holds
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
 # Initialize remaining extensions after models
 limiter = Limiter(
     app=app,
@@ -122,7 +323,26 @@ limiter = Limiter(
     default_limits=["200 per day", "50 per hour"]
 )
 compress = Compress(app)
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+# Audio is already compressed; running it through flask_compress only burns
+# CPU and adds a Vary header that splits shared caches by Accept-Encoding
+COMPRESS_EXEMPT_ENDPOINTS = {'stream_audio'}
+
+@app.after_request
+def compress_response(response):
+    if request.endpoint in COMPRESS_EXEMPT_ENDPOINTS:
+        return response
+    return compress.after_request(response)
+
+cache = Cache(app)
+# Versions never expire or get pruned (a 0 threshold turns pruning off on the filesystem but
+# empties SimpleCache); on the filesystem, bumps are made atomic with a lock file
+filesystem_cache = app.config['CACHE_TYPE'] == 'FileSystemCache'
+version_cache = Cache(app, config={'CACHE_DIR': app.config['VIEW_CACHE_VERSION_DIR'], 'CACHE_DEFAULT_TIMEOUT': 0,
+                                   'CACHE_THRESHOLD': 0 if filesystem_cache else sys.maxsize})
+view_cache = ViewCache(
+    cache, versions=version_cache,
+    lock_path=os.path.join(app.config['VIEW_CACHE_VERSION_DIR'], '.lock') if filesystem_cache else None,
+    default_timeout=app.config['CACHE_DEFAULT_TIMEOUT'])
 talisman = Talisman(
     app,
     content_security_policy={
@@ -135,32 +355,56 @@ talisman = Talisman(
     force_https=False
 )
 
-# Enhanced rate limiting with IP tracking
-RATE_LIMIT = 10  # Increased to 10 requests
-RATE_LIMIT_PERIOD = 60  # seconds
-request_counts = defaultdict(lambda: {'count': 0, 'reset_time': 0, 'blocked_until': 0})
+# Per-route rate limits, shared across workers
+rate_limiter = SharedRateLimiter(app.config['RATE_LIMIT_FILE'], slots=app.config['RATE_LIMIT_SLOTS'])
+RATE_LIMIT_POLICIES = {name: parse_policy(policy) for name, policy in app.config['RATE_LIMITS'].items()}
 
-def rate_limit(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        try:
-            return f(*args, **kwargs)
-        except Exception as e:
-            app.logger.error(f'Rate limit exceeded: {e}')
-            flash('Whoa there! Slow down a bit! 🐎', 'warning')
-            return redirect(url_for('index'))
-    return decorated_function
+def rate_limit(policy):
+    """Limit a route by the RATE_LIMITS `policy`, per user (or per IP when logged out)"""
+    limit, period = RATE_LIMIT_POLICIES[policy]
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            identity = session.get('user_id') or get_remote_address()
+            decision = rate_limiter.hit(f'{policy}:{identity}', limit, period)
+            if decision.allowed:
+                return f(*args, **kwargs)
+            app.logger.warning('Rate limit %s exceeded by %s', policy, identity)
+            if request.accept_mimetypes.best == 'text/html':
+                flash('Whoa there! Slow down a bit! 🐎', 'warning')
+                response = redirect(request.referrer or url_for('index'))
+            else:
+                response = jsonify({'error': 'Whoa there! Slow down a bit! 🐎'})
+                response.status_code = 429
+            response.headers['Retry-After'] = str(math.ceil(decision.retry_after))
+            return response
+        return decorated_function
+    return decorator
 
-# Setup logging
-if not os.path.exists('logs'):
-    os.mkdir('logs')
-file_handler = RotatingFileHandler('logs/musicstagram.log', maxBytes=10240, backupCount=10)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-file_handler.setLevel(logging.INFO)
-app.logger.addHandler(file_handler)
-app.logger.setLevel(logging.INFO)
+# Setup logging: JSON lines written by a background listener (services.log_queue)
+os.makedirs(os.path.dirname(app.config['LOG_FILE']) or '.', exist_ok=True)
+file_handler = SharedRotatingFileHandler(app.config['LOG_FILE'], maxBytes=app.config['LOG_MAX_BYTES'],
+                                         backupCount=app.config['LOG_BACKUP_COUNT'])
+file_handler.setFormatter(JsonFormatter())
+log_handlers = [file_handler]
+if app.debug:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s'))
+    log_handlers.append(console_handler)
+
+def log_context():
+    if not has_request_context():
+        return None
+    # Not the session: reading it would add Vary: Cookie to the response
+    return {'endpoint': request.endpoint, 'method': request.method, 'path': request.path}
+
+log_handler = LogQueueHandler(log_handlers, maxsize=app.config['LOG_QUEUE_SIZE'], context=log_context,
+                              sample_rates=app.config['LOG_SAMPLE_RATES'])
+app.logger.removeHandler(default_handler)
+for logger in (app.logger, logging.getLogger('services')):
+    logger.addHandler(log_handler)
+    logger.setLevel(app.config['LOG_LEVEL'])
 app.logger.info('Musicstagram startup - Debug mode: %s', app.debug)
 
 # Ensure upload directory exists
@@ -170,20 +414,98 @@ if not os.path.exists(upload_dir):
 else:
     os.chmod(upload_dir, 0o755)
 
+def ensure_schema():
+    """Add columns and indexes declared after a table was first created.
+
+    create_all() skips tables that already exist, so newer columns and
+    indexes never reach older databases without this. Returns the names of
+    the columns that were added.
+    """
+    engine = db.engine
+    preparer = engine.dialect.identifier_preparer
+    inspector = sa_inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(db.text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+                    added.append(f'{table.name}.{column.name}')
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    return added
+
+def reconcile_counters():
+    """Rebuild every denormalized counter from the source rows in bulk"""
+    like_count = db.select(db.func.count(Like.id)).where(Like.post_id == Post.id).scalar_subquery()
+    comment_count = db.select(db.func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()
+    db.session.execute(db.update(Post).values(likes_count=like_count, comments_count=comment_count))
+
+    post_count = db.select(db.func.count(Post.id)).where(Post.user_id == User.id).scalar_subquery()
+    follower_count = db.select(db.func.count()).select_from(followers) \
+        .where(followers.c.followed_id == User.id).scalar_subquery()
+    following_count = db.select(db.func.count()).select_from(followers) \
+        .where(followers.c.follower_id == User.id).scalar_subquery()
+    db.session.execute(db.update(User).values(
+        posts_count=post_count,
+        followers_count=follower_count,
+        following_count=following_count
+    ))
+    db.session.commit()
+
+COUNTER_COLUMNS = {'post.likes_count', 'post.comments_count', 'user.posts_count',
+                   'user.followers_count', 'user.following_count'}
+
 def init_db():
     """Initialize database and create tables if they don't exist."""
     try:
         with app.app_context():
             # Only create tables if they don't exist
             db.create_all()
+            added = ensure_schema()
+            if COUNTER_COLUMNS.intersection(added):
+                reconcile_counters()
+            rebuilt = full_text.install(db.engine)
+            if rebuilt:
+                app.logger.info('Built search indexes: %s 🔎', ', '.join(rebuilt))
+            app.config['FULL_TEXT_SEARCH'] = full_text.available(db.engine)
             app.logger.info('Database tables ready to rock 🎯')
     except Exception as e:
-        app.logger.error(f'Error initializing database: {str(e)} 😢')
+        app.logger.error('Error initializing database: %s 😢', e)
         raise
 
 # Initialize database
 init_db()
 
+def flush_play_counts(counts):
+    """Apply buffered play increments in a single executemany UPDATE"""
+    post_table = Post.__table__
+    with app.app_context():
+        db.session.execute(
+            db.update(post_table)
+            .where(post_table.c.id == db.bindparam('post_id'))
+            .values(play_count=db.func.coalesce(post_table.c.play_count, 0) + db.bindparam('plays')),
+            [{'post_id': post_id, 'plays': plays} for post_id, plays in counts.items()]
+        )
+        db.session.commit()
+    app.logger.info('Flushed %s plays across %s tracks', sum(counts.values()), len(counts))
+
+play_buffer = PlayCounterBuffer(
+    flush_play_counts,
+    interval=app.config['PLAY_FLUSH_INTERVAL'],
+    max_pending=app.config['PLAY_FLUSH_THRESHOLD'],
+    spool_path=app.config['PLAY_SPOOL_PATH']
+)
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Recount likes, comments, posts and follows into the counter columns"""
+    reconcile_counters()
+    click.echo('Counters reconciled 🎯')
+
 # App Configuration
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -199,7 +521,449 @@ def generate_unique_filename(filename):
     ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
     return f"{uuid.uuid4().hex}.{ext}"
 
+# Uploads: chunks stream to disk under UPLOAD_CHUNK_FOLDER, finished files
+# move into content-addressed storage under UPLOAD_FOLDER and are normalized
+# off the request path
+upload_store = ChunkedUploadStore(app.config['UPLOAD_CHUNK_FOLDER'], max_size=app.config['MAX_CONTENT_LENGTH'])
+audio_store = ContentStore(app.config['UPLOAD_FOLDER'])
+audio_jobs = JobQueue(workers=app.config['TRANSCODE_WORKERS'], name='transcode')
+render_cache = RenderCache(app.config['RENDER_CACHE_FOLDER'], max_bytes=app.config['RENDER_CACHE_MAX_BYTES'])
+
+def claim_upload(upload_id):
+    """Move a finished chunked upload into audio storage and return its Post.music_file path"""
+    upload = upload_store.complete(upload_id)
+    path = store_audio(upload['path'], upload['filename'], digest=upload['sha256'])
+    app.logger.info('Upload %s stored as %s', upload_id, path)
+    return path
+
+def store_audio(source, filename, digest=None):
+    """Move `source` into content-addressed storage and take a reference to it.
+
+    Identical files share one blob. Runs in the caller's transaction and
+    returns the path to keep in Post.music_file.
+    """
+    digest = digest or sha256_file(source)
+    path = take_audio_reference(digest)
+    if path is None:
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        path = audio_store.relative_path(digest, ext)
+        try:
+            with db.session.begin_nested():
+                db.session.add(AudioBlob(sha256=digest, path=path, size=os.path.getsize(source), ref_count=1))
+        except IntegrityError:
+            # A concurrent upload of the same bytes created the blob first
+            path = take_audio_reference(digest)
+    audio_store.place(source, path)
+    return path
+
+def take_audio_reference(digest):
+    return db.session.execute(
+        db.update(AudioBlob).where(AudioBlob.sha256 == digest)
+        .values(ref_count=AudioBlob.ref_count + 1).returning(AudioBlob.path)
+    ).scalar()
+
+def release_audio(path):
+    """Drop one reference to a stored file in the current transaction; see collect_audio()"""
+    db.session.execute(
+        db.update(AudioBlob).where(AudioBlob.path == path)
+        .values(ref_count=AudioBlob.ref_count - 1)
+    )
+
+def collect_audio(path):
+    """Delete the file at `path` if nothing references it; call after release_audio() commits.
+
+    The blob row stays locked until the file is gone, so a concurrent upload
+    of the same bytes either keeps the blob alive or recreates it afterwards.
+    """
+    orphaned = db.session.execute(
+        db.delete(AudioBlob).where(AudioBlob.path == path, AudioBlob.ref_count <= 0)
+        .returning(AudioBlob.id)
+    ).first()
+    if orphaned is None:
+        shared = db.session.scalar(db.select(AudioBlob.id).where(AudioBlob.path == path))
+        if shared is not None or Post.query.filter_by(music_file=path).first() is not None:
+            db.session.rollback()
+            return
+    # Orphaned blob, or a pre-dedupe upload that was never in the blob table
+    audio_store.remove(path)
+    audio_store.remove(waveform.peaks_path(path))
+    db.session.commit()
+
+def process_audio(post_id):
+    """Normalize a post's audio to streaming-friendly MP3 and record duration/bitrate"""
+    with app.app_context():
+        post = db.session.get(Post, post_id)
+        if post is None:
+            return
+        original = post.music_file
+        source = audio_store.absolute_path(original)
+        target_name = f'{uuid.uuid4().hex}.{transcode.OUTPUT_EXTENSION}'
+        target = os.path.join(app.config['UPLOAD_CHUNK_FOLDER'], target_name)
+        try:
+            if transcode.normalize(source, target, bitrate=app.config['TRANSCODE_BITRATE']):
+                post.music_file = store_audio(target, target_name)
+                release_audio(original)
+            info = transcode.probe(audio_store.absolute_path(post.music_file))
+            post.duration = info['duration']
+            post.bitrate = info['bitrate']
+            post.audio_status = 'ready'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if os.path.exists(target):
+                os.remove(target)
+            app.logger.error('Audio processing failed for post %s: %s', post_id, e)
+            # The original upload stays in place and playable
+            db.session.execute(db.update(Post).where(Post.id == post_id).values(audio_status='failed'))
+            db.session.commit()
+            return
+
+        if post.music_file != original:
+            collect_audio(original)
+        app.logger.info('Processed audio for post %s: %ss @ %skbps', post_id, post.duration, post.bitrate)
+
+        # Shared blobs already have their peaks from the first upload
+        audio_path = audio_store.absolute_path(post.music_file)
+        if not os.path.exists(waveform.peaks_path(audio_path)) \
+                and waveform.write_peaks(audio_path, app.config['WAVEFORM_BITS']) is None:
+            app.logger.warning('Could not compute waveform peaks for post %s', post_id)
+
+def queue_audio_processing(post):
+    audio_jobs.submit(process_audio, post.id)
+
+def beat_spec(pattern, effects=None):
+    """Combine a stored beat pattern and its effects into one renderable spec"""
+    spec = dict(pattern)
+    if effects:
+        spec['effects'] = effects
+    return spec
+
+def render_beat_audio(spec):
+    """Render a beat pattern to WAV (or reuse a cached render) and store it; returns the stored filename"""
+    repeats = app.config['BEAT_RENDER_REPEATS']
+    key = f'{pattern_hash(spec)}-v{beat_render.VERSION}x{repeats}'
+    filename = f'{uuid.uuid4().hex}.wav'
+    path = os.path.join(app.config['UPLOAD_CHUNK_FOLDER'], filename)
+    os.makedirs(app.config['UPLOAD_CHUNK_FOLDER'], exist_ok=True)
+    if render_cache.copy_to(key, path):
+        return store_audio(path, filename)
+
+    began = time.perf_counter()
+    with open(path, 'wb') as f:
+        _, duration = beat_render.render_wav(spec, repeats=repeats, file=f)
+    elapsed = time.perf_counter() - began
+    app.logger.info('Rendered %.1fs beat in %.2fs (%.0fx realtime) 🥁', duration, elapsed, duration / elapsed)
+    render_cache.add(key, path)
+    return store_audio(path, filename)
+
+def reuse_beat_audio(beat_hash):
+    """Reference the finished audio of an identical beat; returns (post it came from, path) or None.
+
+    Only audio rendered on the server is shared: an upload is whatever its
+    poster sent, not necessarily what the pattern sounds like. Runs in the
+    caller's transaction, like store_audio().
+    """
+    source = Post.query.filter_by(pattern_hash=beat_hash, audio_status='ready', audio_rendered=True) \
+        .order_by(Post.id).first()
+    if source is None:
+        return None
+    blob_digest = audio_store.digest_of(source.music_file)
+    path = take_audio_reference(blob_digest) if blob_digest else None
+    return (source, path) if path else None
+
+@app.cli.command('render-beats')
+@click.option('--post-id', type=int, help='Only re-render this post')
+def render_beats_command(post_id):
+    """Regenerate audio for beat posts from their stored patterns"""
+    query = db.select(Post).where(Post.is_beat_pattern.is_(True),
+                                  db.or_(Post.pattern_blob.isnot(None), Post.beat_data.isnot(None)))
+    if post_id:
+        query = query.where(Post.id == post_id)
+    posts = db.session.scalars(query).all()
+    for post in posts:
+        original = post.music_file
+        try:
+            spec = beat_spec(post.pattern, post.effects)
+            post.pattern_hash = pattern_hash(spec)
+            post.music_file = render_beat_audio(spec)
+            release_audio(original)
+            post.audio_rendered = True
+            post.audio_status = 'processing'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f'Could not render post {post.id}: {e}')
+            continue
+        if post.music_file != original:
+            collect_audio(original)
+        process_audio(post.id)
+    click.echo(f'Rendered {len(posts)} beats 🥁')
+
+@app.cli.command('process-audio')
+@click.option('--all', 'reprocess_all', is_flag=True, help='Reprocess every post, not just pending ones')
+def process_audio_command(reprocess_all):
+    """Run audio processing for posts that never finished (e.g. after a restart)"""
+    query = db.select(Post.id)
+    if not reprocess_all:
+        query = query.where(Post.audio_status != 'ready')
+    post_ids = db.session.scalars(query).all()
+    for post_id in post_ids:
+        process_audio(post_id)
+    click.echo(f'Processed {len(post_ids)} tracks 🎚️')
+
+@app.cli.command('backfill-waveforms')
+@click.option('--workers', default=os.cpu_count(), show_default=True, help='Decoder processes')
+@click.option('--force', is_flag=True, help='Recompute peaks that already exist')
+def backfill_waveforms_command(workers, force):
+    """Compute waveform peaks for existing uploads in parallel"""
+    paths = sorted({audio_store.absolute_path(music_file)
+                    for music_file in db.session.scalars(db.select(Post.music_file).distinct())})
+    if not force:
+        paths = [path for path in paths if not os.path.exists(waveform.peaks_path(path))]
+    # Decoding and reduction are CPU-bound, so use processes rather than threads
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(partial(waveform.write_peaks, bits=app.config['WAVEFORM_BITS']),
+                                paths, chunksize=4))
+    failed = [path for path, result in zip(paths, results) if result is None]
+    for path in failed:
+        click.echo(f'Could not decode {path}')
+    click.echo(f'Computed peaks for {len(paths) - len(failed)} of {len(paths)} tracks 🌊')
+
+@app.cli.command('migrate-patterns')
+@click.option('--batch-size', default=500, show_default=True)
+def migrate_patterns_command(batch_size):
+    """Re-encode legacy JSON beat patterns and effects into the compact binary columns"""
+    query = db.select(Post.id, Post.beat_data, Post.effects_data) \
+        .where(db.or_(Post.beat_data.isnot(None), Post.effects_data.isnot(None))) \
+        .order_by(Post.id).limit(batch_size)
+    migrated = before = after = 0
+    while True:
+        rows = db.session.execute(query).all()
+        if not rows:
+            break
+        updates = []
+        for post_id, beat_data, effects_data in rows:
+            update = {'id': post_id, 'beat_data': None, 'effects_data': None}
+            if beat_data:
+                update['pattern_blob'] = pattern_codec.encode_pattern(json.loads(beat_data))
+                before += len(beat_data.encode())
+                after += len(update['pattern_blob'])
+            if effects_data:
+                update['effects_blob'] = pattern_codec.encode_effects(json.loads(effects_data))
+                before += len(effects_data.encode())
+                after += len(update['effects_blob'])
+            updates.append(update)
+        # Bulk UPDATE by primary key
+        db.session.execute(db.update(Post), updates)
+        db.session.commit()
+        migrated += len(rows)
+    click.echo(f'Migrated {migrated} patterns: {before} -> {after} bytes 📦')
+
+@app.cli.command('purge-uploads')
+@click.option('--max-age', default=86400, show_default=True, help='Seconds since the last chunk')
+def purge_uploads_command(max_age):
+    """Delete chunked uploads that were abandoned before completing"""
+    click.echo(f'Purged {upload_store.purge(max_age)} stale uploads 🧹')
+
+# Metrics: per-endpoint latency, SQL and template time, upload throughput and
+# cache hit counts, summed across workers and served at /metrics
+metrics = Metrics('musicstagram', directory=app.config['METRICS_DIR'])
+metrics.histogram('request_duration_seconds', 'Request latency by endpoint')
+metrics.counter('requests_total', 'Requests by endpoint, method and status')
+metrics.histogram('db_queries_per_request', 'SQL statements per request',
+                  buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55))
+metrics.counter('db_queries_total', 'SQL statements by endpoint')
+metrics.counter('db_seconds_total', 'Time spent executing SQL by endpoint')
+metrics.histogram('template_render_seconds', 'render_template() time by template')
+metrics.counter('upload_bytes_total', 'Request body bytes received by upload endpoints')
+metrics.counter('upload_seconds_total', 'Time spent handling upload requests')
+metrics.counter('cache_hits_total', 'Cache hits by cache')
+metrics.counter('cache_misses_total', 'Cache misses by cache')
+UPLOAD_ENDPOINTS = {'upload_chunk', 'new_post', 'upload_beat'}
+
+def cache_counts():
+    counts = {}
+    for name, stats in (('view', view_cache.stats()), ('render', render_cache.stats())):
+        counts[('cache_hits_total', metric_labels(cache=name))] = stats['hits']
+        counts[('cache_misses_total', metric_labels(cache=name))] = stats['misses']
+    return counts
+
+def cache_hit_ratios(counters):
+    ratios = {}
+    for (name, label_set), hits in counters.items():
+        if name == 'musicstagram_cache_hits_total':
+            misses = counters.get(('musicstagram_cache_misses_total', label_set), 0)
+            ratios[('cache_hit_ratio', label_set)] = hits / (hits + misses) if hits + misses else 0.0
+    return ratios
+
+metrics.add_collector(cache_counts)
+
+@app.before_request
+def start_request_metrics():
+    if app.config['METRICS_ENABLED']:
+        g.metrics = [time.perf_counter(), 0, 0.0, None]  # start, queries, SQL seconds, status
+
+@app.after_request
+def record_response_status(response):
+    if 'metrics' in g:
+        g.metrics[3] = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    # After every after_request hook (compression included) has run
+    sample = g.pop('metrics', None)
+    if sample is None:
+        return
+    started, queries, sql_seconds, status = sample
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    by_endpoint = metric_labels(endpoint=endpoint)
+    metrics.observe('request_duration_seconds', elapsed, by_endpoint)
+    metrics.inc('requests_total', label_set=metric_labels(endpoint=endpoint, method=request.method,
+                                                          status=status or 500))
+    metrics.observe('db_queries_per_request', queries, by_endpoint)
+    if queries:
+        metrics.inc('db_queries_total', queries, by_endpoint)
+        metrics.inc('db_seconds_total', sql_seconds, by_endpoint)
+    if endpoint in UPLOAD_ENDPOINTS and request.content_length:
+        metrics.inc('upload_bytes_total', request.content_length, by_endpoint)
+        metrics.inc('upload_seconds_total', elapsed, by_endpoint)
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context() and 'metrics' in g:
+        g.metrics[1] += 1
+        g.metrics[2] += elapsed
+
+with app.app_context():
+    for engine in db.engines.values():
+        db.event.listen(engine, 'before_cursor_execute', start_query_timer)
+        db.event.listen(engine, 'after_cursor_execute', record_query)
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    if 'metrics' in g:
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_template(sender, template, context, **extra):
+    started = g.get('template_started')
+    if started:
+        metrics.observe('template_render_seconds', time.perf_counter() - started.pop(),
+                        metric_labels(template=template.name or 'string'))
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    """Prometheus scrape target; needs `Authorization: Bearer <METRICS_TOKEN>` when that is set"""
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(403)
+    return app.response_class(metrics.render(cache_hit_ratios), mimetype='text/plain; version=0.0.4')
+
+# Profiling: sample a worker's stacks at /admin/profile, or cProfile a single
+# request that carries an X-Profile header made by `flask profile-header`.
+# Without PROFILING_KEY the routes 404 and no per-request hook is installed.
+def require_profiling_key():
+    key = app.config['PROFILING_KEY']
+    if not key:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {key}'):
+        abort(403)
+
+@app.route('/admin/profile')
+@limiter.exempt
+def profile_worker():
+    """Sample this worker's stacks for ?seconds= and return them collapsed, ready for flamegraph.pl or speedscope"""
+    require_profiling_key()
+    seconds = min(request.args.get('seconds', 10, type=float), app.config['PROFILE_MAX_SECONDS'])
+    interval = max(request.args.get('interval', 0.005, type=float), 0.001)
+    counts = profiler.sample_stacks(seconds, interval, waiting=request.args.get('waiting') == '1')
+    response = app.response_class(profiler.format_collapsed(counts), mimetype='text/plain')
+    response.headers['X-Profile-Worker'] = str(os.getpid())
+    response.headers['X-Profile-Samples'] = str(sum(counts.values()))
+    return response
+
+@app.route('/admin/profile/requests/<name>')
+@limiter.exempt
+def profile_download(name):
+    """A saved per-request profile, readable with pstats or snakeviz"""
+    require_profiling_key()
+    return send_from_directory(app.config['PROFILE_DIR'], name, mimetype='application/octet-stream',
+                               as_attachment=True)
+
+def start_request_profile():
+    value = request.headers.get('X-Profile')
+    if value and profiler.verify(app.config['PROFILING_KEY'], request.method, request.path, value):
+        request_profiler = profiler.RequestProfiler()
+        if request_profiler.start():
+            g.request_profiler = request_profiler
+
+def save_request_profile(response):
+    request_profiler = g.pop('request_profiler', None)
+    if request_profiler is not None:
+        profile = request_profiler.stop()
+        os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+        name = f'{int(time.time())}-{request.endpoint or "unmatched"}-{os.getpid()}-{uuid.uuid4().hex[:8]}.prof'
+        profile.dump_stats(os.path.join(app.config['PROFILE_DIR'], name))
+        response.headers['X-Profile-File'] = name
+    return response
+
+def stop_request_profile(exc):
+    # Requests that raised never reach after_request
+    request_profiler = g.pop('request_profiler', None)
+    if request_profiler is not None:
+        request_profiler.stop()
+
+if app.config['PROFILING_KEY']:
+    app.before_request(start_request_profile)
+    app.after_request(save_request_profile)
+    app.teardown_request(stop_request_profile)
+
+@app.cli.command('profile-header')
+@click.argument('path')
+@click.option('--method', default='GET', show_default=True)
+@click.option('--ttl', default=300, show_default=True, help='Seconds the header stays valid')
+def profile_header_command(path, method, ttl):
+    """Print an X-Profile header that makes the server cProfile METHOD PATH"""
+    if not app.config['PROFILING_KEY']:
+        raise click.ClickException('Set PROFILING_KEY first')
+    value = profiler.sign(app.config['PROFILING_KEY'], method, path, int(time.time()) + ttl)
+    click.echo(f'X-Profile: {value}')
+
 # Middleware to check if user is logged in
+# Session validation: remembers which user ids were recently confirmed to
+# exist so check_session_expiry() does not hit the database on every request
+validated_users = TTLCache(maxsize=10000, ttl=app.config['SESSION_USER_CACHE_TTL'])
+SESSION_EXEMPT_ENDPOINTS = {'static', 'health', 'stream_audio', 'post_peaks', 'metrics_endpoint',
+                            'profile_worker', 'profile_download'}
+
+@db.event.listens_for(User, 'after_delete')
+def forget_deleted_user(mapper, connection, target):
+    validated_users.invalidate(target.id)
+
+def session_user_valid(user_id, username):
+    """Check the session identity against the DB, at most once per cache TTL"""
+    cached = validated_users.get(user_id)
+    if cached is None:
+        row = db.session.query(User.username).filter_by(id=user_id).first()
+        if row is None:
+            return False
+        cached = row.username
+        validated_users.set(user_id, cached)
+    # Older sessions only carry user_id; for those existence is enough
+    return username is None or cached == username
+
+def touch_session():
+    """Refresh last_activity at coarse granularity to avoid a Set-Cookie per response"""
+    now = time.time()
+    if now - session.get('last_activity', 0) >= app.config['SESSION_ACTIVITY_REFRESH']:
+        session['last_activity'] = now
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -209,10 +973,225 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Query layer: every page fetches its rows plus a fixed number of batched
+# lookups instead of lazy-loading relationships once per row in templates.
+# Counts come from the denormalized counter columns.
+def feed_query():
+    """Posts with their authors and comment threads loaded up front"""
+    return Post.query.options(
+        joinedload(Post.author),
+        selectinload(Post.comments).joinedload(Comment.author)
+    )
+
+def bump_counter(model, row_id, column, delta=1):
+    """Atomically apply `column = column + delta` in the current transaction.
+
+    Returns the new value so callers never need to re-count source rows.
+    """
+    counter = getattr(model, column)
+    return db.session.execute(
+        db.update(model).where(model.id == row_id)
+        .values({column: counter + delta}).returning(counter)
+    ).scalar()
+
+def is_following(follower_id, followed_id):
+    """Check a single follow edge without loading either user"""
+    return db.session.query(followers).filter_by(
+        follower_id=follower_id, followed_id=followed_id
+    ).first() is not None
+
+# Home timelines, fanned out on write: inserting a post copies it into the
+# timeline rows of its author and their followers, so a page is one index
+# range scan. Authors with TIMELINE_FANOUT_LIMIT or more followers are not
+# fanned out; a reader's page pulls in the latest posts of each such account
+# they follow instead, one short limited query each.
+def timeline_readers(author_id):
+    """The author plus, unless there are too many of them, their followers"""
+    fans = db.select(followers.c.follower_id.label('user_id')).where(
+        followers.c.followed_id == author_id,
+        db.select(User.followers_count).where(User.id == author_id).scalar_subquery()
+        < app.config['TIMELINE_FANOUT_LIMIT']
+    )
+    return db.union(fans, db.select(db.literal(author_id).label('user_id')))
+
+@db.event.listens_for(Post, 'after_insert')
+def fan_out_post(mapper, connection, post):
+    """Copy a new post into the timelines it belongs in, in the transaction that creates it"""
+    readers = timeline_readers(post.user_id).subquery()
+    connection.execute(db.insert(TimelineEntry).from_select(
+        ['user_id', 'post_id', 'author_id', 'timestamp'],
+        db.select(readers.c.user_id, db.literal(post.id), db.literal(post.user_id),
+                  db.literal(post.timestamp, db.DateTime))
+    ))
+
+@db.event.listens_for(Post, 'before_delete')
+def remove_from_timelines(mapper, connection, post):
+    connection.execute(db.delete(TimelineEntry).where(TimelineEntry.post_id == post.id))
+
+def follow_timeline(user_id, author_id, author_followers):
+    """Add a newly followed author's latest posts to a timeline"""
+    if author_followers >= app.config['TIMELINE_FANOUT_LIMIT']:
+        return  # pulled in when the timeline is read
+    already_there = db.exists().where(TimelineEntry.user_id == user_id, TimelineEntry.post_id == Post.id)
+    db.session.execute(db.insert(TimelineEntry).from_select(
+        ['user_id', 'post_id', 'author_id', 'timestamp'],
+        db.select(db.literal(user_id), Post.id, Post.user_id, Post.timestamp)
+        .where(Post.user_id == author_id, ~already_there)
+        .order_by(Post.timestamp.desc(), Post.id.desc())
+        .limit(app.config['TIMELINE_LENGTH'])
+    ))
+
+def unfollow_timeline(user_id, author_id):
+    db.session.execute(db.delete(TimelineEntry).where(
+        TimelineEntry.user_id == user_id, TimelineEntry.author_id == author_id
+    ))
+
+def rebuild_timeline(user_id):
+    """Refill one timeline from its own and its fanned-out follows' latest posts"""
+    db.session.execute(db.delete(TimelineEntry).where(TimelineEntry.user_id == user_id))
+    fanned_out = db.select(followers.c.followed_id) \
+        .join(User, User.id == followers.c.followed_id) \
+        .where(followers.c.follower_id == user_id,
+               User.followers_count < app.config['TIMELINE_FANOUT_LIMIT'])
+    authors = db.union(fanned_out, db.select(db.literal(user_id)))
+    db.session.execute(db.insert(TimelineEntry).from_select(
+        ['user_id', 'post_id', 'author_id', 'timestamp'],
+        db.select(db.literal(user_id), Post.id, Post.user_id, Post.timestamp)
+        .where(Post.user_id.in_(authors))
+        .order_by(Post.timestamp.desc(), Post.id.desc())
+        .limit(app.config['TIMELINE_LENGTH'])
+    ))
+
+def trim_timelines():
+    """Cut every timeline back to its newest TIMELINE_LENGTH entries; returns how many went"""
+    rank = db.func.row_number().over(
+        partition_by=TimelineEntry.user_id,
+        order_by=(TimelineEntry.timestamp.desc(), TimelineEntry.post_id.desc())
+    )
+    ranked = db.select(TimelineEntry.user_id, TimelineEntry.post_id, rank.label('rank')).subquery()
+    stale = db.select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.rank > app.config['TIMELINE_LENGTH'])
+    removed = db.session.execute(db.delete(TimelineEntry).where(
+        db.tuple_(TimelineEntry.user_id, TimelineEntry.post_id).in_(stale)
+    )).rowcount
+    db.session.commit()
+    return removed
+
+def _followed_big_accounts_query():
+    big = db.aliased(User)
+    # Walks the (few) big accounts by their followers_count index, not everyone the user follows
+    follows_big = db.exists().where(followers.c.follower_id == User.id, followers.c.followed_id == big.id)
+    return db.select(User.following_count, big.id).select_from(User) \
+        .outerjoin(big, db.and_(big.followers_count >= db.bindparam('fanout_limit'), follows_big)) \
+        .where(User.id == db.bindparam('user_id'))
+
+FOLLOWED_BIG_ACCOUNTS = _followed_big_accounts_query()  # built once; it runs on every feed page
+
+def followed_big_accounts(user_id):
+    """How many accounts a user follows, and the ids of those that are not fanned out"""
+    rows = db.session.execute(FOLLOWED_BIG_ACCOUNTS, {
+        'user_id': user_id, 'fanout_limit': app.config['TIMELINE_FANOUT_LIMIT']
+    }).all()
+    if not rows:
+        return 0, []
+    return rows[0][0], [big_id for _, big_id in rows if big_id is not None]
+
+def timeline_page(user_id, big_ids, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of a home timeline, newest first, plus the next cursor (as keyset_page).
+
+    Reads at most limit + 1 timeline rows and limit + 1 posts per big
+    account in one statement, merges them, then loads the page's posts.
+    """
+    position = decode_cursor(cursor) if cursor else None
+
+    def newest(query, timestamp_col, id_col):
+        if position:
+            query = query.where(db.tuple_(timestamp_col, id_col) < db.tuple_(*position))
+        limited = query.order_by(timestamp_col.desc(), id_col.desc()).limit(limit + 1).subquery()
+        return db.select(*limited.c)
+
+    sources = [newest(db.select(TimelineEntry.timestamp, TimelineEntry.post_id)
+                      .where(TimelineEntry.user_id == user_id),
+                      TimelineEntry.timestamp, TimelineEntry.post_id)]
+    sources += [newest(db.select(Post.timestamp, Post.id).where(Post.user_id == author_id),
+                       Post.timestamp, Post.id)
+                for author_id in big_ids]
+    # A set, since posts from before an author outgrew fan-out are in both
+    keys = sorted({tuple(row) for row in db.session.execute(db.union_all(*sources))}, reverse=True)
+    page = keys[:limit]
+    loaded = {post.id: post for post in feed_query().filter(Post.id.in_([post_id for _, post_id in page]))} \
+        if page else {}
+    posts = [loaded[post_id] for _, post_id in page if post_id in loaded]
+    next_cursor = encode_cursor(*page[-1]) if len(keys) > limit else None
+    return posts, next_cursor
+
+def home_feed(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """The user's home timeline page after `cursor`; everyone's posts while they follow nobody"""
+    following_count, big_ids = followed_big_accounts(user_id)
+    if not following_count:
+        return keyset_page(feed_query(), Post.timestamp, Post.id, cursor=cursor, limit=limit)
+    return timeline_page(user_id, big_ids, cursor, limit)
+
+@app.cli.command('rebuild-timelines')
+@click.option('--username', help='Only rebuild this user\'s timeline')
+@click.option('--batch-size', default=500, show_default=True, help='Timelines per commit')
+def rebuild_timelines_command(username, batch_size):
+    """Refill home timelines from follows, e.g. after changing TIMELINE_FANOUT_LIMIT"""
+    query = db.session.query(User.id).order_by(User.id)
+    if username:
+        query = query.filter_by(username=username)
+    user_ids = [user_id for user_id, in query]
+    for done, user_id in enumerate(user_ids, 1):
+        rebuild_timeline(user_id)
+        if done % batch_size == 0:
+            db.session.commit()
+            click.echo(f'{done}/{len(user_ids)} timelines rebuilt')
+    db.session.commit()
+    click.echo(f'Rebuilt {len(user_ids)} timelines')
+
+@app.cli.command('trim-timelines')
+def trim_timelines_command():
+    """Cut home timelines back to TIMELINE_LENGTH entries; run it from cron"""
+    click.echo(f'Removed {trim_timelines()} old timeline entries')
+
+# Cache invalidation: changes collect the cache scopes they touch while the
+# session flushes, and the scopes are bumped only once the commit succeeds
+def invalidate_on_commit(*scopes):
+    db.session.info.setdefault('cache_scopes', set()).update(scopes)
+
+@db.event.listens_for(db.session, 'after_flush')
+def collect_cache_scopes(flush_session, flush_context):
+    scopes = flush_session.info.setdefault('cache_scopes', set())
+    for obj in set(flush_session.new) | set(flush_session.dirty) | set(flush_session.deleted):
+        if isinstance(obj, Post):
+            scopes.update({f'post:{obj.id}', f'user:{obj.user_id}'})
+        elif isinstance(obj, (Like, Comment)):
+            author_id = flush_session.execute(
+                db.select(Post.user_id).where(Post.id == obj.post_id)
+            ).scalar()
+            scopes.update({f'post:{obj.post_id}', f'user:{author_id}'})
+        elif isinstance(obj, User):
+            scopes.add(f'user:{obj.id}')
+            added, _, removed = sa_inspect(obj).attrs.following.history
+            scopes.update(f'user:{other.id}' for other in [*(added or ()), *(removed or ())])
+
+@db.event.listens_for(db.session, 'after_commit')
+def flush_cache_scopes(committed_session):
+    scopes = committed_session.info.pop('cache_scopes', None)
+    if scopes:
+        view_cache.invalidate(*scopes)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def drop_cache_scopes(rolled_back_session):
+    rolled_back_session.info.pop('cache_scopes', None)
+
+def cacheable_request():
+    """Only plain GETs without pending flash messages can share a cached page"""
+    return request.method == 'GET' and '_flashes' not in session
+
 # Routes that go HARD 💪
 @app.route('/')
 def index():
-    app.logger.info(f'Index route accessed. Session: {session}')
+    app.logger.debug('Index route accessed')
     
     if 'user_id' not in session:
         app.logger.info('No user_id in session, redirecting to welcome')
@@ -222,27 +1201,53 @@ def index():
         current_user = User.query.filter_by(id=session['user_id']).first()
         if not current_user:
             session.clear()
-            app.logger.warning(f'User session exists but user not found in DB 🤔')
+            app.logger.warning('User session exists but user not found in DB 🤔')
             return redirect(url_for('login'))
 
-        # Get all posts for feed
-        posts = Post.query.order_by(Post.timestamp.desc()).all()
-        app.logger.info(f'User {current_user.username} accessed feed 🎵')
+        # First page of the feed; later pages come from /api/feed
+        posts, next_cursor = home_feed(current_user.id)
+        app.logger.info('User %s accessed feed 🎵', current_user.username)
         # Force render the index template for logged in users
-        return render_template('index.html', posts=posts, current_user=current_user)
+        return render_template('index.html', posts=posts, next_cursor=next_cursor,
+                               current_user=current_user)
     except Exception as e:
-        app.logger.error(f'Error loading feed: {str(e)} 😢')
+        app.logger.error('Error loading feed: %s 😢', e)
         session.clear()
         flash('Having trouble loading the beats... Try again! 🎵', 'error')
         return redirect(url_for('login'))
 
+@app.route('/api/feed')
+@login_required
+def api_feed():
+    """Return the feed page that follows `cursor` as JSON"""
+    try:
+        posts, next_cursor = home_feed(
+            session['user_id'],
+            cursor=request.args.get('cursor'),
+            limit=clamp_page_size(request.args.get('limit'))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'posts': [dict(
+            post.to_dict(include_pattern=False),
+            author_url=url_for('profile', username=post.author.username),
+            music_url=url_for('stream_audio', path=post.music_file),
+            peaks_url=url_for('post_peaks', post_id=post.id)
+        ) for post in posts],
+        'next_cursor': next_cursor
+    })
+
 @app.route('/welcome')
 def welcome():
     # If user is logged in, they should see the feed
     if 'user_id' in session:
-        app.logger.info(f'Welcome route: Redirecting logged in user {session["user_id"]} to feed')
+        app.logger.info('Welcome route: Redirecting logged in user %s to feed', session['user_id'])
         return redirect(url_for('index'))
     app.logger.info('Welcome route: Showing welcome page to anonymous user')
+    if cacheable_request():
+        return view_cache.get_or_render('welcome', lambda: render_template('welcome.html'))
     return render_template('welcome.html')
 
 @app.route('/signup', methods=['GET', 'POST'])
@@ -290,7 +1295,7 @@ def signup():
             try:
                 db.session.add(user)
                 db.session.commit()
-                app.logger.info(f'New user registered successfully: {username} 🎉')
+                app.logger.info('New user registered successfully: %s 🎉', username)
                 
                 # Log them in automatically
                 session.clear()
@@ -304,12 +1309,12 @@ def signup():
                 
             except Exception as e:
                 db.session.rollback()
-                app.logger.error(f'Database error during signup: {str(e)} 😢')
+                app.logger.error('Database error during signup: %s 😢', e)
                 flash('Something went wrong! Try again later 😢', 'error')
                 return redirect(url_for('signup'))
                 
         except Exception as e:
-            app.logger.error(f'Error during signup: {str(e)} 😢')
+            app.logger.error('Error during signup: %s 😢', e)
             flash('Something went wrong! Try again later 😢', 'error')
             return redirect(url_for('signup'))
             
@@ -317,11 +1322,11 @@ def signup():
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    app.logger.info(f'Login route accessed. Method: {request.method}, Session: {session}')
+    app.logger.debug('Login route accessed. Method: %s', request.method)
     
     # Don't clear session on GET requests
     if request.method == 'GET' and 'user_id' in session:
-        app.logger.info(f'Already logged in user {session["user_id"]} accessing login page')
+        app.logger.info('Already logged in user %s accessing login page', session['user_id'])
         return redirect(url_for('index'))
         
     if request.method == 'POST':
@@ -329,7 +1334,7 @@ def login():
             username = request.form.get('username', '').strip()
             password = request.form.get('password', '').strip()
             
-            app.logger.info(f'Login attempt for username: {username}')
+            app.logger.info('Login attempt for username: %s', username)
             
             # Validate input
             if not username or not password:
@@ -340,12 +1345,12 @@ def login():
             user = User.query.filter_by(username=username).first()
             
             if user is None:
-                app.logger.warning(f'Login failed - user not found: {username}')
+                app.logger.warning('Login failed - user not found: %s', username)
                 flash('Invalid username or password! 🚫', 'error')
                 return redirect(url_for('login'))
             
             if not check_password_hash(user.password_hash, password):
-                app.logger.warning(f'Login failed - invalid password for user: {username}')
+                app.logger.warning('Login failed - invalid password for user: %s', username)
                 flash('Invalid username or password! 🚫', 'error')
                 return redirect(url_for('login'))
             
@@ -359,8 +1364,7 @@ def login():
             # Force session to be saved
             session.modified = True
             
-            app.logger.info(f'User logged in successfully: {username} 🎵 (ID: {user.id})')
-            app.logger.info(f'Session after login: {session}')
+            app.logger.info('User logged in successfully: %s 🎵 (ID: %s)', username, user.id)
             
             flash(f'Welcome back, {username}! Ready to make some music? 🎵', 'success')
             
@@ -373,7 +1377,7 @@ def login():
             return redirect(url_for('index'))
                 
         except Exception as e:
-            app.logger.error(f'Login error: {str(e)} 😢')
+            app.logger.error('Login error: %s 😢', e)
             flash('Something went wrong! Please try again. 😅', 'error')
             return redirect(url_for('login'))
             
@@ -392,19 +1396,19 @@ def check_login():
             session.clear()
             return jsonify({'logged_in': False})
             
-        # Update last activity
-        session['last_activity'] = time.time()
+        touch_session()
         return jsonify({'logged_in': True})
         
     except Exception as e:
-        app.logger.error(f"Login check error: {str(e)}")
+        app.logger.error('Login check error: %s', e)
         return jsonify({'logged_in': False})
 
 @app.before_request
 def check_session_expiry():
     """Check session expiry before each request"""
-    app.logger.debug(f'Checking session before request: {session}')
-    
+    if request.endpoint in SESSION_EXEMPT_ENDPOINTS:
+        return
+
     if 'user_id' in session:
         last_activity = session.get('last_activity', 0)
         if time.time() - last_activity > app.config['PERMANENT_SESSION_LIFETIME'].total_seconds():
@@ -413,23 +1417,173 @@ def check_session_expiry():
             flash('Session expired! Please log in again. 🔑', 'warning')
             return redirect(url_for('login'))
             
-        # Update last activity
-        session['last_activity'] = time.time()
-        session.modified = True
+        touch_session()
         
-        # Verify user still exists in DB
+        # Verify user still exists in DB (cached for SESSION_USER_CACHE_TTL)
         try:
-            user = User.query.get(session['user_id'])
-            if not user:
-                app.logger.warning(f'User {session["user_id"]} not found in DB, clearing session')
+            if not session_user_valid(session['user_id'], session.get('username')):
+                app.logger.warning('User %s not found in DB, clearing session', session['user_id'])
                 session.clear()
                 flash('Please log in again! 🎸', 'warning')
                 return redirect(url_for('login'))
         except Exception as e:
-            app.logger.error(f'Error checking user in DB: {str(e)}')
+            app.logger.error('Error checking user in DB: %s', e)
             session.clear()
             return redirect(url_for('login'))
 
+@app.before_request
+def route_reads_to_replicas():
+    # Exempt endpoints leave the session cookie alone, so they cannot tell
+    # who just wrote; they read from the primary
+    if not REPLICA_BINDS or request.method not in ('GET', 'HEAD') or request.endpoint in SESSION_EXEMPT_ENDPOINTS:
+        return
+    if session.get('read_primary_until', 0) < time.time():
+        db_routing.use_replicas(db.session, REPLICA_BINDS)
+
+@app.after_request
+def stick_writers_to_primary(response):
+    if REPLICA_BINDS and request.endpoint not in SESSION_EXEMPT_ENDPOINTS and db_routing.has_written(db.session):
+        session['read_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+@app.route('/health')
+def health():
+    """Liveness probe; skips session handling entirely"""
+    return jsonify({'status': 'ok'})
+
+def owned_upload(upload_id):
+    """Metadata for one of the current user's uploads, or a 404"""
+    try:
+        meta = upload_store.meta(upload_id)
+    except UploadNotFound:
+        abort(404)
+    if meta['owner_id'] != session['user_id']:
+        abort(404)
+    return meta
+
+@app.route('/upload/init', methods=['POST'])
+@login_required
+def upload_init():
+    """Start a resumable upload; the file follows in PUT /upload/<id> chunks"""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename', '')))
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        size = 0
+    if not allowed_file(filename):
+        return jsonify({'error': 'We only accept MP3, WAV, OGG, M4A, and AAC! 🎵'}), 400
+    try:
+        upload_id = upload_store.create(filename, size, session['user_id'])
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'upload_id': upload_id,
+        'offset': 0,
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+    }), 201
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+@limiter.exempt
+@login_required
+def upload_status(upload_id):
+    """Where to resume an interrupted upload from"""
+    meta = owned_upload(upload_id)
+    return jsonify({'offset': upload_store.offset(upload_id), 'size': meta['size']})
+
+@app.route('/upload/<upload_id>', methods=['PUT'])
+@limiter.exempt
+@login_required
+def upload_chunk(upload_id):
+    """Append the request body at the offset given by Content-Range ("bytes start-end/total")"""
+    owned_upload(upload_id)
+    content_range = request.headers.get('Content-Range', '')
+    try:
+        offset = int(content_range.split()[1].split('-')[0]) if content_range else 0
+    except (IndexError, ValueError):
+        return jsonify({'error': 'Malformed Content-Range'}), 400
+    try:
+        offset = upload_store.append(upload_id, offset, request.stream, request.content_length)
+    except OffsetMismatch as e:
+        return jsonify({'error': str(e), 'offset': e.expected}), 409
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'offset': offset})
+
+@app.route('/upload/<upload_id>', methods=['DELETE'])
+@login_required
+def upload_cancel(upload_id):
+    owned_upload(upload_id)
+    upload_store.discard(upload_id)
+    return '', 204
+
+@app.route('/upload/<upload_id>/complete', methods=['POST'])
+@login_required
+def upload_complete(upload_id):
+    """Turn a fully received upload into a post and queue its audio processing"""
+    owned_upload(upload_id)
+    title = request.form.get('title', '').strip()
+    if not title:
+        return jsonify({'error': 'Your track needs a title! 🎤'}), 400
+    try:
+        filename = claim_upload(upload_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        post = Post(
+            title=title,
+            description=request.form.get('description', ''),
+            music_file=filename,
+            user_id=session['user_id'],
+            audio_status='processing'
+        )
+        db.session.add(post)
+        bump_counter(User, session['user_id'], 'posts_count')
+        db.session.commit()
+    except Exception as e:
+        # The blob reference rolls back too; a stored file nobody references
+        # is left for scripts/dedupe_uploads.py --gc
+        db.session.rollback()
+        app.logger.error('Error creating post for upload %s: %s', upload_id, e)
+        return jsonify({'error': 'Something went wrong! Try again later 😢'}), 500
+
+    queue_audio_processing(post)
+    app.logger.info('New track uploaded successfully: %s by user %s', filename, session['user_id'])
+    flash('Your track is live! Let\'s get this bread! 🍞', 'success')
+    return jsonify({
+        'success': True,
+        'post_id': post.id,
+        'redirect_url': url_for('profile', username=post.author.username)
+    })
+
+@app.route('/audio/<path:path>')
+@limiter.exempt
+def stream_audio(path):
+    """Serve an uploaded track with byte-range support for seeking players"""
+    file_path = safe_join(app.config['UPLOAD_FOLDER'], path)
+    if file_path is None or not os.path.isfile(file_path):
+        abort(404)
+    # Content-addressed names never change content, so they can be cached
+    # forever; pre-dedupe uploads fall back to an mtime/size validator
+    digest = audio_store.digest_of(path)
+    return send_file_range(request, file_path, etag=digest, immutable=digest is not None)
+
+@app.route('/post/<int:post_id>/peaks')
+@limiter.exempt
+def post_peaks(post_id):
+    """Precomputed waveform peaks in the binary format described in services/waveform.py"""
+    music_file = db.session.scalar(db.select(Post.music_file).where(Post.id == post_id))
+    if music_file is None:
+        abort(404)
+    file_path = audio_store.absolute_path(waveform.peaks_path(music_file))
+    if not os.path.isfile(file_path):
+        abort(404)  # Not computed yet; players fall back to decoding the audio
+    # Not immutable: reprocessing can point the post at a different file
+    digest = audio_store.digest_of(music_file)
+    return send_file_range(request, file_path, etag=digest and f'{digest}-peaks',
+                           mimetype='application/octet-stream', max_age=300)
+
 @app.route('/post/new', methods=['GET', 'POST'])
 @login_required
 def new_post():
@@ -450,50 +1604,50 @@ def new_post():
                 return redirect(request.url)
             
             # Check file size before processing
-            if request.content_length > app.config['MAX_CONTENT_LENGTH']:
-                app.logger.warning(f'File too large: {request.content_length} bytes')
+            if (request.content_length or 0) > app.config['MAX_CONTENT_LENGTH']:
+                app.logger.warning('File too large: %s bytes', request.content_length)
                 flash('File too large! Keep it under 50MB fam! 📦', 'warning')
                 return redirect(request.url)
                 
             # Validate file type
             if not allowed_file(file.filename):
-                app.logger.warning(f'Invalid file type: {file.filename}')
+                app.logger.warning('Invalid file type: %s', file.filename)
                 flash('Invalid file type! We only accept MP3, WAV, OGG, M4A, and AAC! 🎵', 'warning')
                 return redirect(request.url)
             
             try:
-                # Generate unique filename and save file
+                # Stage the file, then move it into content-addressed storage
                 filename = generate_unique_filename(secure_filename(file.filename))
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                
-                # Verify file was saved successfully
-                if not os.path.exists(file_path):
-                    raise Exception('File failed to save')
+                file_path = os.path.join(app.config['UPLOAD_CHUNK_FOLDER'], filename)
+                digest = save_stream(file.stream, file_path)
+                filename = store_audio(file_path, filename, digest=digest)
                 
                 # Create post record
                 post = Post(
                     title=request.form['title'],
                     description=request.form['description'],
                     music_file=filename,
-                    user_id=session['user_id']
+                    user_id=session['user_id'],
+                    audio_status='processing'
                 )
                 db.session.add(post)
+                bump_counter(User, session['user_id'], 'posts_count')
                 db.session.commit()
+                queue_audio_processing(post)
                 
-                app.logger.info(f'New track uploaded successfully: {filename} by user {session["user_id"]}')
+                app.logger.info('New track uploaded successfully: %s by user %s', filename, session['user_id'])
                 flash('Your track is live! Let\'s get this bread! 🍞', 'success')
                 return redirect(url_for('profile', username=post.author.username))
                 
             except Exception as e:
-                # Clean up file if it was saved but database operation failed
+                # Clean up the staged file if it never made it into storage
                 if os.path.exists(file_path):
                     os.remove(file_path)
                 raise e
                 
         except Exception as e:
             db.session.rollback()
-            app.logger.error(f'Error uploading track: {str(e)}')
+            app.logger.error('Error uploading track: %s', e)
             flash('Something went wrong! Try again later 😢', 'error')
             return redirect(request.url)
             
@@ -501,7 +1655,7 @@ def new_post():
 
 @app.route('/like/<int:post_id>', methods=['POST'])
 @login_required
-@rate_limit
+@rate_limit('like')
 def like_post(post_id):
     try:
         existing_like = Like.query.filter_by(
@@ -511,11 +1665,13 @@ def like_post(post_id):
         
         if existing_like:
             db.session.delete(existing_like)
+            likes_count = bump_counter(Post, post_id, 'likes_count', -1)
             message = 'Unlike... tough crowd 😢'
             status = 'unliked'
         else:
             like = Like(user_id=session['user_id'], post_id=post_id)
             db.session.add(like)
+            likes_count = bump_counter(Post, post_id, 'likes_count')
             message = 'You\'re vibing with this! 🎵'
             status = 'liked'
             
@@ -523,13 +1679,13 @@ def like_post(post_id):
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({
                 'status': status,
-                'likes_count': Like.query.filter_by(post_id=post_id).count()
+                'likes_count': likes_count
             })
         flash(message)
         return redirect(request.referrer or url_for('index'))
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Error in like operation: {e}')
+        app.logger.error('Error in like operation: %s', e)
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'error': 'Failed to update like status'}), 500
         flash('Something went wrong! Try again later 😢', 'error')
@@ -537,7 +1693,7 @@ def like_post(post_id):
 
 @app.route('/post/<int:post_id>/comment', methods=['POST'])
 @login_required
-@rate_limit
+@rate_limit('comment')
 def add_comment(post_id):
     try:
         content = request.form.get('content')
@@ -550,8 +1706,9 @@ def add_comment(post_id):
             post_id=post_id
         )
         db.session.add(comment)
+        bump_counter(Post, post_id, 'comments_count')
         db.session.commit()
-        app.logger.info(f'New comment added on post {post_id} by user {session["user_id"]}')
+        app.logger.info('New comment added on post %s by user %s', post_id, session['user_id'])
         
         return jsonify({
             'id': comment.id,
@@ -563,41 +1720,48 @@ def add_comment(post_id):
         })
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Error adding comment: {e}')
+        app.logger.error('Error adding comment: %s', e)
         return jsonify({'error': 'Failed to add comment'}), 500
 
 @app.route('/post/<int:post_id>/play', methods=['POST'])
-@rate_limit
+@rate_limit('play')
 def track_play(post_id):
+    post = db.session.query(Post.play_count).filter_by(id=post_id).first()
+    if post is None:
+        abort(404)
     try:
-        post = Post.query.get_or_404(post_id)
-        post.play_count += 1
-        db.session.commit()
-        app.logger.info(f'Track {post_id} played. New count: {post.play_count}')
-        return jsonify({'play_count': post.play_count})
+        # Counted in memory and flushed in batches; see flush_play_counts()
+        pending = play_buffer.record(post_id)
+        return jsonify({'play_count': (post.play_count or 0) + pending})
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Error updating play count: {e}')
+        app.logger.error('Error updating play count: %s', e)
         return jsonify({'error': 'Failed to update play count'}), 500
 
 @app.route('/user/<username>')
 def profile(username):
     try:
         user = User.query.filter_by(username=username).first_or_404()
-        posts = Post.query.filter_by(user_id=user.id).order_by(Post.timestamp.desc()).all()
-        is_following = False
-        if 'user_id' in session:
-            current_user = User.query.get(session['user_id'])
-            is_following = current_user.following.filter_by(id=user.id).first() is not None
-        return render_template('profile.html', user=user, posts=posts, is_following=is_following)
+        viewer_id = session.get('user_id')
+
+        def render():
+            posts = Post.query.filter_by(user_id=user.id).order_by(Post.timestamp.desc()).all()
+            following = is_following(viewer_id, user.id) if viewer_id else False
+            return render_template('profile.html', user=user, posts=posts, is_following=following)
+
+        if not cacheable_request():
+            return render()
+        # The page differs per viewer (follow button, edit links)
+        return view_cache.get_or_render('profile', render, scopes=[f'user:{user.id}'],
+                                        variant=f'{user.id}:{viewer_id or "anon"}')
     except Exception as e:
-        app.logger.error(f'Error loading profile: {e}')
+        app.logger.error('Error loading profile: %s', e)
         flash('Profile not found or something went wrong! 😢', 'error')
         return redirect(url_for('index'))
 
 @app.route('/follow/<username>', methods=['POST'])
 @login_required
-@rate_limit
+@rate_limit('follow')
 def follow(username):
     try:
         user_to_follow = User.query.filter_by(username=username).first_or_404()
@@ -606,59 +1770,99 @@ def follow(username):
         if user_to_follow.id == current_user.id:
             return jsonify({'error': 'Cannot follow yourself'}), 400
             
-        if current_user.following.filter_by(id=user_to_follow.id).first():
+        if is_following(current_user.id, user_to_follow.id):
             current_user.following.remove(user_to_follow)
-            db.session.commit()
-            return jsonify({
-                'status': 'unfollowed',
-                'followers_count': user_to_follow.followers.count()
-            })
+            delta, status = -1, 'unfollowed'
         else:
             current_user.following.append(user_to_follow)
-            db.session.commit()
-            return jsonify({
-                'status': 'followed',
-                'followers_count': user_to_follow.followers.count()
-            })
+            delta, status = 1, 'followed'
+
+        db.session.flush()
+        followers_count = bump_counter(User, user_to_follow.id, 'followers_count', delta)
+        bump_counter(User, current_user.id, 'following_count', delta)
+        if delta > 0:
+            follow_timeline(current_user.id, user_to_follow.id, followers_count)
+        else:
+            unfollow_timeline(current_user.id, user_to_follow.id)
+        db.session.commit()
+        return jsonify({
+            'status': status,
+            'followers_count': followers_count
+        })
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Error in follow operation: {e}')
+        app.logger.error('Error in follow operation: %s', e)
         return jsonify({'error': 'Failed to update follow status'}), 500
 
+SEARCH_PAGE_SIZE = 20
+SEARCH_FILTER_COLUMNS = {'genre': 'genre', 'instrument': 'instrument'}
+
+def search_users(query, filter_by='all', limit=SEARCH_PAGE_SIZE, offset=0):
+    """Users matching `query`, best match first"""
+    column = SEARCH_FILTER_COLUMNS.get(filter_by)
+    if app.config.get('FULL_TEXT_SEARCH'):
+        ids = full_text.search_ids(db.session, 'user_fts', query, column, limit, offset,
+                                   window=app.config['SEARCH_RANK_WINDOW'])
+        return full_text.in_order(User.query.filter(User.id.in_(ids)).all(), ids) if ids else []
+
+    # No FTS5 on this database: fall back to substring matching
+    if not query.strip():
+        return []
+    columns = [getattr(User, column)] if column else [User.username, User.genre, User.instrument]
+    return User.query.filter(db.or_(*(col.ilike(f'%{query}%') for col in columns))) \
+        .order_by(User.username).limit(limit).offset(offset).all()
+
+def search_posts(query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """Posts whose title, description or beat style match `query`"""
+    if app.config.get('FULL_TEXT_SEARCH'):
+        ids = full_text.search_ids(db.session, 'post_fts', query, limit=limit, offset=offset,
+                                   window=app.config['SEARCH_RANK_WINDOW'])
+        if not ids:
+            return []
+        return full_text.in_order(Post.query.options(joinedload(Post.author))
+                                  .filter(Post.id.in_(ids)).all(), ids)
+
+    if not query.strip():
+        return []
+    columns = [Post.title, Post.description, Post.style]
+    return Post.query.options(joinedload(Post.author)) \
+        .filter(db.or_(*(col.ilike(f'%{query}%') for col in columns))) \
+        .order_by(Post.timestamp.desc()).limit(limit).offset(offset).all()
+
 @app.route('/search')
 def search():
     try:
         query = request.args.get('q', '')
         filter_by = request.args.get('filter', 'all')
-        
-        if filter_by == 'genre':
-            users = User.query.filter(User.genre.ilike(f'%{query}%')).all()
-        elif filter_by == 'instrument':
-            users = User.query.filter(User.instrument.ilike(f'%{query}%')).all()
-        else:
-            users = User.query.filter(
-                db.or_(
-                    User.username.ilike(f'%{query}%'),
-                    User.genre.ilike(f'%{query}%'),
-                    User.instrument.ilike(f'%{query}%')
-                )
-            ).all()
+        result_type = request.args.get('type', 'users')
+        page = max(request.args.get('page', 1, type=int), 1)
+        offset = (page - 1) * SEARCH_PAGE_SIZE
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            if result_type == 'posts':
+                return jsonify([dict(
+                    post.to_dict(include_pattern=False),
+                    author_url=url_for('profile', username=post.author.username)
+                ) for post in search_posts(query, offset=offset)])
+
             return jsonify([{
                 'username': user.username,
                 'profile_url': url_for('profile', username=user.username),
                 'instrument': user.instrument,
                 'genre': user.genre,
                 'bio': user.bio[:100] + '...' if user.bio else None,
-                'tracks_count': len(user.posts),
-                'followers_count': user.followers.count(),
-                'following_count': user.following.count()
-            } for user in users])
+                'tracks_count': user.posts_count,
+                'followers_count': user.followers_count,
+                'following_count': user.following_count
+            } for user in search_users(query, filter_by, offset=offset)])
             
-        return render_template('search.html', users=users, query=query, filter_by=filter_by)
+        users = search_users(query, filter_by, offset=offset)
+        posts = search_posts(query, offset=offset) if filter_by == 'all' else []
+        has_more = len(users) == SEARCH_PAGE_SIZE or len(posts) == SEARCH_PAGE_SIZE
+        return render_template('search.html', users=users, posts=posts, query=query,
+                               filter_by=filter_by, page=page, has_more=has_more)
     except Exception as e:
-        app.logger.error(f'Error in search: {e}')
+        app.logger.error('Error in search: %s', e)
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'error': 'Search failed'}), 500
         flash('Search failed! Try again later 😢', 'error')
@@ -667,7 +1871,7 @@ def search():
 @app.route('/logout', methods=['POST'])
 def logout():
     if 'user_id' in session:
-        app.logger.info(f'User {session["user_id"]} logged out')
+        app.logger.info('User %s logged out', session['user_id'])
         session.pop('user_id', None)
         flash('Catch you on the flip side! 🤘', 'success')
     return redirect(url_for('login'))
@@ -684,58 +1888,17 @@ def synth(beat_id=None):
 
         current_user = User.query.filter_by(id=session['user_id']).first()
         if not current_user:
-            app.logger.error(f'User not found for ID {session["user_id"]} 😱')
+            app.logger.error('User not found for ID %s 😱', session['user_id'])
             session.clear()
             return redirect(url_for('login'))
 
-        app.logger.info(f'User {current_user.username} accessing synth 🎹')
+        app.logger.info('User %s accessing synth 🎹', current_user.username)
 
         # Available instruments
         instruments = ['kick', 'snare', 'hihat', 'clap', 'tom', 'cymbal']
 
         # Preset beats - absolute fire! 🔥
-        presets = {
-            'techno_basic': {
-                'name': 'Basic Techno',
-                'bpm': 128,
-                'pattern': {
-                    'kick': [1,0,0,0, 1,0,0,0, 1,0,0,0, 1,0,0,0],
-                    'hihat': [0,0,1,0, 0,0,1,0, 0,0,1,0, 0,0,1,0],
-                    'snare': [0,0,0,0, 1,0,0,0, 0,0,0,0, 1,0,0,0],
-                    'clap': [0,0,0,0, 1,0,0,0, 0,0,0,0, 1,0,0,0]
-                }
-            },
-            'techno_groove': {
-                'name': 'Groovy Techno',
-                'bpm': 130,
-                'pattern': {
-                    'kick': [1,0,0,1, 0,0,1,0, 1,0,0,1, 0,0,1,0],
-                    'hihat': [1,1,1,1, 1,1,1,1, 1,1,1,1, 1,1,1,1],
-                    'snare': [0,0,1,0, 0,0,1,0, 0,0,1,0, 0,0,1,0],
-                    'clap': [0,0,0,0, 1,0,0,0, 0,0,0,0, 1,0,0,1]
-                }
-            },
-            'techno_dark': {
-                'name': 'Dark Techno',
-                'bpm': 135,
-                'pattern': {
-                    'kick': [1,0,1,0, 1,0,1,0, 1,0,1,0, 1,0,1,0],
-                    'hihat': [0,1,0,1, 0,1,0,1, 0,1,0,1, 0,1,0,1],
-                    'snare': [0,0,1,0, 0,0,1,0, 0,0,1,0, 0,0,1,0],
-                    'tom': [1,0,0,0, 0,0,0,0, 1,0,0,0, 0,0,0,0]
-                }
-            },
-            'techno_acid': {
-                'name': 'Acid Techno',
-                'bpm': 140,
-                'pattern': {
-                    'kick': [1,0,0,0, 1,0,0,0, 1,0,0,0, 1,1,0,0],
-                    'hihat': [1,1,1,1, 1,1,1,1, 1,1,1,1, 1,1,1,1],
-                    'snare': [0,0,1,0, 0,0,1,0, 0,0,1,0, 0,0,1,1],
-                    'cymbal': [0,0,0,1, 0,0,0,1, 0,0,0,1, 0,0,0,1]
-                }
-            }
-        }
+        presets = BEAT_PRESETS
 
         if beat_id:
             try:
@@ -745,11 +1908,11 @@ def synth(beat_id=None):
                     return redirect(url_for('index'))
 
                 if beat.user_id != current_user.id:
-                    app.logger.warning(f'User {current_user.username} attempted to edit beat {beat_id} without permission')
+                    app.logger.warning('User %s attempted to edit beat %s without permission', current_user.username, beat_id)
                     flash('You can only edit your own beats! 🚫', 'error')
                     return redirect(url_for('index'))
 
-                app.logger.info(f'Loading beat {beat_id} for editing 🎵')
+                app.logger.info('Loading beat %s for editing 🎵', beat_id)
                 return render_template('synth.html',
                     current_user=current_user,
                     beat=beat.to_dict(),
@@ -760,11 +1923,11 @@ def synth(beat_id=None):
                 )
 
             except Exception as e:
-                app.logger.error(f'Error loading beat {beat_id}: {str(e)}')
+                app.logger.error('Error loading beat %s: %s', beat_id, e)
                 flash('Could not load beat... Try again! 😢', 'error')
                 return redirect(url_for('index'))
 
-        app.logger.info(f'User {current_user.username} starting new beat 🎹')
+        app.logger.info('User %s starting new beat 🎹', current_user.username)
         return render_template('synth.html',
             current_user=current_user,
             mode='create',
@@ -774,7 +1937,7 @@ def synth(beat_id=None):
         )
 
     except Exception as e:
-        app.logger.error(f'Unexpected error in synth route: {str(e)}')
+        app.logger.error('Unexpected error in synth route: %s', e)
         flash('Beat lab is having a moment... Try again! 🎛️', 'error')
         return redirect(url_for('index'))
 
@@ -783,15 +1946,37 @@ def synth(beat_id=None):
 def upload_beat():
     try:
         beat_data = json.loads(request.form['beat_data'])
-        audio_file = request.files['audio_file']
-        
-        if not audio_file:
-            return jsonify({'error': 'No audio file uploaded'}), 400
-            
-        # Generate unique filename
-        filename = generate_unique_filename(audio_file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        audio_file.save(file_path)
+        spec = beat_spec(beat_data['pattern'], beat_data.get('effects'))
+        beat_hash = pattern_hash(spec)
+
+        upload_id = request.form.get('upload_id')
+        if upload_id and upload_store.meta(upload_id)['owner_id'] != session['user_id']:
+            return jsonify({'error': 'Upload not found'}), 404
+
+        client_audio = app.config['TRUST_CLIENT_BEAT_AUDIO'] and request.files.get('audio_file')
+        # Without audio of their own, share an identical beat's finished render
+        reused = None if upload_id or client_audio else reuse_beat_audio(beat_hash)
+        if reused:
+            source, filename = reused
+        elif upload_id:
+            # Audio already sent through the chunked upload endpoints
+            filename = claim_upload(upload_id)
+        elif client_audio:
+            audio_file = request.files['audio_file']
+            if not audio_file.filename:
+                return jsonify({'error': 'No audio file uploaded'}), 400
+            if not allowed_file(audio_file.filename):
+                return jsonify({'error': 'We only accept MP3, WAV, OGG, M4A, and AAC! 🎵'}), 400
+            if (request.content_length or 0) > app.config['MAX_CONTENT_LENGTH']:
+                return jsonify({'error': 'File too large! Keep it under 50MB fam! 📦'}), 413
+
+            filename = generate_unique_filename(secure_filename(audio_file.filename))
+            file_path = os.path.join(app.config['UPLOAD_CHUNK_FOLDER'], filename)
+            digest = save_stream(audio_file.stream, file_path)
+            filename = store_audio(file_path, filename, digest=digest)
+        else:
+            # No (trusted) audio from the browser: render the pattern ourselves
+            filename = render_beat_audio(spec)
         
         # Create new post with enhanced beat data
         post = Post(
@@ -799,17 +1984,25 @@ def upload_beat():
             description=beat_data['description'],
             music_file=filename,
             user_id=session['user_id'],
-            beat_data=json.dumps(beat_data['pattern']),
+            pattern=beat_data['pattern'],
             bpm=beat_data['pattern']['bpm'],
             style=beat_data['pattern']['style'],
-            effects_data=json.dumps(beat_data['effects']) if 'effects' in beat_data else None,
-            is_beat_pattern=True
+            effects=beat_data.get('effects'),
+            is_beat_pattern=True,
+            pattern_hash=beat_hash,
+            audio_rendered=not (upload_id or client_audio),
+            audio_status='ready' if reused else 'processing',
+            duration=source.duration if reused else None,
+            bitrate=source.bitrate if reused else None
         )
         
         db.session.add(post)
+        bump_counter(User, session['user_id'], 'posts_count')
         db.session.commit()
+        if not reused:
+            queue_audio_processing(post)
         
-        app.logger.info(f'New beat uploaded by user {session["user_id"]}: {post.title} 🎵')
+        app.logger.info('New beat uploaded by user %s: %s 🎵', session['user_id'], post.title)
         
         return jsonify({
             'success': True,
@@ -817,37 +2010,18 @@ def upload_beat():
             'redirect_url': url_for('profile', username=post.author.username)
         })
         
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Error uploading beat: {e}')
+        app.logger.error('Error uploading beat: %s', e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/test_beat')
 @login_required
 def test_beat():
     # Pre-configured test beat with all features
-    test_pattern = {
-        'bpm': 128,
-        'style': 'techno',
-        'pattern': {
-            'kick': [1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0],
-            'snare': [0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 1],
-            'hihat': [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-            'synth': {
-                'notes': ['C3', 'E3', 'G3', 'B3'],
-                'pattern': [1, 0, 0, 1, 0, 1, 0, 0, 1, 0, 0, 1, 0, 1, 0, 0]
-            },
-            'effects': {
-                'reverb': 0.6,
-                'delay': 0.3,
-                'distortion': 0.2,
-                'filter': {
-                    'frequency': 2000,
-                    'resonance': 2
-                }
-            }
-        }
-    }
+    test_pattern = TEST_PATTERN
     
     app.logger.info('Loading test beat pattern 🎵')
     return render_template('synth.html', test_pattern=test_pattern)
@@ -855,10 +2029,16 @@ def test_beat():
 @app.route('/post/<int:post_id>')
 def view_post(post_id):
     try:
-        post = Post.query.get_or_404(post_id)
-        return render_template('post.html', post=post)
+        def render():
+            post = Post.query.get_or_404(post_id)
+            return render_template('post.html', post=post)
+
+        if not cacheable_request():
+            return render()
+        return view_cache.get_or_render('post', render, scopes=[f'post:{post_id}'],
+                                        variant=str(post_id))
     except Exception as e:
-        app.logger.error(f'Error viewing post: {str(e)}')
+        app.logger.error('Error viewing post: %s', e)
         flash('Post not found or something went wrong! 😢', 'error')
         return redirect(url_for('index'))
 
@@ -871,34 +2051,35 @@ def delete_post(post_id):
             flash('You can only delete your own posts! 🚫', 'error')
             return redirect(url_for('profile', username=post.author.username))
             
-        # Delete associated file
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], post.music_file)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            
+        music_file = post.music_file
+        username = post.author.username
+        release_audio(music_file)
         db.session.delete(post)
+        bump_counter(User, post.user_id, 'posts_count', -1)
         db.session.commit()
+        # Other posts may share the file; it only goes once the last one does
+        collect_audio(music_file)
         flash('Post deleted successfully! 🗑️', 'success')
-        return redirect(url_for('profile', username=post.author.username))
+        return redirect(url_for('profile', username=username))
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Error deleting post: {str(e)}')
+        app.logger.error('Error deleting post: %s', e)
         flash('Something went wrong! Try again later 😢', 'error')
         return redirect(url_for('profile', username=post.author.username))
 
 # Error handlers with style 😎
 @app.errorhandler(404)
 def not_found_error(error):
-    app.logger.warning(f'404 error: {request.url}')
+    app.logger.warning('404 error: %s', request.url)
     return render_template('404.html'), 404
 
 @app.errorhandler(500)
 def internal_error(error):
-    app.logger.error(f'500 error: {error}')
+    app.logger.error('500 error: %s', error)
     db.session.rollback()
     return render_template('500.html'), 500
 
 if __name__ == '__main__':
     port = app.config.get('SERVER_PORT', 5001)
-    app.logger.info(f'Starting development server on port {port} 🚀')
+    app.logger.info('Starting development server on port %s 🚀', port)
     app.run(debug=True, port=port, host='127.0.0.1')
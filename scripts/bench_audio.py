@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Benchmark concurrent seeking clients against the audio endpoint.
+
+Each client opens a keep-alive connection and issues random 64KiB Range
+requests, the way a player does while the user scrubs through a track.
+Reports requests/s and p50/p99 latency, and checks every returned byte.
+
+By default a throwaway file is served by an in-process threaded server,
+once through services.media.send_file_range and once through Flask's plain
+static file handling for comparison. Point --url at a running deployment
+(e.g. gunicorn) to measure that instead; --file must then be a local copy of
+the served track so the returned bytes can be checked.
+
+    python scripts/bench_audio.py --clients 32 --seeks 200
+    python scripts/bench_audio.py --url http://localhost:5001/audio/ab/cd/abcd….mp3 --file track.mp3
+"""
+import argparse
+import http.client
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask, request, send_from_directory  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+from services.media import send_file_range  # noqa: E402
+
+SEEK_SIZE = 64 * 1024
+
+
+def start_server(directory):
+    app = Flask(__name__)
+
+    @app.route('/audio/<name>')
+    def audio(name):
+        return send_file_range(request, os.path.join(directory, name), immutable=True)
+
+    @app.route('/static-file/<name>')
+    def static_file(name):
+        return send_from_directory(directory, name)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_clients(url, data, clients, seeks):
+    parts = urlsplit(url)
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        mine = []
+        for _ in range(seeks):
+            start = rng.randrange(0, max(len(data) - SEEK_SIZE, 1))
+            stop = min(start + SEEK_SIZE, len(data))
+            began = time.perf_counter()
+            conn.request('GET', parts.path, headers={'Range': f'bytes={start}-{stop - 1}'})
+            response = conn.getresponse()
+            body = response.read()
+            mine.append(time.perf_counter() - began)
+            if response.status != 206 or body != data[start:stop]:
+                with lock:
+                    errors.append(f'{response.status} for bytes {start}-{stop - 1}')
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    return latencies, errors, elapsed
+
+
+def report(name, latencies, errors, elapsed):
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f'{name:<16} {len(latencies) / elapsed:>9.0f} req/s   p50 {p50:6.2f} ms   p99 {p99:6.2f} ms'
+          f'   {len(errors)} errors')
+    for error in errors[:5]:
+        print(f'    {error}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seeks', type=int, default=200, help='Range requests per client')
+    parser.add_argument('--size-mb', type=float, default=8, help='Size of the generated test track')
+    parser.add_argument('--url', help='Benchmark a running server instead of the built-in one')
+    parser.add_argument('--file', help='Local copy of the track served at --url')
+    args = parser.parse_args()
+
+    print(f'{args.clients} clients x {args.seeks} seeks of {SEEK_SIZE // 1024}KiB')
+    if args.url:
+        if not args.file:
+            parser.error('--url needs --file to verify the returned bytes')
+        data = Path(args.file).read_bytes()
+        report('remote', *run_clients(args.url, data, args.clients, args.seeks))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='bench_audio_') as directory:
+        data = os.urandom(int(args.size_mb * 1024 * 1024))
+        Path(directory, 'track.mp3').write_bytes(data)
+        server = start_server(directory)
+        base = f'http://127.0.0.1:{server.server_port}'
+        try:
+            report('send_file_range', *run_clients(f'{base}/audio/track.mp3', data, args.clients, args.seeks))
+            report('flask static', *run_clients(f'{base}/static-file/track.mp3', data, args.clients, args.seeks))
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
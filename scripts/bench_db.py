@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Load-test the database engine settings with a mixed read/write workload.
+
+Runs the app against each target database in turn:
+
+* sqlite-journal: a fresh SQLite file in the default rollback-journal mode
+  (what the app ran with before services/db_engine.py)
+* sqlite-wal: a fresh SQLite file with the WAL settings from db_engine
+* postgres: each URL passed with --postgres. Seeded users get a per-run
+  prefix, so the database does not have to be empty, but use a scratch one.
+
+For each target it forks --workers processes from the preloaded app, as
+gunicorn does, each running --threads concurrent clients for --seconds.
+Every client logs in as its own user and loops over feed reads, likes,
+comments and play pings. Reports throughput, p50/p99 latency per operation
+and failed requests.
+
+    python scripts/bench_db.py --workers 4 --threads 8 --seconds 20 \\
+        --postgres postgresql://postgres@localhost/musicstagram_bench
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# (operation, weight, method, url template)
+WORKLOAD = [
+    ('feed', 50, 'GET', '/api/feed'),
+    ('like', 20, 'POST', '/like/{post}'),
+    ('comment', 10, 'POST', '/post/{post}/comment'),
+    ('play', 15, 'POST', '/post/{post}/play'),
+    ('profile', 5, 'GET', '/user/{user}'),
+]
+POSTS = 200
+
+
+def seed(ms, prefix, users):
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash('password')
+    with ms.app.app_context():
+        people = [ms.User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password_hash=password_hash)
+                  for i in range(users)]
+        ms.db.session.add_all(people)
+        ms.db.session.flush()
+        posts = [ms.Post(title=f'Track {n}', user_id=people[n % users].id, music_file=f'{prefix}_{n}.mp3')
+                 for n in range(POSTS)]
+        ms.db.session.add_all(posts)
+        ms.db.session.commit()
+        return [post.id for post in posts]
+
+
+def client_loop(ms, username, usernames, post_ids, start, deadline, samples):
+    client = ms.app.test_client()
+    client.post('/login', data={'username': username, 'password': 'password'})
+    operations = [op for op in WORKLOAD for _ in range(op[1])]
+    headers = {'X-Requested-With': 'XMLHttpRequest', 'Accept': 'application/json'}
+    while time.time() < start:
+        time.sleep(0.001)
+    while time.time() < deadline:
+        name, _, method, url = random.choice(operations)
+        url = url.format(post=random.choice(post_ids), user=random.choice(usernames))
+        began = time.perf_counter()
+        if method == 'GET':
+            response = client.get(url, headers=headers)
+        else:
+            response = client.post(url, headers=headers, data={'content': 'Heat 🔥'})
+        samples.append((name, time.perf_counter() - began, response.status_code < 400))
+
+
+def worker(ms, usernames, post_ids, threads, start, deadline, results):
+    # The preloaded app's pooled connections belong to the parent
+    with ms.app.app_context():
+        ms.db.engine.dispose(close=False)
+    samples = []
+    mine = [threading.Thread(target=client_loop, args=(ms, username, usernames, post_ids, start, deadline, samples))
+            for username in usernames[:threads]]
+    for thread in mine:
+        thread.start()
+    for thread in mine:
+        thread.join()
+    results.put(samples)
+
+
+def run_target(args):
+    """Child process: load the app against one database and print the samples' summary as JSON"""
+    sys.path.insert(0, str(ROOT))
+    import musicstagram as ms
+    from services.rate_limit import Decision
+
+    ms.app.config['TESTING'] = True
+    ms.limiter.enabled = False
+    # Per-user limits would cap the writes this is trying to measure
+    ms.rate_limiter.hit = lambda *a, **kw: Decision(True, 0, 0, 0.0)
+
+    prefix = f'bench{uuid.uuid4().hex[:6]}_'
+    users = args.workers * args.threads
+    post_ids = seed(ms, prefix, users)
+    usernames = [f'{prefix}{i}' for i in range(users)]
+    with ms.app.app_context():
+        ms.db.engine.dispose()
+        dialect = ms.db.engine.dialect.name
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    start = time.time() + 1.0
+    deadline = start + args.seconds
+    processes = [context.Process(target=worker, args=(ms, usernames[w * args.threads:(w + 1) * args.threads],
+                                                      post_ids, args.threads, start, deadline, results))
+                 for w in range(args.workers)]
+    for process in processes:
+        process.start()
+    samples = [sample for _ in processes for sample in results.get()]
+    for process in processes:
+        process.join()
+
+    summary = {'dialect': dialect, 'requests': len(samples),
+               'failed': sum(not ok for _, _, ok in samples), 'ops': {}}
+    for name, *_ in WORKLOAD:
+        timings = sorted(elapsed for op, elapsed, ok in samples if op == name)
+        if timings:
+            summary['ops'][name] = {'count': len(timings),
+                                    'p50': statistics.median(timings),
+                                    'p99': timings[min(int(len(timings) * 0.99), len(timings) - 1)]}
+    print(json.dumps(summary))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent clients per worker')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--postgres', action='append', default=[], help='Postgres URL to include (repeatable)')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return run_target(args)
+
+    work_dir = tempfile.mkdtemp(prefix='bench_db_')
+    targets = [
+        ('sqlite-journal', f"sqlite:///{os.path.join(work_dir, 'journal.db')}",
+         'journal_mode=DELETE,synchronous=FULL,mmap_size=0'),
+        ('sqlite-wal', f"sqlite:///{os.path.join(work_dir, 'wal.db')}", ''),
+    ] + [('postgres', url, '') for url in args.postgres]
+
+    print(f'{args.workers} workers x {args.threads} clients, {args.seconds:g}s each')
+    print(f'{"target":<16} {"req/s":>8} {"failed":>7}  ' + '  '.join(f'{name + " p50/p99 ms":>22}'
+                                                                  for name, *_ in WORKLOAD))
+    for label, url, pragmas in targets:
+        env = dict(os.environ, SQLALCHEMY_DATABASE_URI=url, SQLITE_PRAGMAS=pragmas, METRICS_ENABLED='false',
+                   METRICS_DIR=os.path.join(work_dir, f'{label}-metrics'),
+                   RATE_LIMIT_FILE=os.path.join(work_dir, f'{label}-ratelimit'),
+                   LOG_FILE=os.path.join(work_dir, f'{label}.log'))
+        command = [sys.executable, __file__, '--run', label, '--workers', str(args.workers),
+                   '--threads', str(args.threads), '--seconds', str(args.seconds)]
+        output = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f'{label:<16} failed:\n{output.stderr[-2000:]}')
+            continue
+        summary = json.loads(output.stdout.strip().splitlines()[-1])
+        columns = '  '.join(
+            f'{summary["ops"][name]["p50"] * 1000:>10.1f}/{summary["ops"][name]["p99"] * 1000:<11.1f}'
+            if name in summary['ops'] else f'{"-":>22}'
+            for name, *_ in WORKLOAD)
+        print(f'{label:<16} {summary["requests"] / args.seconds:>8.0f} {summary["failed"]:>7}  {columns}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Benchmark keyset feed pagination against OFFSET pagination.
+
+Seeds a throwaway SQLite database with N posts (1M by default) using the
+same post table layout and (timestamp, id) index as musicstagram.py, then
+reports p50/p99 latency per page for both strategies at random depths.
+
+    python scripts/bench_feed.py --posts 1000000 --samples 500
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.feed import encode_cursor, keyset_page  # noqa: E402
+
+Base = declarative_base()
+
+
+class Post(Base):
+    __tablename__ = 'post'
+    id = Column(Integer, primary_key=True)
+    title = Column(String(100), nullable=False)
+    music_file = Column(String(200), nullable=False)
+    timestamp = Column(DateTime)
+    user_id = Column(Integer, nullable=False)
+    __table_args__ = (Index('ix_post_timestamp_id', 'timestamp', 'id'),)
+
+
+def seed(db_path, total, batch=50000):
+    """Bulk insert `total` posts; timestamps repeat so id tie-breaks are exercised"""
+    engine = create_engine(f'sqlite:///{db_path}')
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('pragma journal_mode=off')
+    conn.execute('pragma synchronous=off')
+    start = datetime(2024, 1, 1)
+    for offset in range(0, total, batch):
+        rows = [
+            (i + 1, f'Track {i}', f'{i:032x}.mp3',
+             (start + timedelta(seconds=i // 3)).strftime('%Y-%m-%d %H:%M:%S.%f'), i % 5000 + 1)
+            for i in range(offset, min(offset + batch, total))
+        ]
+        conn.executemany(
+            'insert into post (id, title, music_file, timestamp, user_id) values (?, ?, ?, ?, ?)',
+            rows
+        )
+        conn.commit()
+    conn.execute('analyze')
+    conn.close()
+    return start
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(name, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"{name:<24} p50={percentile(ms, 50):8.3f}ms  p99={percentile(ms, 99):8.3f}ms  "
+          f"mean={statistics.mean(ms):8.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--samples', type=int, default=500)
+    parser.add_argument('--db', help='Reuse an existing benchmark database instead of seeding')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.db and os.path.exists(args.db):
+        db_path = args.db
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix='bench_feed_')
+        db_path = args.db or os.path.join(tmp_dir, 'feed.db')
+        print(f"Seeding {args.posts:,} posts into {db_path}...")
+        t0 = time.perf_counter()
+        seed(db_path, args.posts)
+        print(f"Seeded in {time.perf_counter() - t0:.1f}s")
+
+    engine = create_engine(f'sqlite:///{db_path}')
+    rng = random.Random(42)
+    with Session(engine) as session:
+        total = session.query(Post).count()
+        query = session.query(Post)
+
+        first_page = []
+        for _ in range(args.samples):
+            t0 = time.perf_counter()
+            keyset_page(query, Post.timestamp, Post.id, limit=args.page_size)
+            first_page.append(time.perf_counter() - t0)
+
+        keyset, offset = [], []
+        for _ in range(args.samples):
+            depth = rng.randrange(0, max(1, total - args.page_size))
+            anchor = session.get(Post, total - depth)
+            cursor = encode_cursor(anchor.timestamp, anchor.id)
+            session.expunge_all()
+
+            t0 = time.perf_counter()
+            keyset_page(query, Post.timestamp, Post.id, cursor=cursor, limit=args.page_size)
+            keyset.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            query.order_by(Post.timestamp.desc(), Post.id.desc()) \
+                .offset(depth).limit(args.page_size).all()
+            offset.append(time.perf_counter() - t0)
+            session.expunge_all()
+
+    print(f"\n{total:,} posts, page size {args.page_size}, {args.samples} samples")
+    report('keyset first page', first_page)
+    report('keyset random depth', keyset)
+    report('offset random depth', offset)
+
+    if tmp_dir and not args.db:
+        os.remove(db_path)
+        os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
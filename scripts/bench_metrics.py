@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Measure what request metrics cost per request.
+
+Seeds a throwaway database, logs in, and times the same requests with
+METRICS_ENABLED on and off, alternating in rounds so drift affects both
+equally. Reports mean time per request for each and the overhead in percent.
+
+    python scripts/bench_metrics.py --requests 2000 --rounds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+WORK_DIR = tempfile.mkdtemp(prefix='bench_metrics_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+os.environ['METRICS_DIR'] = os.path.join(WORK_DIR, 'metrics')
+os.environ['RATE_LIMIT_FILE'] = os.path.join(WORK_DIR, 'ratelimit')
+os.environ['LOG_FILE'] = os.path.join(WORK_DIR, 'musicstagram.log')
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import musicstagram as ms  # noqa: E402
+
+PATHS = ['/health', '/api/feed', '/']
+
+
+def seed(users=20, posts_per_user=5):
+    with ms.app.app_context():
+        people = [ms.User(username=f'producer{i}', email=f'producer{i}@example.com',
+                          password_hash=generate_password_hash('password'))
+                  for i in range(users)]
+        ms.db.session.add_all(people)
+        ms.db.session.flush()
+        for i, user in enumerate(people):
+            user.following.extend(people[j] for j in range(users) if j != i and (i + j) % 3 == 0)
+            for n in range(posts_per_user):
+                ms.db.session.add(ms.Post(title=f'Track {n}', user_id=user.id, music_file=f'{user.id}_{n}.mp3'))
+        ms.db.session.commit()
+
+
+def run(client, path, requests):
+    began = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return (time.perf_counter() - began) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per path per round')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    ms.app.config['TESTING'] = True
+    ms.limiter.enabled = False
+    # Cached pages would hide the per-request work being measured
+    ms.app.config['CACHE_TYPE'] = 'NullCache'
+    seed()
+    client = ms.app.test_client()
+    client.post('/login', data={'username': 'producer0', 'password': 'password'})
+
+    print(f'{"path":<18} {"off":>10} {"on":>10} {"overhead":>9}')
+    for path in PATHS:
+        timings = {True: [], False: []}
+        run(client, path, args.requests // 10)  # warm up
+        for _ in range(args.rounds):
+            for enabled in (False, True):
+                ms.app.config['METRICS_ENABLED'] = enabled
+                timings[enabled].append(run(client, path, args.requests))
+        off = statistics.median(timings[False]) * 1e6
+        on = statistics.median(timings[True]) * 1e6
+        print(f'{path:<18} {off:>8.1f}us {on:>8.1f}us {(on - off) / off * 100:>8.1f}%')
+
+
+if __name__ == '__main__':
+    main()
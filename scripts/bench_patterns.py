@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Compare the binary pattern codec with JSON on a large generated corpus.
+
+The corpus mixes the shapes Post.beat_data holds in practice: synth page
+saves (32 boolean steps per instrument), the built-in presets and the test
+beat with synth notes and effects. Reports stored bytes and encode/decode
+time per pattern for both formats, and checks every round trip is exact.
+
+    python scripts/bench_patterns.py --patterns 100000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services import pattern_codec  # noqa: E402
+from services.beat_presets import PRESETS, TEST_PATTERN  # noqa: E402
+
+INSTRUMENTS = ('kick', 'snare', 'hihat', 'clap', 'bass', 'synth')
+NOTES = ('C3', 'D#3', 'E3', 'G3', 'Bb3', 'C4')
+
+
+def random_pattern(rng):
+    roll = rng.random()
+    if roll < 0.8:
+        # What synth.js posts: {bpm, grid: {instrument: [32 booleans]}, style}
+        return {
+            'bpm': rng.randrange(90, 160),
+            'grid': {name: [rng.random() < 0.3 for _ in range(32)] for name in INSTRUMENTS},
+            'style': 'custom',
+        }
+    if roll < 0.9:
+        preset = rng.choice(list(PRESETS.values()))
+        return dict(preset, bpm=preset['bpm'] + rng.randrange(-5, 6))
+    pattern = json.loads(json.dumps(TEST_PATTERN))
+    pattern['pattern']['synth']['notes'] = rng.sample(NOTES, 4)
+    pattern['pattern']['effects']['reverb'] = round(rng.random(), 2)
+    return pattern
+
+
+def timed(function, values):
+    began = time.perf_counter()
+    results = [function(value) for value in values]
+    return results, time.perf_counter() - began
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patterns', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [random_pattern(rng) for _ in range(args.patterns)]
+
+    texts, json_encode = timed(json.dumps, corpus)
+    _, json_decode = timed(json.loads, texts)
+    blobs, codec_encode = timed(pattern_codec.encode_pattern, corpus)
+    decoded, codec_decode = timed(pattern_codec.decode, blobs)
+
+    json_bytes = sum(len(text.encode()) for text in texts)
+    codec_bytes = sum(len(blob) for blob in blobs)
+    compact = sum(pattern_codec.is_compact(blob) for blob in blobs)
+    mismatches = sum(json.dumps(a) != json.dumps(b) for a, b in zip(corpus, decoded))
+
+    n = len(corpus)
+    print(f'{n} patterns, {compact} compact, {n - compact} JSON fallback, {mismatches} round-trip mismatches')
+    print(f'{"format":<8} {"bytes/pattern":>14} {"encode":>12} {"decode":>12}')
+    print(f'{"json":<8} {json_bytes / n:>14.1f} {json_encode / n * 1e6:>10.2f}us {json_decode / n * 1e6:>10.2f}us')
+    print(f'{"binary":<8} {codec_bytes / n:>14.1f} {codec_encode / n * 1e6:>10.2f}us {codec_decode / n * 1e6:>10.2f}us')
+    print(f'binary is {json_bytes / codec_bytes:.1f}x smaller')
+
+
+if __name__ == '__main__':
+    main()
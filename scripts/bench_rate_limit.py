@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Microbenchmark the shared rate limiter and check it limits across processes.
+
+Measures the cost of one SharedRateLimiter.hit(), which is the whole
+per-request overhead a rate-limited route pays, over many distinct keys (as
+with real client traffic), then has several processes hammer one key at once
+and checks that exactly `limit` requests were let through between them.
+
+    python scripts/bench_rate_limit.py --hits 200000 --keys 50000 --processes 8
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.rate_limit import SharedRateLimiter  # noqa: E402
+
+BUDGET_US = 50
+
+
+def single_process(path, hits, keys, slots):
+    limiter = SharedRateLimiter(path, slots=slots)
+    timings = []
+    for i in range(hits):
+        key = f'like:{i % keys}'
+        began = time.perf_counter()
+        limiter.hit(key, 60, 60)
+        timings.append(time.perf_counter() - began)
+    timings.sort()
+    return timings
+
+
+def contender(path, slots, key, limit, attempts, start, results):
+    limiter = SharedRateLimiter(path, slots=slots)
+    while time.time() < start:
+        pass
+    allowed = sum(limiter.hit(key, limit, 3600).allowed for _ in range(attempts))
+    results.put(allowed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hits', type=int, default=200000)
+    parser.add_argument('--keys', type=int, default=50000, help='Distinct clients')
+    parser.add_argument('--slots', type=int, default=65536)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--limit', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_rate_limit_') as directory:
+        path = os.path.join(directory, 'ratelimit')
+        timings = single_process(path, args.hits, args.keys, args.slots)
+        mean = statistics.fmean(timings) * 1e6
+        p50 = timings[len(timings) // 2] * 1e6
+        p99 = timings[int(len(timings) * 0.99)] * 1e6
+        verdict = 'OK' if p99 < BUDGET_US else 'OVER BUDGET'
+        print(f'hit() over {args.keys} keys: mean {mean:.1f}us  p50 {p50:.1f}us  p99 {p99:.1f}us'
+              f'  (budget {BUDGET_US}us: {verdict})')
+
+        attempts = args.limit  # every process alone could use up the whole limit
+        results = multiprocessing.Queue()
+        start = time.time() + 0.5
+        processes = [multiprocessing.Process(target=contender,
+                                             args=(path, args.slots, 'follow:shared', args.limit,
+                                                   attempts, start, results))
+                     for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        allowed = sum(results.get() for _ in processes)
+        elapsed = time.time() - start
+        for process in processes:
+            process.join()
+        total = attempts * args.processes
+        verdict = 'OK' if allowed == args.limit else 'WRONG'
+        print(f'{args.processes} processes x {attempts} hits on one key: {allowed} allowed of {total}'
+              f' (limit {args.limit}: {verdict}), {total / elapsed:.0f} hits/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Benchmark the server-side beat renderer.
+
+Renders every built-in preset plus the test beat and reports render speed as
+a multiple of real time (seconds of audio produced per second of CPU). The
+first render of each pattern is cold; later ones reuse the cached one-shot
+samples, note tones and reverb responses.
+
+    python scripts/bench_render.py --runs 5 --repeats 4
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services import beat_render  # noqa: E402
+from services.beat_presets import PRESETS, TEST_PATTERN  # noqa: E402
+
+
+def clear_caches():
+    for cached in (beat_render.one_shot, beat_render.note_tone, beat_render.reverb_response):
+        cached.cache_clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Warm renders per pattern')
+    parser.add_argument('--repeats', type=int, default=beat_render.DEFAULT_REPEATS,
+                        help='Pattern loops per render')
+    args = parser.parse_args()
+
+    patterns = dict(PRESETS, test_beat=TEST_PATTERN)
+    print(f'{"pattern":<16} {"audio":>7} {"cold":>10} {"warm":>10} {"x realtime":>11}')
+    for name, pattern in patterns.items():
+        clear_caches()
+        began = time.perf_counter()
+        audio = beat_render.render(pattern, repeats=args.repeats)
+        cold = time.perf_counter() - began
+
+        timings = []
+        for _ in range(args.runs):
+            began = time.perf_counter()
+            beat_render.render(pattern, repeats=args.repeats)
+            timings.append(time.perf_counter() - began)
+        warm = statistics.median(timings)
+        seconds = len(audio) / beat_render.SAMPLE_RATE
+        print(f'{name:<16} {seconds:>6.1f}s {cold * 1000:>8.1f}ms {warm * 1000:>8.1f}ms {seconds / warm:>10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Measure read throughput as read replicas are added.
+
+Seeds a primary database, then serves the read-mostly pages (feed,
+profile, search, post) with 0, 1, ... --replicas replicas configured,
+forking --workers processes of --threads logged-in clients each, as
+gunicorn does with the preloaded app. Reports requests per second and the
+share of SQL statements that went to replicas.
+
+By default the primary is a fresh SQLite file and the replicas are
+snapshots of it taken with SQLite's backup API after seeding. To measure
+real servers, pass --primary and one --replica per streaming replica of it.
+
+    python scripts/bench_replicas.py --replicas 3 --workers 4 --threads 8 --seconds 15
+    python scripts/bench_replicas.py --primary postgresql://app@db1/musicstagram \\
+        --replica postgresql://app@db2/musicstagram --replica postgresql://app@db3/musicstagram
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+USERS = 50
+POSTS_PER_USER = 10
+PAGES = ['/api/feed', '/user/{user}', '/search?q=track', '/post/{post}']
+
+
+def seed(ms):
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash('password')
+    with ms.app.app_context():
+        if ms.User.query.filter_by(username='reader0').first():
+            return
+        people = [ms.User(username=f'reader{i}', email=f'reader{i}@example.com', password_hash=password_hash)
+                  for i in range(USERS)]
+        ms.db.session.add_all(people)
+        ms.db.session.flush()
+        for i, user in enumerate(people):
+            user.following.extend(people[j] for j in range(USERS) if j != i and (i + j) % 5 == 0)
+            ms.db.session.add_all(ms.Post(title=f'Track {n}', description='Heat', user_id=user.id,
+                                          music_file=f'reader{i}_{n}.mp3')
+                                  for n in range(POSTS_PER_USER))
+        ms.db.session.commit()
+
+
+def client_loop(ms, username, post_ids, start, deadline, counts):
+    client = ms.app.test_client()
+    client.post('/login', data={'username': username, 'password': 'password'})
+    while time.time() < start:
+        time.sleep(0.001)
+    done = 0
+    while time.time() < deadline:
+        url = random.choice(PAGES).format(user=f'reader{random.randrange(USERS)}', post=random.choice(post_ids))
+        if client.get(url).status_code < 400:
+            done += 1
+    counts.append(done)
+
+
+def worker(ms, threads, post_ids, start, deadline, results):
+    statements = {'primary': 0, 'replica': 0}
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements['primary' if conn.engine is primary else 'replica'] += 1
+
+    with ms.app.app_context():
+        primary = ms.db.engines[None]
+        for engine in ms.db.engines.values():
+            engine.dispose(close=False)
+            ms.db.event.listen(engine, 'before_cursor_execute', count)
+    counts = []
+    clients = [threading.Thread(target=client_loop,
+                                args=(ms, f'reader{random.randrange(USERS)}', post_ids, start, deadline, counts))
+               for _ in range(threads)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    results.put((sum(counts), statements))
+
+
+def run(args):
+    """Child process: the app as configured by the environment; prints a JSON summary"""
+    sys.path.insert(0, str(ROOT))
+    import musicstagram as ms
+    from services.rate_limit import Decision
+
+    ms.app.config['TESTING'] = True
+    ms.limiter.enabled = False
+    ms.rate_limiter.hit = lambda *a, **kw: Decision(True, 0, 0, 0.0)
+    # Measure the database, not the page cache
+    ms.view_cache.get_or_render = lambda name, render, **kw: render()
+    seed(ms)
+    if args.run == 'seed':
+        return
+    with ms.app.app_context():
+        post_ids = [post_id for post_id, in ms.db.session.query(ms.Post.id).all()]
+        for engine in ms.db.engines.values():
+            engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    start = time.time() + 1.0
+    deadline = start + args.seconds
+    processes = [context.Process(target=worker, args=(ms, args.threads, post_ids, start, deadline, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    requests, statements = 0, {'primary': 0, 'replica': 0}
+    for _ in processes:
+        done, counted = results.get()
+        requests += done
+        for key in statements:
+            statements[key] += counted[key]
+    for process in processes:
+        process.join()
+    print(json.dumps({'requests': requests, 'statements': statements}))
+
+
+def snapshot_sqlite(primary, replica):
+    source, target = sqlite3.connect(primary), sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--primary', help='Primary database URL (default: a scratch SQLite file)')
+    parser.add_argument('--replica', action='append', default=[], help='Replica URL (repeatable)')
+    parser.add_argument('--replicas', type=int, default=3, help='SQLite snapshots to make without --primary')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent clients per worker')
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return run(args)
+
+    work_dir = tempfile.mkdtemp(prefix='bench_replicas_')
+    primary, replicas = args.primary, args.replica
+    if not primary:
+        primary = f"sqlite:///{os.path.join(work_dir, 'primary.db')}"
+        replicas = [f"sqlite:///{os.path.join(work_dir, f'replica{i}.db')}" for i in range(args.replicas)]
+
+    def child(mode, replica_uris):
+        env = dict(os.environ, SQLALCHEMY_DATABASE_URI=primary, SQLALCHEMY_REPLICA_URIS=','.join(replica_uris),
+                   METRICS_ENABLED='false', METRICS_DIR=os.path.join(work_dir, 'metrics'),
+                   RATE_LIMIT_FILE=os.path.join(work_dir, 'ratelimit'), LOG_FILE=os.path.join(work_dir, 'app.log'))
+        command = [sys.executable, __file__, '--run', mode, '--workers', str(args.workers),
+                   '--threads', str(args.threads), '--seconds', str(args.seconds)]
+        output = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True)
+        if output.returncode != 0:
+            sys.exit(f'{mode} run failed:\n{output.stderr[-2000:]}')
+        return output.stdout
+
+    child('seed', [])
+    if not args.primary:
+        for replica in replicas:
+            snapshot_sqlite(primary[len('sqlite:///'):], replica[len('sqlite:///'):])
+
+    print(f'{args.workers} workers x {args.threads} clients, {args.seconds:g}s per run')
+    print(f'{"replicas":>8} {"req/s":>8} {"scaling":>8} {"on replicas":>12}')
+    baseline = None
+    for n in range(len(replicas) + 1):
+        summary = json.loads(child('bench', replicas[:n]).strip().splitlines()[-1])
+        rate = summary['requests'] / args.seconds
+        baseline = baseline or rate
+        total = sum(summary['statements'].values()) or 1
+        print(f'{n:>8} {rate:>8.0f} {rate / baseline:>7.2f}x {summary["statements"]["replica"] / total:>11.0%}')
+
+
+if __name__ == '__main__':
+    main()
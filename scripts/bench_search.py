@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Benchmark FTS5 search against the old ILIKE '%q%' scan.
+
+Seeds a throwaway SQLite database with N users (1M by default) shaped like
+the user table in musicstagram.py, installs the FTS index from
+services/search.py and reports p50/p99 latency per query for both paths,
+plus FTS ranking only the newest --window matches (SEARCH_RANK_WINDOW).
+
+    python scripts/bench_search.py --users 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services import search as full_text  # noqa: E402
+
+GENRES = ['techno', 'house', 'trance', 'dubstep', 'drum and bass', 'hip hop', 'ambient', 'lofi']
+INSTRUMENTS = ['drums', 'guitar', 'vocals', 'synth', 'bass', 'piano', 'turntables']
+SYLLABLES = ['dj', 'beat', 'bass', 'neon', 'kick', 'wave', 'pulse', 'echo', 'vibe', 'loop', 'flux', 'nova']
+QUERIES = ['neonwave', 'techno', 'pulse', 'kickloop12', 'drum', 'trance vocals', 'zzzznomatch']
+
+
+def seed(db_path, total, batch=50000):
+    conn = sqlite3.connect(db_path)
+    conn.execute('pragma journal_mode=off')
+    conn.execute('pragma synchronous=off')
+    conn.execute(
+        'create table user (id integer primary key, username varchar(80) unique not null, '
+        'genre varchar(100), instrument varchar(100))'
+    )
+    rng = random.Random(7)
+    for offset in range(0, total, batch):
+        rows = [
+            (i + 1, f'{rng.choice(SYLLABLES)}{rng.choice(SYLLABLES)}{i}',
+             rng.choice(GENRES), rng.choice(INSTRUMENTS))
+            for i in range(offset, min(offset + batch, total))
+        ]
+        conn.executemany('insert into user values (?, ?, ?, ?)', rows)
+        conn.commit()
+    conn.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return percentile(samples, 50), percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--window', type=int, default=1000, help='Newest matches ranked by the capped search')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_search_')
+    db_path = os.path.join(tmp_dir, 'search.db')
+    print(f"Seeding {args.users:,} users...")
+    seed(db_path, args.users)
+
+    # Only the user index matters here; give post_fts an empty content table
+    sqlite3.connect(db_path).execute(
+        'create table post (id integer primary key, title text, description text, style text)'
+    ).connection.close()
+
+    engine = create_engine(f'sqlite:///{db_path}')
+    t0 = time.perf_counter()
+    full_text.install(engine)
+    print(f"Built FTS index in {time.perf_counter() - t0:.1f}s\n")
+
+    ilike = text(
+        "select id from user where username like :q or genre like :q or instrument like :q "
+        "limit :limit"
+    )
+    print(f"{'query':<16}{'ILIKE p50':>12}{'ILIKE p99':>12}{'FTS p50':>12}{'FTS p99':>12}"
+          f"{'window p50':>12}{'window p99':>12}  hits")
+    with Session(engine) as session:
+        for query in QUERIES:
+            like_p50, like_p99 = timed(
+                lambda: session.execute(ilike, {'q': f'%{query}%', 'limit': args.limit}).fetchall(),
+                args.repeat
+            )
+            fts_p50, fts_p99 = timed(
+                lambda: full_text.search_ids(session, 'user_fts', query, limit=args.limit),
+                args.repeat
+            )
+            window_p50, window_p99 = timed(
+                lambda: full_text.search_ids(session, 'user_fts', query, limit=args.limit, window=args.window),
+                args.repeat
+            )
+            hits = len(full_text.search_ids(session, 'user_fts', query, limit=args.limit))
+            print(f"{query:<16}{like_p50:>10.2f}ms{like_p99:>10.2f}ms{fts_p50:>10.2f}ms{fts_p99:>10.2f}ms"
+                  f"{window_p50:>10.2f}ms{window_p99:>10.2f}ms  {hits}")
+
+    engine.dispose()
+    os.remove(db_path)
+    os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Compare the async data client against the old synchronous supabase-py path.
+
+Serves a seeded PostgREST stand-in (scripts/postgrest_standin.py) with
+--latency seconds of simulated network delay per request, then loads
+--pages profile pages (profile + beats + notifications, three queries each)
+two ways:
+
+* sync: what SupabaseClient did before. A new supabase-py client per call
+  and blocking queries, one after another.
+* async: SupabaseClient.get_profile_page() on the shared AsyncPostgrest,
+  the three queries gathered and --concurrency pages in flight at once.
+  Profile and beat reads go through the read cache (--cache-ttl).
+
+Reports pages per second and p50/p99 page latency for each. Pass
+--fail-rate to have the stand-in answer that fraction of requests with 503
+and see what the retries recover.
+
+    python scripts/bench_supabase.py --pages 500 --concurrency 50 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from postgrest_standin import StandIn  # noqa: E402
+
+# supabase-py only checks that the key looks like a JWT
+KEY = 'stand.in.key'
+USERS = 100
+
+
+def seed(standin):
+    standin.seed('profiles', [{'id': f'user-{i}', 'username': f'producer{i}'} for i in range(USERS)])
+    standin.seed('beats', [{'id': n, 'created_by': f'user-{n % USERS}', 'title': f'Track {n}',
+                            'created_at': f'2024-01-01T00:{n // 60 % 60:02d}:{n % 60:02d}'}
+                           for n in range(USERS * 20)])
+    standin.seed('notifications', [{'id': n, 'user_id': f'user-{n % USERS}', 'type': 'like', 'is_read': False,
+                                    'created_at': f'2024-01-01T00:00:{n % 60:02d}'}
+                                   for n in range(USERS * 10)])
+
+
+def summarize(label, timings, elapsed, failed):
+    timings.sort()
+    p50 = statistics.median(timings) * 1000
+    p99 = timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1000
+    print(f'{label:<6} {len(timings) / elapsed:>9.1f} pages/s   p50 {p50:>7.1f}ms   p99 {p99:>7.1f}ms'
+          f'   failed {failed}')
+
+
+def run_sync(url, pages):
+    from supabase import create_client
+
+    def query(build):
+        # SupabaseConfig.get_client() used to build a new client on every call
+        return build(create_client(url, KEY)).execute().data
+
+    timings, failed = [], 0
+    began = time.perf_counter()
+    for page in range(pages):
+        user_id = f'user-{page % USERS}'
+        started = time.perf_counter()
+        try:
+            query(lambda c: c.table('profiles').select('*').eq('id', user_id).single())
+            query(lambda c: c.table('beats').select('*').eq('created_by', user_id)
+                  .order('created_at', desc=True).range(0, 19))
+            query(lambda c: c.table('notifications').select('*').eq('user_id', user_id)
+                  .order('created_at', desc=True).limit(20))
+        except Exception:
+            failed += 1
+        timings.append(time.perf_counter() - started)
+    summarize('sync', timings, time.perf_counter() - began, failed)
+
+
+async def run_async(url, pages, concurrency, cache_ttl):
+    # config.supabase builds its shared clients on import; point them at the stand-in
+    os.environ.update(SUPABASE_URL=url, SUPABASE_KEY=KEY, SUPABASE_JWT_SECRET='stand-in',
+                      SUPABASE_DB_URL='postgresql://stand-in')
+    from config.postgrest import AsyncPostgrest
+    from config.supabase_client import SupabaseClient
+    from services.read_cache import ReadCache
+
+    db = AsyncPostgrest(url, KEY)
+    client = SupabaseClient(db=db, cache=ReadCache(ttl=cache_ttl))
+    gate = asyncio.Semaphore(concurrency)
+    timings, failed = [], 0
+
+    async def load(page):
+        nonlocal failed
+        user_id = f'user-{page % USERS}'
+        async with gate:
+            started = time.perf_counter()
+            result = await client.get_profile_page(user_id, viewer_id=user_id)
+            timings.append(time.perf_counter() - started)
+            if result['profile'] is None:
+                failed += 1
+
+    began = time.perf_counter()
+    await asyncio.gather(*(load(page) for page in range(pages)))
+    summarize('async', timings, time.perf_counter() - began, failed)
+    stats = client.cache_stats()
+    print(f'       {db.retried} retried requests; cache: {stats["hits"]} hits, {stats["misses"]} misses,'
+          f' {stats["coalesced"]} coalesced')
+    await db.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50, help='Async pages in flight')
+    parser.add_argument('--latency', type=float, default=0.02, help='Simulated network delay per request (s)')
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--cache-ttl', type=float, default=5.0,
+                        help='Async read cache TTL (s); 0 keeps only coalescing of concurrent reads')
+    parser.add_argument('--sync-pages', type=int, help='Pages for the (slow) sync path; default --pages / 5')
+    args = parser.parse_args()
+
+    standin = StandIn(latency=args.latency, fail_rate=args.fail_rate)
+    seed(standin)
+    url = standin.start()
+    print(f'{args.latency * 1000:g}ms per request, {args.fail_rate:.0%} failing')
+    try:
+        run_sync(url, args.sync_pages or max(args.pages // 5, 1))
+        asyncio.run(run_async(url, args.pages, args.concurrency, args.cache_ttl))
+    finally:
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
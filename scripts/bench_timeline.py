@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Compare home timeline reads with building the feed from follows at read time.
+
+Seeds a throwaway SQLite database through musicstagram's models (so posts
+are fanned out by the app's own after_insert hook): --users users, each
+following --follows others, and --posts posts spread over them. A few
+users get --big-followers followers, above TIMELINE_FANOUT_LIMIT, so
+their posts take the fan-out-on-read path. Then reports p50/p99 latency of
+the first and a deep page of:
+
+* join: posts joined to followers, newest first (keyset_page).
+* timeline: home_feed(), the fanned-out timeline merged with big accounts.
+
+    python scripts/bench_timeline.py --users 2000 --follows 100 --posts 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+DB_DIR = tempfile.mkdtemp(prefix='bench_timeline_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(DB_DIR, 'timeline.db')}"
+os.environ.setdefault('TIMELINE_FANOUT_LIMIT', '500')
+
+import musicstagram as ms  # noqa: E402
+from services.feed import keyset_page  # noqa: E402
+
+db = ms.db
+
+
+def seed(users, follows, posts, big, big_followers):
+    rng = random.Random(7)
+    db.session.execute(db.insert(ms.User), [
+        {'username': f'producer{i}', 'email': f'producer{i}@example.com', 'password_hash': '-'}
+        for i in range(users)
+    ])
+    ids = [user_id for user_id, in db.session.query(ms.User.id)]
+    celebrities = ids[:big]
+    edges = set()
+    for user_id in ids:
+        for followed in rng.sample(ids, follows):
+            if followed != user_id:
+                edges.add((user_id, followed))
+    for celebrity in celebrities:
+        edges.update((fan, celebrity) for fan in rng.sample(ids, min(big_followers, users)) if fan != celebrity)
+    db.session.execute(db.insert(ms.followers), [{'follower_id': a, 'followed_id': b} for a, b in edges])
+    db.session.commit()
+    ms.reconcile_counters()
+
+    start = datetime(2024, 1, 1)
+    began = time.perf_counter()
+    for n in range(posts):
+        author = rng.choice(celebrities) if celebrities and rng.random() < 0.05 else rng.choice(ids)
+        db.session.add(ms.Post(title=f'Track {n}', music_file=f'{n}.mp3', user_id=author,
+                               timestamp=start + timedelta(seconds=n)))
+        if n % 1000 == 999:
+            db.session.commit()
+    db.session.commit()
+    fan_out = (time.perf_counter() - began) / posts
+    entries = db.session.query(ms.TimelineEntry).count()
+    print(f'{users} users, {len(edges)} follows, {posts} posts -> {entries} timeline entries '
+          f'({fan_out * 1000:.2f}ms per post including fan-out)')
+    return ids
+
+
+def join_feed(user_id, cursor, limit):
+    query = ms.feed_query().join(ms.followers, ms.followers.c.followed_id == ms.Post.user_id) \
+        .filter(ms.followers.c.follower_id == user_id)
+    return keyset_page(query, ms.Post.timestamp, ms.Post.id, cursor=cursor, limit=limit)
+
+
+def timeline_feed(user_id, cursor, limit):
+    return ms.home_feed(user_id, cursor=cursor, limit=limit)
+
+
+def measure(label, read, readers, depth, limit):
+    timings = []
+    for user_id in readers:
+        cursor = None
+        for _ in range(depth):  # walk to the page being measured
+            _, cursor = read(user_id, cursor, limit)
+            if cursor is None:
+                break
+        db.session.rollback()
+        started = time.perf_counter()
+        read(user_id, cursor, limit)
+        timings.append(time.perf_counter() - started)
+        db.session.rollback()
+    timings.sort()
+    p50 = statistics.median(timings) * 1000
+    p99 = timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1000
+    print(f'{label:<9} page {depth + 1:<3} p50 {p50:>7.2f}ms   p99 {p99:>7.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--follows', type=int, default=100, help='Accounts each user follows')
+    parser.add_argument('--posts', type=int, default=50000)
+    parser.add_argument('--big', type=int, default=3, help='Accounts above the fan-out limit')
+    parser.add_argument('--big-followers', type=int, default=1500)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--deep', type=int, default=10, help='Pages to skip for the deep measurement')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    with ms.app.app_context():
+        ids = seed(args.users, args.follows, args.posts, args.big, args.big_followers)
+        readers = random.Random(11).sample(ids, min(args.samples, len(ids)))
+        for depth in (0, args.deep):
+            measure('join', join_feed, readers, depth, args.limit)
+            measure('timeline', timeline_feed, readers, depth, args.limit)
+
+
+if __name__ == '__main__':
+    main()
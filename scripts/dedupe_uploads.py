@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Move existing uploads into content-addressed storage, merging duplicates.
+
+Posts that still point at a flat, pre-dedupe file (``<uuid4>.mp3``) are
+re-pointed at its sharded SHA-256 path, so byte-identical uploads collapse
+into a single blob. Blob reference counts are then rebuilt from the posts.
+With --gc, blobs and files in the uploads folder that nothing references
+are deleted as well.
+
+Usage: python scripts/dedupe_uploads.py [--dry-run] [--gc]
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import musicstagram as ms  # noqa: E402
+from services.content_store import sha256_file  # noqa: E402
+
+db = ms.db
+
+
+def migrate(dry_run=False):
+    """Move every legacy file referenced by a post into the blob store"""
+    blob_paths = db.select(ms.AudioBlob.path)
+    legacy = db.session.scalars(
+        db.select(ms.Post.music_file).where(ms.Post.music_file.not_in(blob_paths)).distinct()
+    ).all()
+
+    seen, moved, duplicates, reclaimed = set(), 0, 0, 0
+    for name in legacy:
+        source = ms.audio_store.absolute_path(name)
+        if not os.path.exists(source):
+            print(f'⚠️  {name}: file missing, skipped')
+            continue
+        digest = sha256_file(source)
+        size = os.path.getsize(source)
+        exists = digest in seen or db.session.scalar(
+            db.select(ms.AudioBlob.id).where(ms.AudioBlob.sha256 == digest)
+        ) is not None
+        seen.add(digest)
+        if exists:
+            duplicates += 1
+            reclaimed += size
+        moved += 1
+        if dry_run:
+            continue
+
+        path = ms.store_audio(source, name, digest=digest)
+        db.session.execute(db.update(ms.Post).where(ms.Post.music_file == name).values(music_file=path))
+        db.session.commit()
+        print(f'{name} -> {path}{" (duplicate)" if exists else ""}')
+
+    return moved, duplicates, reclaimed
+
+
+def rebuild_ref_counts():
+    references = db.select(db.func.count(ms.Post.id)) \
+        .where(ms.Post.music_file == ms.AudioBlob.path).scalar_subquery()
+    db.session.execute(db.update(ms.AudioBlob).values(ref_count=references))
+    db.session.commit()
+
+
+def collect_garbage(dry_run=False):
+    """Delete unreferenced blobs, then files that neither a blob nor a post points at"""
+    removed = 0
+    for path in db.session.scalars(db.select(ms.AudioBlob.path).where(ms.AudioBlob.ref_count <= 0)).all():
+        print(f'🗑️  {path}')
+        removed += 1
+        if not dry_run:
+            ms.collect_audio(path)
+
+    known = set(db.session.scalars(db.select(ms.AudioBlob.path)))
+    known.update(db.session.scalars(db.select(ms.Post.music_file)))
+    root = ms.audio_store.root
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, '/')
+            if path in known or not ms.allowed_file(filename):
+                continue
+            print(f'🗑️  {path}')
+            removed += 1
+            if not dry_run:
+                ms.audio_store.remove(path)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without touching anything')
+    parser.add_argument('--gc', action='store_true', help='Also delete files and blobs nothing references')
+    args = parser.parse_args()
+
+    with ms.app.app_context():
+        moved, duplicates, reclaimed = migrate(args.dry_run)
+        if not args.dry_run:
+            rebuild_ref_counts()
+        removed = collect_garbage(args.dry_run) if args.gc else 0
+
+    verb = 'Would move' if args.dry_run else 'Moved'
+    print(f'{verb} {moved} files, {duplicates} duplicates ({reclaimed / 1024 / 1024:.1f} MB reclaimed)')
+    if args.gc:
+        print(f'{"Would remove" if args.dry_run else "Removed"} {removed} unreferenced files')
+
+
+if __name__ == '__main__':
+    main()
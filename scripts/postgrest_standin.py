@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""A local stand-in for Supabase's PostgREST API, for tests and benchmarks.
+
+Serves /rest/v1/<table> from in-memory tables over HTTP/1.1 keep-alive.
+Supports the subset of PostgREST the data client uses: select with eq/neq/
+gt/lt/in/is filters, order, limit and offset, single-object responses,
+inserts (with on_conflict upserts), updates and deletes filtered the same
+way, and rpc/<function> (returns the first `limit` rows of the table of
+the same name, if any). Embedded resources in `select` are ignored.
+
+Every request can be slowed by `latency` seconds to stand in for the
+network, and a `fail_rate` fraction of them answered with 503 to exercise
+retries.
+
+    python scripts/postgrest_standin.py --port 54321 --latency 0.02
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+RESERVED = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+
+
+def _list_items(body: str) -> List[str]:
+    """The values of an in.(...) list: comma-separated, optionally double-quoted with backslash escapes"""
+    items, item, quoted, escaped = [], [], False, False
+    for char in body:
+        if escaped:
+            item.append(char)
+            escaped = False
+        elif quoted and char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            items.append(''.join(item).strip())
+            item = []
+        else:
+            item.append(char)
+    items.append(''.join(item).strip())
+    return items
+
+
+def _matches(row: Dict, column: str, expression: str) -> bool:
+    operator, _, operand = expression.partition('.')
+    value = row.get(column)
+    text = '' if value is None else str(value).lower() if isinstance(value, bool) else str(value)
+    if operator == 'eq':
+        return text == operand
+    if operator == 'neq':
+        return text != operand
+    if operator == 'in':
+        return text in _list_items(operand[1:-1])
+    if operator == 'is':
+        return (value is None) if operand == 'null' else text == operand
+    if operator in ('gt', 'lt'):
+        try:
+            left, right = float(value), float(operand)
+        except (TypeError, ValueError):
+            left, right = text, operand
+        return left > right if operator == 'gt' else left < right
+    raise ValueError(f'unsupported operator {operator}')
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections when a pool opens dozens at
+    # once, and the client's SYN retries then add a second to those requests
+    request_queue_size = 128
+
+
+class StandIn:
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0):
+        self.tables: Dict[str, List[Dict]] = {}
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._next_id = 1
+        self.server = None
+
+    def seed(self, table: str, rows: List[Dict]):
+        self.tables.setdefault(table, []).extend(rows)
+
+    def start(self, port: int = 0) -> str:
+        """Serve in a background thread; returns the base URL"""
+        standin = self
+
+        class Handler(_Handler):
+            pass
+        Handler.standin = standin
+        self.server = _Server(('127.0.0.1', port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def handle(self, method: str, table: str, params: List[tuple], headers, body):
+        """(status, payload, extra headers) for one request"""
+        if table.startswith('rpc/'):
+            rows = self.tables.get(table[len('rpc/'):], [])
+            limit = (body or {}).get('result_limit', len(rows))
+            return 200, rows[:limit], {}
+        filters = [(key, value) for key, value in params if key not in RESERVED]
+        options = {key: value for key, value in params if key in RESERVED}
+        prefer = headers.get('Prefer', '')
+        with self.lock:
+            rows = self.tables.setdefault(table, [])
+            if method == 'POST':
+                return self._insert(rows, body, options.get('on_conflict'), prefer)
+            matched = [row for row in rows if all(_matches(row, column, expression)
+                                                  for column, expression in filters)]
+            if method == 'PATCH':
+                for row in matched:
+                    row.update(body)
+            elif method == 'DELETE':
+                self.tables[table] = [row for row in rows if row not in matched]
+            elif method == 'GET':
+                for spec in reversed(options.get('order', '').split(',') if options.get('order') else []):
+                    column, _, direction = spec.partition('.')
+                    matched.sort(key=lambda row: (row.get(column) is None, row.get(column)),
+                                 reverse=direction.startswith('desc'))
+                total = len(matched)
+                offset = int(options.get('offset', 0))
+                matched = matched[offset:offset + int(options['limit'])] if 'limit' in options else matched[offset:]
+                extra = {'Content-Range': f'{offset}-{offset + len(matched) - 1}/{total}'} \
+                    if 'count=' in prefer else {}
+                return 200, [dict(row) for row in matched], extra
+            if 'return=representation' not in prefer:
+                return 204, None, {}
+            return 200, [dict(row) for row in matched], {}
+
+    def _insert(self, rows, body, on_conflict, prefer):
+        new_rows = body if isinstance(body, list) else [body]
+        keys = on_conflict.split(',') if on_conflict else None
+        written = []
+        for new in new_rows:
+            existing = None
+            if keys:
+                existing = next((row for row in rows if all(row.get(k) == new.get(k) for k in keys)), None)
+            if existing is not None:
+                if 'resolution=ignore-duplicates' in prefer:
+                    continue
+                if 'resolution=merge-duplicates' not in prefer:
+                    return 409, {'code': '23505', 'message': 'duplicate key value violates unique constraint'}, {}
+                existing.update(new)
+                written.append(dict(existing))
+            else:
+                row = dict(new)
+                row.setdefault('id', self._next_id)
+                self._next_id += 1
+                rows.append(row)
+                written.append(dict(row))
+        if 'return=representation' not in prefer:
+            return 201, None, {}
+        return 201, written, {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    # Headers and body go out in separate writes; with Nagle on, the body waits for a delayed ACK
+    disable_nagle_algorithm = True
+    standin: StandIn = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _serve(self):
+        standin = self.standin
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        with standin.lock:
+            standin.requests += 1
+        if standin.latency:
+            time.sleep(standin.latency)
+        url = urlsplit(self.path)
+        if not url.path.startswith('/rest/v1/'):
+            return self._reply(404, {'message': 'not found'}, {})
+        if standin.fail_rate and random.random() < standin.fail_rate:
+            return self._reply(503, {'message': 'stand-in failure'}, {})
+        try:
+            status, payload, extra = standin.handle(self.command, url.path[len('/rest/v1/'):],
+                                                    parse_qsl(url.query), self.headers, body)
+        except ValueError as e:
+            return self._reply(400, {'code': 'PGRST100', 'message': str(e)}, {})
+        if status < 300 and payload is not None and 'vnd.pgrst.object' in self.headers.get('Accept', ''):
+            if len(payload) != 1:
+                return self._reply(406, {'code': 'PGRST116', 'message': 'JSON object requested, multiple (or no) rows returned'}, {})
+            payload = payload[0]
+        self._reply(status, payload, extra)
+
+    def _reply(self, status, payload, extra):
+        data = b'' if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        if data:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in extra.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    args = parser.parse_args()
+    standin = StandIn(args.latency, args.fail_rate)
+    url = standin.start(args.port)
+    print(f'PostgREST stand-in at {url}/rest/v1 (Ctrl-C to stop)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Fail when a Supabase query would need a sequential scan.
+
+Creates a throwaway database on a local Postgres (TEST_DATABASE_URL, a
+connection to any database there, used to create and drop the throwaway
+one), applies the migrations config/supabase_client.py runs against,
+seeds it, then EXPLAINs the table access of every SupabaseClient query
+with sequential scans disabled. The planner then only picks a sequential
+scan, or a walk through every entry of an index that does not lead with a
+filtered column, when no index can serve the query, so either in any plan
+means a missing index.
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost/postgres python scripts/test_indexes.py
+"""
+import os
+import re
+import sys
+from pathlib import Path
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, make_dsn
+
+MIGRATIONS = Path(__file__).parent.parent / 'migrations' / 'versions'
+# The schema SupabaseClient uses; 001_initial_schema.sql and 002_policies.sql
+# describe an older layout and do not apply on top of it
+SCHEMA = ['001_extensions.sql', '002_tables.sql', '003_functions.sql', '004_policies.sql',
+          '005_search.sql', '006_timelines.sql', '007_indexes.sql']
+
+# What Supabase provides and a plain Postgres does not
+SUPABASE_STUBS = '''
+create schema if not exists auth;
+create table if not exists auth.users (id uuid primary key);
+create or replace function auth.uid() returns uuid as $$
+    select nullif(current_setting('request.jwt.claim.sub', true), '')::uuid
+$$ language sql stable;
+do $$ begin
+    if not exists (select from pg_roles where rolname = 'anon') then create role anon nologin; end if;
+    if not exists (select from pg_roles where rolname = 'authenticated') then create role authenticated nologin; end if;
+end $$;
+'''
+
+SEED = '''
+insert into auth.users (id) select uuid_generate_v4() from generate_series(1, 300);
+insert into profiles (id, username, email)
+    select id, 'producer' || row_number() over (), 'producer' || row_number() over () || '@example.com'
+    from auth.users;
+insert into follows (follower_id, following_id)
+    select a.id, b.id from profiles a join profiles b on a.id <> b.id where random() < 0.05;
+-- Follows nobody, so gets the public feed
+with loner as (insert into auth.users (id) values (uuid_generate_v4()) returning id)
+insert into profiles (id, username, email) select id, 'loner', 'loner@example.com' from loner;
+insert into beats (created_by, title, pattern, created_at)
+    select p.ids[1 + n % array_length(p.ids, 1)], 'Track ' || n, '{}'::jsonb, now() - n * interval '1 minute'
+    from (select array_agg(id) as ids from profiles) p, generate_series(1, 3000) n;
+insert into likes (beat_id, user_id)
+    select b.id, p.id from beats b join profiles p on random() < 0.01 on conflict do nothing;
+insert into comments (beat_id, user_id, content)
+    select b.id, p.id, 'fire' from beats b join profiles p on random() < 0.005;
+insert into notifications (user_id, type, actor_id, is_read, created_at)
+    select p.id, 'like', p.id, random() < 0.9, now() - n * interval '1 minute'
+    from profiles p cross join generate_series(1, 30) n;
+insert into collaborations (beat_id, user_id, role)
+    select b.id, p.id, 'producer' from beats b join profiles p on random() < 0.002 on conflict do nothing;
+analyze;
+'''
+
+# (name, statement) for each query SupabaseClient sends through PostgREST.
+# Embedded resources (profiles(*), likes(count), ...) become lookups by
+# primary key or by the foreign key listed separately here.
+QUERIES = [
+    ('get_profile', 'select * from profiles where id = %(user)s'),
+    ('update_profile', "update profiles set bio = 'x' where id = %(user)s"),
+    ('get_beat', 'select * from beats where id = %(beat)s'),
+    ('update_beat', "update beats set title = 'x' where id = %(beat)s and created_by = %(user)s"),
+    ('delete_beat', 'delete from beats where id = %(beat)s and created_by = %(user)s'),
+    ('get_collaborations', 'select * from collaborations where user_id = %(user)s'),
+    ('unlike_beat', 'delete from likes where beat_id = %(beat)s and user_id = %(user)s'),
+    ('likes(count)', 'select count(*) from likes where beat_id = %(beat)s'),
+    ('comments(count)', 'select count(*) from comments where beat_id = %(beat)s'),
+    ('unfollow_user', 'delete from follows where follower_id = %(user)s and following_id = %(other)s'),
+    ('get_feed', 'select * from home_feed(%(user)s)'),
+    ('get_feed page 2', 'select * from home_feed(%(user)s, %(before_at)s, %(beat)s)'),
+    ('get_feed, no follows', 'select * from home_feed(%(loner)s, %(before_at)s, %(beat)s)'),
+    ('get_user_feed', 'select * from beats where created_by = %(user)s order by created_at desc limit 20 offset 20'),
+    ('get_notifications', 'select * from notifications where user_id = %(user)s order by created_at desc limit 20'),
+    ('mark_notifications_read', 'update notifications set is_read = true where user_id = %(user)s and is_read = false'),
+    ('search_profiles', "select * from search_profiles('producer1', 20, 0)"),
+    ('search_beats', "select * from search_beats('track', 20, 0)"),
+    # Run by the follows triggers (006)
+    ('follow backfill', 'select id from beats where created_by = %(user)s and is_public '
+                        'order by created_at desc, id desc limit 800'),
+    ('unfollow cleanup', 'delete from timelines where user_id = %(user)s and author_id = %(other)s'),
+]
+
+INDEX_SCANS = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+# Nodes between a Limit and an index scan that still stop reading once the Limit is met
+ORDER_PRESERVING = {'Incremental Sort', 'Result'}
+# Set-returning SQL functions whose plans only show up when Postgres inlines them
+OWN_FUNCTIONS = {'home_feed', 'search_profiles', 'search_beats'}
+
+
+def plan_problems(node, leading, limited=False, found=None):
+    """Sequential scans, whole-index scans and calls to our functions that were not inlined"""
+    found = [] if found is None else found
+    if node['Node Type'] == 'Seq Scan':
+        found.append(f"sequential scan on {node['Relation Name']}")
+    elif node['Node Type'] in INDEX_SCANS:
+        # A condition on a later column still walks every entry; only the leading one seeks.
+        # Under a Limit, an index read in order stops after the first few entries.
+        column = leading.get(node['Index Name'])
+        if column and not re.search(rf'\b{column}\b', node.get('Index Cond', '')) and not limited:
+            found.append(f"full scan of {node['Index Name']}")
+    elif node['Node Type'] == 'Function Scan' and node.get('Function Name') in OWN_FUNCTIONS:
+        found.append(f"{node['Function Name']}() was not inlined, so its plan cannot be checked")
+    limited = node['Node Type'] == 'Limit' or (limited and node['Node Type'] in ORDER_PRESERVING)
+    for child in node.get('Plans', []):
+        plan_problems(child, leading, limited, found)
+    return found
+
+
+def check(conn):
+    """Build and seed the schema, then print a line per query; True if any lacks an index"""
+    failed = False
+    with conn.cursor() as cur:
+        cur.execute(SUPABASE_STUBS)
+        for migration in SCHEMA:
+            cur.execute((MIGRATIONS / migration).read_text())
+        cur.execute(SEED)
+        cur.execute('''
+            select f.follower_id, f.following_id, b.id, b.created_at
+            from follows f join beats b on b.created_by = f.following_id limit 1
+        ''')
+        user, other, beat, before_at = cur.fetchone()
+        cur.execute("select id from profiles where username = 'loner'")
+        loner, = cur.fetchone()
+        params = {'user': user, 'other': other, 'loner': loner, 'beat': beat, 'before_at': before_at}
+
+        cur.execute('''
+            select index.relname, attribute.attname
+            from pg_index i
+            join pg_class index on index.oid = i.indexrelid
+            join pg_attribute attribute on attribute.attrelid = i.indrelid and attribute.attnum = i.indkey[0]
+        ''')
+        leading = dict(cur.fetchall())
+
+        cur.execute('set enable_seqscan = off')
+        for label, statement in QUERIES:
+            cur.execute('begin')  # EXPLAIN does not run writes, but keep them contained anyway
+            cur.execute(f'explain (format json) {statement}', params)
+            problems = plan_problems(cur.fetchone()[0][0]['Plan'], leading)
+            cur.execute('rollback')
+            failed |= bool(problems)
+            print(f"{'❌' if problems else '✅'} {label:<24} {'; '.join(problems)}")
+    return failed
+
+
+def main():
+    admin_url = os.getenv('TEST_DATABASE_URL', 'postgresql://postgres@localhost/postgres')
+    name = f'musicstagram_indexes_{os.getpid()}'
+    admin = psycopg2.connect(admin_url)
+    admin.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    with admin.cursor() as cur:
+        cur.execute(f'create database {name}')
+    try:
+        conn = psycopg2.connect(make_dsn(admin_url, dbname=name))
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            failed = check(conn)
+        finally:
+            conn.close()
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f'drop database if exists {name}')
+        admin.close()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
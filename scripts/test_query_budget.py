@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Fail when a page issues more SQL queries than its budget allows.
+
+Seeds a throwaway SQLite database, logs in as a seeded user and requests each
+endpoint, counting statements per request. Query counts must stay flat as the
+amount of data grows, so an N+1 regression shows up as a budget overrun.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+DB_DIR = tempfile.mkdtemp(prefix='query_budget_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(DB_DIR, 'budget.db')}"
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import musicstagram as ms  # noqa: E402
+from services.query_counter import QueryCounter  # noqa: E402
+
+# (name, url, headers, max queries per request)
+BUDGETS = [
+    ('feed', '/', {}, 6),
+    ('feed api', '/api/feed', {}, 5),
+    ('profile', '/user/producer0', {}, 6),
+    ('search', '/search?q=producer', {}, 4),
+    ('search xhr', '/search?q=producer', {'X-Requested-With': 'XMLHttpRequest'}, 4),
+]
+
+
+def seed(users=25, posts_per_user=4):
+    """Create enough rows that any per-row query would blow the budget"""
+    with ms.app.app_context():
+        people = [
+            ms.User(username=f'producer{i}', email=f'producer{i}@example.com',
+                    password_hash=generate_password_hash('password'),
+                    instrument='drums', genre='techno', bio='Making beats')
+            for i in range(users)
+        ]
+        ms.db.session.add_all(people)
+        ms.db.session.flush()
+
+        for i, user in enumerate(people):
+            user.following.extend(people[j] for j in range(users) if j != i and (i + j) % 3 == 0)
+            for n in range(posts_per_user):
+                post = ms.Post(title=f'Track {n}', description='Heat', user_id=user.id,
+                               music_file=f'{user.id}_{n}.mp3')
+                ms.db.session.add(post)
+                ms.db.session.flush()
+                for fan in people[:5]:
+                    ms.db.session.add(ms.Like(user_id=fan.id, post_id=post.id))
+                    ms.db.session.add(ms.Comment(content='🔥', user_id=fan.id, post_id=post.id))
+        ms.db.session.commit()
+        # Follower counts decide which feed path (and which queries) a page takes
+        ms.reconcile_counters()
+
+
+def main():
+    app = ms.app
+    app.config['TESTING'] = True
+    ms.limiter.enabled = False
+
+    # base.html links to pages that are not implemented yet; register
+    # placeholders so the templates can render under test
+    for endpoint in ('about', 'terms', 'privacy', 'settings'):
+        if endpoint not in app.view_functions:
+            app.add_url_rule(f'/{endpoint}', endpoint, lambda: '')
+    app.jinja_env.globals.setdefault('now', datetime.utcnow())
+
+    seed()
+    client = app.test_client()
+    client.post('/login', data={'username': 'producer0', 'password': 'password'})
+
+    failed = False
+    with app.app_context():
+        engine = ms.db.engine
+    for name, url, headers, budget in BUDGETS:
+        with QueryCounter(engine) as counter:
+            response = client.get(url, headers=headers)
+        ok = response.status_code == 200 and counter.count <= budget
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {name:<12} {counter.count:>3} queries (budget {budget}) "
+              f"-> HTTP {response.status_code}")
+        if not ok:
+            for statement in counter.statements:
+                print(f"      {' '.join(statement.split())[:120]}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
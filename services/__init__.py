@@ -0,0 +1,5 @@
+"""Supporting services for the Musicstagram Flask app.
+
+Modules in this package stay independent of the models defined in
+musicstagram.py so they can be reused from scripts and benchmarks.
+"""
@@ -0,0 +1,68 @@
+"""Built-in beat patterns offered by the synth page."""
+
+PRESETS = {
+    'techno_basic': {
+        'name': 'Basic Techno',
+        'bpm': 128,
+        'pattern': {
+            'kick': [1,0,0,0, 1,0,0,0, 1,0,0,0, 1,0,0,0],
+            'hihat': [0,0,1,0, 0,0,1,0, 0,0,1,0, 0,0,1,0],
+            'snare': [0,0,0,0, 1,0,0,0, 0,0,0,0, 1,0,0,0],
+            'clap': [0,0,0,0, 1,0,0,0, 0,0,0,0, 1,0,0,0]
+        }
+    },
+    'techno_groove': {
+        'name': 'Groovy Techno',
+        'bpm': 130,
+        'pattern': {
+            'kick': [1,0,0,1, 0,0,1,0, 1,0,0,1, 0,0,1,0],
+            'hihat': [1,1,1,1, 1,1,1,1, 1,1,1,1, 1,1,1,1],
+            'snare': [0,0,1,0, 0,0,1,0, 0,0,1,0, 0,0,1,0],
+            'clap': [0,0,0,0, 1,0,0,0, 0,0,0,0, 1,0,0,1]
+        }
+    },
+    'techno_dark': {
+        'name': 'Dark Techno',
+        'bpm': 135,
+        'pattern': {
+            'kick': [1,0,1,0, 1,0,1,0, 1,0,1,0, 1,0,1,0],
+            'hihat': [0,1,0,1, 0,1,0,1, 0,1,0,1, 0,1,0,1],
+            'snare': [0,0,1,0, 0,0,1,0, 0,0,1,0, 0,0,1,0],
+            'tom': [1,0,0,0, 0,0,0,0, 1,0,0,0, 0,0,0,0]
+        }
+    },
+    'techno_acid': {
+        'name': 'Acid Techno',
+        'bpm': 140,
+        'pattern': {
+            'kick': [1,0,0,0, 1,0,0,0, 1,0,0,0, 1,1,0,0],
+            'hihat': [1,1,1,1, 1,1,1,1, 1,1,1,1, 1,1,1,1],
+            'snare': [0,0,1,0, 0,0,1,0, 0,0,1,0, 0,0,1,1],
+            'cymbal': [0,0,0,1, 0,0,0,1, 0,0,0,1, 0,0,0,1]
+        }
+    }
+}
+
+# Pre-configured test beat with all features
+TEST_PATTERN = {
+    'bpm': 128,
+    'style': 'techno',
+    'pattern': {
+        'kick': [1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0],
+        'snare': [0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 1],
+        'hihat': [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+        'synth': {
+            'notes': ['C3', 'E3', 'G3', 'B3'],
+            'pattern': [1, 0, 0, 1, 0, 1, 0, 0, 1, 0, 0, 1, 0, 1, 0, 0]
+        },
+        'effects': {
+            'reverb': 0.6,
+            'delay': 0.3,
+            'distortion': 0.2,
+            'filter': {
+                'frequency': 2000,
+                'resonance': 2
+            }
+        }
+    }
+}
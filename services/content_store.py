@@ -0,0 +1,76 @@
+"""Content-addressed file storage.
+
+Files are named after the SHA-256 of their bytes and sharded two levels deep
+(``ab/cd/abcd….mp3``) so no single directory grows large enough to slow down
+lookups. Identical uploads map to the same path; reference counting is up to
+the caller (see the AudioBlob model).
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from typing import Optional
+
+BLOCK_SIZE = 64 * 1024
+_DIGEST = re.compile(r'[0-9a-f]{64}')
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentStore:
+    def __init__(self, root: str, depth: int = 2, width: int = 2):
+        self.root = root
+        self.depth = depth
+        self.width = width
+
+    def relative_path(self, digest: str, ext: str = '') -> str:
+        shards = [digest[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        name = f'{digest}.{ext}' if ext else digest
+        return '/'.join(shards + [name])
+
+    def digest_of(self, path: str) -> Optional[str]:
+        """The SHA-256 a store path was named after, or None for any other path"""
+        *shards, name = path.split('/')
+        digest = name.split('.', 1)[0]
+        if len(shards) != self.depth or not _DIGEST.fullmatch(digest) \
+                or shards != self.relative_path(digest).split('/')[:-1]:
+            return None
+        return digest
+
+    def absolute_path(self, path: str) -> str:
+        return os.path.join(self.root, *path.split('/'))
+
+    def place(self, source: str, path: str):
+        """Move `source` to `path` in the store; drops it if the content is already there"""
+        destination = self.absolute_path(path)
+        if os.path.exists(destination):
+            os.remove(source)
+            return
+        directory = os.path.dirname(destination)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            os.replace(source, destination)
+        except OSError:
+            # Different filesystem: copy next to the destination, then rename
+            # so readers never see a partially written file
+            fd, partial = tempfile.mkstemp(dir=directory, suffix='.partial')
+            os.close(fd)
+            shutil.copyfile(source, partial)
+            os.replace(partial, destination)
+            os.remove(source)
+
+    def remove(self, path: str):
+        try:
+            os.remove(self.absolute_path(path))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(self.absolute_path(path))
@@ -0,0 +1,109 @@
+"""Engine settings for SQLite and Postgres under many gevent workers.
+
+engine_options() builds SQLALCHEMY_ENGINE_OPTIONS for the configured URI
+and install() hooks the engine's connect event.
+
+SQLite: every new connection switches to WAL, so readers no longer block
+behind a writer and a like, comment or play only waits for other writes.
+synchronous=NORMAL makes a commit an append to the WAL rather than an
+fsync of the database (a power cut can lose the last commits, never
+corrupt the file). Reads go through mmap_size bytes of memory-mapped I/O,
+and a writer waits up to busy_timeout for the write lock instead of
+failing with "database is locked".
+
+Postgres (psycopg2): a bounded pool per worker with pre-ping, so
+connections the server or a proxy dropped are replaced instead of failing
+the next request, and recycling before idle-timeouts hit. Under gevent,
+call make_green() in each worker so psycopg2 waits on sockets through the
+hub instead of blocking every greenlet of the worker.
+"""
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # ms
+    'temp_store': 'MEMORY',
+    'cache_size': -16000,  # KiB when negative
+}
+
+
+def normalize_uri(uri: str) -> str:
+    # Hosting providers hand out postgres:// URLs, which SQLAlchemy 1.4+ rejects
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri: str, pool_size: int = 10, max_overflow: int = 20, pool_timeout: float = 10,
+                   pool_recycle: int = 1800, statement_timeout_ms: Optional[int] = None,
+                   application_name: str = 'musicstagram') -> Dict:
+    """Keyword arguments for create_engine() suited to `uri`'s backend"""
+    backend = make_url(uri).get_backend_name()
+    if backend == 'sqlite':
+        # A connection may be checked out by one greenlet and returned by another
+        return {'connect_args': {'check_same_thread': False}}
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': True,
+        # Reuse the most recently returned connection so idle ones age out
+        'pool_use_lifo': True,
+    }
+    if backend == 'postgresql':
+        connect_args = {'application_name': application_name, 'connect_timeout': 5}
+        if statement_timeout_ms:
+            connect_args['options'] = f'-c statement_timeout={statement_timeout_ms}'
+        options['connect_args'] = connect_args
+    return options
+
+
+def install(engine: Engine, sqlite_pragmas: Optional[Dict] = None):
+    """Apply per-connection settings to every connection `engine` opens"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = dict(SQLITE_PRAGMAS, **(sqlite_pragmas or {}))
+    if engine.url.database in (None, '', ':memory:'):
+        pragmas.pop('journal_mode')  # in-memory databases have no WAL
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def sqlite_settings(engine: Engine) -> Dict:
+    """The pragmas a fresh connection of `engine` ends up with, for checking install() took effect"""
+    with engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in SQLITE_PRAGMAS}
+
+
+def make_green():
+    """Have psycopg2 wait for the server through gevent's hub; call once per worker process"""
+    import psycopg2
+    from psycopg2 import extensions
+
+    def gevent_wait_callback(conn, timeout=None):
+        from gevent.socket import wait_read, wait_write
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                return
+            if state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f'Bad result from poll: {state!r}')
+
+    extensions.set_wait_callback(gevent_wait_callback)
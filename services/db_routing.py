@@ -0,0 +1,58 @@
+"""Send reads to replica databases and everything else to the primary.
+
+RoutingSession is a Flask-SQLAlchemy session that sends a statement to a
+replica only when the session was opened for reading with use_replicas()
+and the statement cannot change anything. INSERT, UPDATE and DELETE,
+flushes, SELECT ... FOR UPDATE and raw SQL other than a plain SELECT go to
+the primary. Once a session has written, its later statements go to the
+primary too, so code reads back what it just wrote.
+
+One replica is picked per session and kept, so reads within a request see
+one consistent copy rather than alternating between replicas that lag by
+different amounts.
+
+Replicas are registered with Flask-SQLAlchemy as extra binds
+(SQLALCHEMY_BINDS) and use_replicas() is given their keys. Models with a
+bind key of their own keep Flask-SQLAlchemy's usual routing.
+"""
+import random
+from typing import Sequence
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+
+def use_replicas(session, replica_keys: Sequence[str]):
+    """Let `session` read from the replicas until it writes"""
+    session.info['replica_keys'] = list(replica_keys)
+
+
+def has_written(session) -> bool:
+    return session.info.get('wrote', False)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._is_write(clause):
+                self.info['wrote'] = True
+            elif self.info.get('replica_keys') and not self.info.get('wrote') \
+                    and self._default_bind(mapper, clause):
+                key = self.info.get('replica')
+                if key is None:
+                    key = self.info['replica'] = random.choice(self.info['replica_keys'])
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _is_write(self, clause) -> bool:
+        if self._flushing or isinstance(clause, UpdateBase):
+            return True
+        if isinstance(clause, TextClause):
+            words = clause.text.split(None, 1)
+            return not words or words[0].upper() != 'SELECT'
+        return getattr(clause, '_for_update_arg', None) is not None
+
+    def _default_bind(self, mapper, clause) -> bool:
+        # Only redirect what would otherwise go to the primary
+        return super().get_bind(mapper=mapper, clause=clause) is self._db.engines[None]
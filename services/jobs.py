@@ -0,0 +1,82 @@
+"""Small in-process background job queue.
+
+Work that does not need to finish before the response goes out (audio
+transcoding, for instance) is handed to a pool of worker threads. Under the
+gevent worker class the threads are green, so a job waiting on a subprocess
+does not hold up other requests.
+
+Jobs live in memory only: whatever is still queued when a worker dies is
+lost, so callers must keep enough state in the database to re-queue it.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    def __init__(self, workers: int = 1, name: str = 'jobs'):
+        self.workers = workers
+        self.name = name
+        self._queue: queue.Queue = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` to run on a worker thread"""
+        self._ensure_started()
+        self._queue.put((fn, args, kwargs))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued job has run"""
+        self._queue.join()
+
+    def start(self):
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            # Threads do not survive fork(); a preloaded app needs new ones per worker
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Let queued jobs finish, then stop the workers"""
+        if not self._threads or self._pid != os.getpid():
+            return
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=timeout)
+        self._threads = []
+
+    def _ensure_started(self):
+        if not self._threads or self._pid != os.getpid():
+            self.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                fn, args, kwargs = job
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.exception('Background job %s failed: %s', getattr(job[0], '__name__', job[0]), e)
+            finally:
+                self._queue.task_done()
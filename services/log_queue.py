@@ -0,0 +1,189 @@
+"""Structured logging that stays off the request path.
+
+Requests only put log records on a bounded in-memory queue. A listener
+thread takes them off, formats them as JSON lines and does the file I/O.
+When the queue is full the record is dropped and counted rather than
+blocking the request; the count is logged once the queue drains.
+
+Messages are formatted on the listener thread, so log with %-style
+arguments (``logger.info('Saved %s', post_id)``) rather than f-strings, and
+pass values rather than objects that may change afterwards.
+
+INFO and DEBUG records can be sampled per route (e.g. keep 1% of play
+pings); warnings and errors are always kept.
+
+Every preforked worker has its own listener, and they all append to the same
+file, so SharedRotatingFileHandler rotates it under a lock that all
+processes share.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Callable, Dict, List, Optional
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request context, traceback"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        context = getattr(record, 'context', None)
+        if context:
+            entry.update(context)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that several processes can use on one file.
+
+    Each process checks the size and writes while holding an flock on
+    `<file>.lock`, so only one process rotates at a time. A process that
+    finds the file was rotated by another one reopens it before writing.
+    Without this, every worker renames the file whenever its own handle
+    reaches maxBytes and then keeps writing to a backup or a deleted file.
+    """
+
+    def __init__(self, filename, maxBytes: int = 0, backupCount: int = 0, encoding=None):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+        self.lock_path = self.baseFilename + '.lock'
+        self._lock_file = None
+        self._lock_pid: Optional[int] = None
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            lock = self._process_lock()
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_rotated()
+                super().emit(record)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def _process_lock(self):
+        # flock belongs to the open file description, which a forked child
+        # shares with its parent; each process needs its own to exclude the others
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self.lock_path, 'a')
+            self._lock_pid = os.getpid()
+        return self._lock_file
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            on_disk = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            on_disk = None
+        current = os.fstat(self.stream.fileno())
+        if on_disk is None or (on_disk.st_dev, on_disk.st_ino) != (current.st_dev, current.st_ino):
+            self.stream.close()
+            self.stream = None  # FileHandler.emit opens the new file
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None and self._lock_pid == os.getpid():
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The stock version uses put_nowait(), which fails on a full queue
+        self.queue.put(self._sentinel, timeout=5)
+
+
+class LogQueueHandler(QueueHandler):
+    """Queue records for a listener thread; drop them when the queue is full.
+
+    `context` is called on the logging thread and its dict is attached to
+    the record, e.g. the current route. `sample_rates` maps a context
+    'endpoint' to the fraction of its INFO/DEBUG records to keep.
+    """
+
+    def __init__(self, handlers: List[logging.Handler], maxsize: int = 10000,
+                 context: Optional[Callable[[], Dict]] = None,
+                 sample_rates: Optional[Dict[str, float]] = None):
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.context = context
+        self.sample_rates = sample_rates or {}
+        self.dropped = 0
+        self.sampled_out = 0
+        self._reported = 0
+        self._listener: Optional[QueueListener] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        context = self.context() if self.context else None
+        if record.levelno < logging.WARNING and context:
+            rate = self.sample_rates.get(context.get('endpoint'), 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                self.sampled_out += 1
+                return False
+        record.context = context
+        return super().handle(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Leave formatting (getMessage, tracebacks) to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped > self._reported:
+            count, self._reported = self.dropped - self._reported, self.dropped
+            notice = logging.LogRecord(record.name, logging.WARNING, __file__, 0,
+                                       'Dropped %d log records: queue full', (count,), None)
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                self._reported -= count
+
+    def start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Threads (and possibly held queue locks) do not survive fork(), so
+            # each worker of a preloaded app gets its own queue and listener
+            self._pid = os.getpid()
+            self.queue = queue.Queue(self.maxsize)
+            self._listener = _Listener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+
+    def stop(self):
+        """Write out everything queued, then stop the listener"""
+        if self._listener is None or self._pid != os.getpid():
+            return
+        try:
+            self._listener.stop()
+        except queue.Full:
+            pass
+        self._listener = None
+        self._pid = None
+        for handler in self.handlers:
+            handler.flush()
@@ -0,0 +1,285 @@
+"""Counters and histograms exposed in the Prometheus text format.
+
+Recording is a dict update under a lock, so it is cheap enough for every
+request. Each process keeps its own values. When `directory` is set, a
+background thread snapshots them every `flush_interval` seconds to
+``<directory>/metrics-<pid>-<start time>.json``, and render() adds up every
+process's snapshot (plus its own live values), so a scrape that lands on any
+one gunicorn worker reports totals for all of them. A process that stops
+folds its values into ``metrics-exited.json`` and removes its own file; one
+that is killed leaves its last snapshot behind. Either way totals never go
+backwards, even when a new worker gets an old one's pid. Clear the directory
+when the server (re)starts.
+
+Values that live elsewhere, like cache hit counts, are pulled in by
+collectors: callables registered with add_collector() that return
+``{(name, labels): value}`` for counters, read at every snapshot.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Key = Tuple[str, Labels]
+Collector = Callable[[], Dict[Key, float]]
+
+
+@lru_cache(maxsize=4096)
+def labels(**values) -> Labels:
+    # Requests keep asking for the same few label sets; build each once
+    return tuple(sorted((name, str(value)) for name, value in values.items()))
+
+
+class Metrics:
+    def __init__(self, namespace: str, directory: Optional[str] = None, flush_interval: float = 5.0):
+        self.namespace = namespace
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._meta: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}  # name -> (type, help, buckets)
+        self._counters: Dict[Key, float] = {}
+        self._histograms: Dict[Key, List[float]] = {}  # per-bucket counts..., +Inf count, sum
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._path: Optional[str] = None
+        atexit.register(self.stop)
+
+    # Definition
+
+    def counter(self, name: str, help: str):
+        self._meta[f'{self.namespace}_{name}'] = ('counter', help, ())
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self._meta[f'{self.namespace}_{name}'] = ('histogram', help, tuple(sorted(buckets)))
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    # Recording
+
+    def inc(self, name: str, amount: float = 1.0, label_set: Labels = ()):
+        key = (f'{self.namespace}_{name}', label_set)
+        self._ensure_started()
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, label_set: Labels = ()):
+        full_name = f'{self.namespace}_{name}'
+        buckets = self._meta[full_name][2]
+        key = (full_name, label_set)
+        index = bisect_left(buckets, value)
+        self._ensure_started()
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0.0] * (len(buckets) + 2)
+            values[index] += 1
+            values[-1] += value
+
+    # Aggregation
+
+    def snapshot(self) -> Dict[str, list]:
+        """This process's values, collectors included, in a JSON-friendly form"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+        for collector in self._collectors:
+            for key, value in collector().items():
+                full_key = (f'{self.namespace}_{key[0]}', key[1])
+                counters[full_key] = counters.get(full_key, 0.0) + value
+        return _serialize(counters, histograms)
+
+    def flush(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if self._path is None:
+            self._path = self._snapshot_path()
+        _write_json(self._path, self.snapshot())
+
+    def retire(self):
+        """Fold this process's values into the exited workers' totals and remove its snapshot"""
+        if not self.directory:
+            return
+        snapshot = self.snapshot()
+        exited = os.path.join(self.directory, 'metrics-exited.json')
+        with self._directory_lock(fcntl.LOCK_EX):
+            snapshots = [snapshot]
+            try:
+                with open(exited) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                pass
+            _write_json(exited, _serialize(*_merge(snapshots)))
+            if self._path is not None:
+                try:
+                    os.remove(self._path)
+                except FileNotFoundError:
+                    pass
+                self._path = None
+            with self._lock:
+                self._counters.clear()
+                self._histograms.clear()
+
+    def totals(self) -> Tuple[Dict[Key, float], Dict[Key, List[float]]]:
+        """Counters and histograms summed over every process"""
+        snapshots = [self.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            # Shared with retire(), so an exiting worker is counted exactly once
+            with self._directory_lock(fcntl.LOCK_SH):
+                for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                    if path == self._path:
+                        continue
+                    try:
+                        with open(path) as f:
+                            snapshots.append(json.load(f))
+                    except (OSError, ValueError):
+                        continue  # being replaced, or from a process that died mid-write
+        return _merge(snapshots)
+
+    def render(self, derive: Optional[Callable[[Dict[Key, float]], Dict[Key, float]]] = None) -> str:
+        """Prometheus text exposition of the totals, plus gauges `derive` computes from the counters"""
+        counters, histograms = self.totals()
+        extra = derive(counters) if derive else {}
+        lines = []
+        for name in sorted({key[0] for key in counters} | {key[0] for key in histograms}):
+            kind, help_text, buckets = self._meta.get(name, ('counter', '', ()))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                for (metric, label_set), values in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0.0
+                    for bound, count in zip(list(buckets) + ['+Inf'], values[:-1]):
+                        cumulative += count
+                        le = bound if bound == '+Inf' else repr(float(bound))
+                        lines.append(f'{name}_bucket{_format(label_set + (("le", le),))} {_number(cumulative)}')
+                    lines.append(f'{name}_sum{_format(label_set)} {_number(values[-1])}')
+                    lines.append(f'{name}_count{_format(label_set)} {_number(cumulative)}')
+            else:
+                for (metric, label_set), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format(label_set)} {_number(value)}')
+        previous = None
+        for (name, label_set), value in sorted(extra.items()):
+            full_name = f'{self.namespace}_{name}'
+            if full_name != previous:
+                lines.append(f'# TYPE {full_name} gauge')
+                previous = full_name
+            lines.append(f'{full_name}{_format(label_set)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    # Background snapshots
+
+    def _ensure_started(self):
+        if self._pid != os.getpid() and self.directory:
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # After fork() the parent's values, thread and snapshot are not ours
+            if self._pid is not None:
+                self._counters.clear()
+                self._histograms.clear()
+            self._pid = os.getpid()
+            self._path = self._snapshot_path()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self.retire()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def _snapshot_path(self) -> str:
+        # The start time keeps a worker that reuses a dead one's pid off its snapshot
+        return os.path.join(self.directory, f'metrics-{os.getpid()}-{time.time_ns()}.json')
+
+    def _directory_lock(self, operation: int):
+        os.makedirs(self.directory, exist_ok=True)
+        return _Flock(os.path.join(self.directory, 'metrics.lock'), operation)
+
+
+class _Flock:
+    def __init__(self, path: str, operation: int):
+        self.path = path
+        self.operation = operation
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, self.operation)
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()  # releases the lock
+
+
+def _serialize(counters: Dict[Key, float], histograms: Dict[Key, List[float]]) -> Dict[str, list]:
+    return {
+        'counters': [[name, list(map(list, label_set)), value] for (name, label_set), value in counters.items()],
+        'histograms': [[name, list(map(list, label_set)), values]
+                       for (name, label_set), values in histograms.items()],
+    }
+
+
+def _merge(snapshots: List[Dict[str, list]]) -> Tuple[Dict[Key, float], Dict[Key, List[float]]]:
+    counters: Dict[Key, float] = {}
+    histograms: Dict[Key, List[float]] = {}
+    for snapshot in snapshots:
+        for name, label_set, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, label_set)))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, label_set, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, label_set)))
+            total = histograms.get(key)
+            if total is None or len(total) != len(values):
+                histograms[key] = list(values)
+            else:
+                histograms[key] = [a + b for a, b in zip(total, values)]
+    return counters, histograms
+
+
+def _write_json(path: str, data):
+    partial = f'{path}.partial'
+    with open(partial, 'w') as f:
+        json.dump(data, f)
+    os.replace(partial, path)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format(label_set: Labels) -> str:
+    if not label_set:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in label_set) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
@@ -0,0 +1,379 @@
+"""Compact binary encoding for beat patterns and effects settings.
+
+Patterns are mostly step grids, which JSON spells out as ``[1,0,0,0,...]`` at
+two to six bytes per step. Here each grid row is bit-packed (16 steps in 2
+bytes), notes are varints, and the effects are a fixed-layout block, which
+makes a synth page save ~20x smaller than its JSON.
+
+Every value starts with two bytes: the format version and the kind
+(KIND_JSON, KIND_PATTERN or KIND_EFFECTS). decode() of an encoded value
+always gives back exactly what was encoded: the same keys in the same order,
+booleans vs 0/1 ints and ints vs floats all preserved. encode_*() check that
+by decoding their own output. Anything the compact schema cannot represent
+exactly (unknown keys, odd note spellings, effect values finer than 1/1000)
+is stored as KIND_JSON instead.
+
+Pattern layout, after the header, is a sequence of tagged fields::
+
+    TAG_BPM_INT   zigzag varint
+    TAG_BPM_FLOAT f64
+    TAG_STYLE     string
+    TAG_GRID      string (the key, "grid" or "pattern"), varint row count, rows
+    TAG_EFFECTS   effects block
+    TAG_NAME      string
+
+A row is a name, a row kind and a body. A name is a byte index into NAMES,
+or 0xFF followed by a string. Bodies are:
+
+    ROW_BOOL/ROW_INT  varint step count, ceil(count / 8) bytes, LSB first
+    ROW_SYNTH         varint note count, varint notes, then a ROW_BOOL/ROW_INT
+                      row kind and body for the synth's step pattern
+    ROW_EFFECTS       effects block
+
+Effects block (fixed, 22 bytes): u8 presence mask, u8 int mask, then five
+u32 values in 1/1000 units: reverb, delay, distortion, filter frequency,
+filter resonance. Mask bit 5 records that a filter dict is present.
+
+Strings are a varint byte length followed by UTF-8.
+"""
+import json
+import re
+import struct
+from typing import Any, Dict, List
+
+VERSION = 1
+
+KIND_JSON = 0
+KIND_PATTERN = 1
+KIND_EFFECTS = 2
+
+TAG_BPM_INT = 1
+TAG_BPM_FLOAT = 2
+TAG_STYLE = 3
+TAG_GRID = 4
+TAG_EFFECTS = 5
+TAG_NAME = 6
+
+ROW_BOOL = 0
+ROW_INT = 1
+ROW_SYNTH = 2
+ROW_EFFECTS = 3
+
+NAMES = ('kick', 'snare', 'hihat', 'clap', 'tom', 'cymbal', 'bass', 'synth', 'effects')
+_NAME_INDEX = {name: index for index, name in enumerate(NAMES)}
+INLINE_NAME = 0xFF
+
+EFFECT_SLOTS = ('reverb', 'delay', 'distortion')
+FILTER_SLOTS = ('frequency', 'resonance')
+FILTER_PRESENT = 1 << 5
+_EFFECTS = struct.Struct('<BB5I')
+_F64 = struct.Struct('<d')
+_U32_MAX = 2 ** 32 - 1
+
+_NOTE = re.compile(r'^([A-G])(#|b|)(-1|\d)$')
+_LETTERS = 'CDEFGAB'
+_ACCIDENTALS = ('', '#', 'b')
+
+# Byte -> its 8 bits, LSB first, as bools and as ints
+_BOOL_BITS = [tuple(bool(byte >> bit & 1) for bit in range(8)) for byte in range(256)]
+_INT_BITS = [tuple(byte >> bit & 1 for bit in range(8)) for byte in range(256)]
+
+
+class _Unencodable(Exception):
+    """The value does not fit the compact schema; store it as JSON"""
+
+
+def encode_pattern(pattern: Dict[str, Any]) -> bytes:
+    return _encode(pattern, KIND_PATTERN, _write_pattern)
+
+
+def encode_effects(effects: Dict[str, Any]) -> bytes:
+    return _encode(effects, KIND_EFFECTS, _write_effects)
+
+
+def decode(data: bytes) -> Any:
+    """Inverse of encode_pattern() and encode_effects()"""
+    if len(data) < 2 or data[0] != VERSION:
+        raise ValueError(f'Unsupported pattern encoding version {data[0] if data else None}')
+    kind = data[1]
+    if kind == KIND_JSON:
+        return json.loads(bytes(data[2:]).decode('utf-8'))
+    if kind == KIND_PATTERN:
+        return _read_pattern(data, 2)
+    if kind == KIND_EFFECTS:
+        return _read_effects(data, 2)[0]
+    raise ValueError(f'Unknown pattern encoding kind {kind}')
+
+
+def is_compact(data: bytes) -> bool:
+    return len(data) >= 2 and data[1] != KIND_JSON
+
+
+def _encode(value: Any, kind: int, write) -> bytes:
+    out = bytearray((VERSION, kind))
+    try:
+        if not isinstance(value, dict):
+            raise _Unencodable
+        write(out, value)
+        encoded = bytes(out)
+        # Only keep the compact form if it reproduces the exact same JSON
+        if _dumps(decode(encoded)) == _dumps(value):
+            return encoded
+    except _Unencodable:
+        pass
+    return bytes((VERSION, KIND_JSON)) + _dumps(value).encode('utf-8')
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+# Writing
+
+def _write_varint(out: bytearray, value: int):
+    if value < 0:
+        raise _Unencodable
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_string(out: bytearray, value: Any):
+    if not isinstance(value, str):
+        raise _Unencodable
+    encoded = value.encode('utf-8')
+    _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _write_name(out: bytearray, name: str):
+    index = _NAME_INDEX.get(name)
+    if index is None:
+        out.append(INLINE_NAME)
+        _write_string(out, name)
+    else:
+        out.append(index)
+
+
+def _write_steps(out: bytearray, steps: List[Any]):
+    if all(type(step) is bool for step in steps):
+        out.append(ROW_BOOL)
+    elif all(type(step) is int and step in (0, 1) for step in steps):
+        out.append(ROW_INT)
+    else:
+        raise _Unencodable
+    _write_varint(out, len(steps))
+    bits = 0
+    for index, step in enumerate(steps):
+        if step:
+            bits |= 1 << index
+    out += bits.to_bytes((len(steps) + 7) // 8, 'little')
+
+
+def _write_note(out: bytearray, note: Any):
+    match = _NOTE.match(note) if isinstance(note, str) else None
+    if not match:
+        raise _Unencodable
+    letter, accidental, octave = match.groups()
+    _write_varint(out, ((int(octave) + 1) * 7 + _LETTERS.index(letter)) * 3 + _ACCIDENTALS.index(accidental))
+
+
+def _fixed_point(value: Any) -> int:
+    if type(value) not in (int, float) or not 0 <= value * 1000 <= _U32_MAX:
+        raise _Unencodable
+    return round(value * 1000)
+
+
+def _write_effects(out: bytearray, effects: Dict[str, Any]):
+    present = is_int = 0
+    values = [0] * 5
+    filter_ = effects.get('filter')
+    slots = [(name, effects) for name in EFFECT_SLOTS]
+    if filter_ is not None:
+        if not isinstance(filter_, dict) or set(filter_) - set(FILTER_SLOTS):
+            raise _Unencodable
+        present |= FILTER_PRESENT
+        slots += [(name, filter_) for name in FILTER_SLOTS]
+    if set(effects) - set(EFFECT_SLOTS) - {'filter'}:
+        raise _Unencodable
+    for slot, (name, source) in enumerate(slots):
+        if name in source:
+            present |= 1 << slot
+            is_int |= (type(source[name]) is int) << slot
+            values[slot] = _fixed_point(source[name])
+    out += _EFFECTS.pack(present, is_int, *values)
+
+
+def _write_pattern(out: bytearray, pattern: Dict[str, Any]):
+    for key, value in pattern.items():
+        if key == 'bpm':
+            if type(value) is int:
+                out.append(TAG_BPM_INT)
+                _write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+            elif type(value) is float:
+                out.append(TAG_BPM_FLOAT)
+                out += _F64.pack(value)
+            else:
+                raise _Unencodable
+        elif key in ('style', 'name'):
+            out.append(TAG_STYLE if key == 'style' else TAG_NAME)
+            _write_string(out, value)
+        elif key in ('grid', 'pattern'):
+            if not isinstance(value, dict):
+                raise _Unencodable
+            out.append(TAG_GRID)
+            _write_string(out, key)
+            _write_varint(out, len(value))
+            for name, row in value.items():
+                _write_name(out, name)
+                if isinstance(row, list):
+                    _write_steps(out, row)
+                elif name == 'effects' and isinstance(row, dict):
+                    out.append(ROW_EFFECTS)
+                    _write_effects(out, row)
+                elif isinstance(row, dict) and list(row) == ['notes', 'pattern'] \
+                        and isinstance(row['notes'], list) and isinstance(row['pattern'], list):
+                    out.append(ROW_SYNTH)
+                    _write_varint(out, len(row['notes']))
+                    for note in row['notes']:
+                        _write_note(out, note)
+                    _write_steps(out, row['pattern'])
+                else:
+                    raise _Unencodable
+        elif key == 'effects':
+            if not isinstance(value, dict):
+                raise _Unencodable
+            out.append(TAG_EFFECTS)
+            _write_effects(out, value)
+        else:
+            raise _Unencodable
+
+
+# Reading
+#
+# Plain functions over (data, offset) that return (value, new offset): decode
+# runs on every pattern load, and method calls per byte were most of its time.
+
+def _varint(data: bytes, offset: int):
+    byte = data[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _take(data: bytes, offset: int, count: int):
+    end = offset + count
+    if end > len(data):
+        raise ValueError('Truncated pattern data')
+    return data[offset:end], end
+
+
+def _string(data: bytes, offset: int):
+    length, offset = _varint(data, offset)
+    raw, offset = _take(data, offset, length)
+    return bytes(raw).decode('utf-8'), offset
+
+
+def _read_steps(data: bytes, offset: int, kind: int):
+    count = data[offset]
+    if count < 0x80:
+        offset += 1
+    else:
+        count, offset = _varint(data, offset)
+    end = offset + (count + 7) // 8
+    if end > len(data):
+        raise ValueError('Truncated pattern data')
+    table = _BOOL_BITS if kind == ROW_BOOL else _INT_BITS
+    steps = []
+    for byte in data[offset:end]:
+        steps += table[byte]
+    if len(steps) != count:
+        del steps[count:]
+    return steps, end
+
+
+def _read_note(data: bytes, offset: int):
+    value, offset = _varint(data, offset)
+    value, accidental = divmod(value, 3)
+    octave, letter = divmod(value, 7)
+    return f'{_LETTERS[letter]}{_ACCIDENTALS[accidental]}{octave - 1}', offset
+
+
+def _read_effects(data: bytes, offset: int):
+    raw, offset = _take(data, offset, _EFFECTS.size)
+    present, is_int, *values = _EFFECTS.unpack(raw)
+    effects: Dict[str, Any] = {}
+
+    def value(slot):
+        return values[slot] // 1000 if is_int >> slot & 1 else values[slot] / 1000
+
+    for slot, name in enumerate(EFFECT_SLOTS):
+        if present >> slot & 1:
+            effects[name] = value(slot)
+    if present & FILTER_PRESENT:
+        effects['filter'] = {name: value(slot) for slot, name in enumerate(FILTER_SLOTS, len(EFFECT_SLOTS))
+                             if present >> slot & 1}
+    return effects, offset
+
+
+def _read_grid(data: bytes, offset: int):
+    grid: Dict[str, Any] = {}
+    rows, offset = _varint(data, offset)
+    for _ in range(rows):
+        index = data[offset]
+        if index == INLINE_NAME:
+            name, offset = _string(data, offset + 1)
+        else:
+            name = NAMES[index]
+            offset += 1
+        kind = data[offset]
+        offset += 1
+        if kind == ROW_BOOL or kind == ROW_INT:
+            grid[name], offset = _read_steps(data, offset, kind)
+        elif kind == ROW_SYNTH:
+            count, offset = _varint(data, offset)
+            notes = []
+            for _ in range(count):
+                note, offset = _read_note(data, offset)
+                notes.append(note)
+            steps, offset = _read_steps(data, offset + 1, data[offset])
+            grid[name] = {'notes': notes, 'pattern': steps}
+        elif kind == ROW_EFFECTS:
+            grid[name], offset = _read_effects(data, offset)
+        else:
+            raise ValueError(f'Unknown row kind {kind}')
+    return grid, offset
+
+
+def _read_pattern(data: bytes, offset: int) -> Dict[str, Any]:
+    pattern: Dict[str, Any] = {}
+    end = len(data)
+    while offset < end:
+        tag = data[offset]
+        offset += 1
+        if tag == TAG_GRID:
+            key, offset = _string(data, offset)
+            pattern[key], offset = _read_grid(data, offset)
+        elif tag == TAG_BPM_INT:
+            value, offset = _varint(data, offset)
+            pattern['bpm'] = value >> 1 if not value & 1 else -((value + 1) >> 1)
+        elif tag == TAG_BPM_FLOAT:
+            raw, offset = _take(data, offset, _F64.size)
+            pattern['bpm'] = _F64.unpack(raw)[0]
+        elif tag == TAG_STYLE:
+            pattern['style'], offset = _string(data, offset)
+        elif tag == TAG_NAME:
+            pattern['name'], offset = _string(data, offset)
+        elif tag == TAG_EFFECTS:
+            pattern['effects'], offset = _read_effects(data, offset)
+        else:
+            raise ValueError(f'Unknown pattern field {tag}')
+    return pattern
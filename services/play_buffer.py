@@ -0,0 +1,162 @@
+"""Write-behind buffer for play counts.
+
+Play events are aggregated per post in memory and written back in one
+batched transaction every few seconds (or once enough events pile up), so
+the request path never takes the database write lock.
+
+When `spool_path` is set, each worker appends its aggregated increments to a
+shared local spool file instead of writing to the database itself, and
+whichever worker wins the spool lock drains it for everyone. That collapses
+N workers' flushes into a single UPDATE batch per interval.
+"""
+import atexit
+import fcntl
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+FlushFn = Callable[[Dict[int, int]], None]
+
+
+class PlayCounterBuffer:
+    def __init__(self, flush_fn: FlushFn, interval: float = 5.0,
+                 max_pending: int = 1000, spool_path: Optional[str] = None):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+        self.spool_path = spool_path
+
+        self._counts: Counter = Counter()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        atexit.register(self.stop)
+
+    def record(self, post_id: int, plays: int = 1) -> int:
+        """Buffer play events and return the count still pending for the post"""
+        self._ensure_started()
+        with self._lock:
+            self._counts[post_id] += plays
+            self._total += plays
+            pending = self._counts[post_id]
+            if self._total >= self.max_pending:
+                self._wakeup.set()
+        return pending
+
+    def pending(self, post_id: int) -> int:
+        with self._lock:
+            return self._counts.get(post_id, 0)
+
+    def flush(self) -> int:
+        """Write out everything buffered so far; returns the number of plays flushed"""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._total = 0
+
+        try:
+            if self.spool_path:
+                flushed = self._flush_via_spool(counts)
+            else:
+                flushed = sum(counts.values())
+                if counts:
+                    self.flush_fn(dict(counts))
+        except Exception as e:
+            # Nothing reached the database or the spool; retry these next time
+            logger.error('Failed to flush play counts: %s', e)
+            with self._lock:
+                self._counts.update(counts)
+                self._total += sum(counts.values())
+            return 0
+        return flushed
+
+    def start(self):
+        """Start the background flusher for the current process"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # Threads do not survive fork(); a preloaded app needs a new one per worker
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='play-count-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write out anything still buffered"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid() \
+                and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval)
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread is None or self._pid != os.getpid():
+            self.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if not self._stopping:
+                self.flush()
+
+    def _flush_via_spool(self, counts: Counter) -> int:
+        """Append our increments to the shared spool, then drain it if nobody else is"""
+        with open(self.spool_path, 'a+') as spool:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            try:
+                if counts:
+                    spool.write(''.join(f'{post_id} {plays}\n' for post_id, plays in counts.items()))
+                    spool.flush()
+            finally:
+                fcntl.flock(spool, fcntl.LOCK_UN)
+
+        drain_lock_path = f'{self.spool_path}.lock'
+        with open(drain_lock_path, 'w') as drain_lock:
+            try:
+                fcntl.flock(drain_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0  # Another worker is draining and will pick our lines up
+            try:
+                return self._drain_spool()
+            finally:
+                fcntl.flock(drain_lock, fcntl.LOCK_UN)
+
+    def _drain_spool(self) -> int:
+        with open(self.spool_path, 'r+') as spool:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            try:
+                lines = spool.read().splitlines()
+                spool.seek(0)
+                spool.truncate()
+            finally:
+                fcntl.flock(spool, fcntl.LOCK_UN)
+
+        totals: Counter = Counter()
+        for line in filter(None, lines):
+            post_id, plays = line.split()
+            totals[int(post_id)] += int(plays)
+        if not totals:
+            return 0
+
+        try:
+            self.flush_fn(dict(totals))
+        except Exception as e:
+            # Our own increments are already in `lines`, so hand them back to
+            # the spool rather than to the in-memory buffer
+            logger.error('Failed to flush spooled play counts: %s', e)
+            with open(self.spool_path, 'a') as spool:
+                fcntl.flock(spool, fcntl.LOCK_EX)
+                try:
+                    spool.write('\n'.join(lines) + '\n')
+                finally:
+                    fcntl.flock(spool, fcntl.LOCK_UN)
+            return 0
+        return sum(totals.values())
@@ -0,0 +1,171 @@
+"""On-demand profiling of a live worker.
+
+Two tools, both idle until asked for:
+
+* sample_stacks() records what every thread of this process is running,
+  every `interval` seconds for `duration` seconds, and returns the stacks
+  in the collapsed format flamegraph.pl and speedscope read
+  (``outer;inner;leaf count``). The sampler is a native OS thread even when
+  gevent has monkey-patched threading, so it keeps sampling while a
+  greenlet hogs the CPU, and the main thread's stack is whichever greenlet
+  is running at that moment. Greenlets that are parked waiting on I/O can
+  be added once at the end (``waiting=True``), rooted at ``[waiting]``.
+
+* RequestProfiler runs cProfile over a single request. Under gevent it
+  pauses whenever the request's greenlet switches out, so other requests
+  served meanwhile do not end up in its profile.
+
+Requests ask for a profile with a header signed by sign(), so only holders
+of the key can make a worker do the extra work.
+"""
+import cProfile
+import gc
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+try:
+    import greenlet
+except ImportError:  # not running under gevent
+    greenlet = None
+
+try:
+    from gevent.monkey import get_original
+    _start_native_thread = get_original('_thread', 'start_new_thread')
+    _native_sleep = get_original('time', 'sleep')
+except ImportError:
+    from _thread import start_new_thread as _start_native_thread
+    from time import sleep as _native_sleep
+
+MAX_DEPTH = 128
+
+
+def frame_label(code) -> str:
+    filename = code.co_filename
+    # Keep paths short: site-packages/flask/app.py -> flask/app.py
+    for marker in ('site-packages' + os.sep, os.getcwd() + os.sep):
+        index = filename.rfind(marker)
+        if index != -1:
+            filename = filename[index + len(marker):]
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def collapse(frame, root: str = '') -> str:
+    """'root;outermost;...;innermost' for the stack ending at `frame`"""
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        # Labels contain no ';', which separates frames in the collapsed format
+        names.append(frame_label(frame.f_code).replace(';', ':'))
+        frame = frame.f_back
+    if root:
+        names.append(root)
+    return ';'.join(reversed(names))
+
+
+def sample_stacks(duration: float, interval: float = 0.005, waiting: bool = False) -> Dict[str, int]:
+    """Collapsed stacks of this process's threads, sampled for `duration` seconds"""
+    counts: Counter = Counter()
+    finished = []
+    # With OS threads the caller only ever shows up waiting here; under
+    # gevent it shares the main thread with the greenlets being sampled
+    skip = {threading.get_ident()} if greenlet is None else set()
+
+    def sample():
+        try:
+            skip.add(threading.get_ident())
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident not in skip:
+                        counts[collapse(frame, names.get(ident, f'thread-{ident}'))] += 1
+                _native_sleep(interval)
+        finally:
+            finished.append(True)
+
+    _start_native_thread(sample, ())
+    # time.sleep() yields to other greenlets under gevent, so the worker
+    # keeps serving (and being sampled) meanwhile
+    while not finished:
+        time.sleep(0.05)
+    if waiting and greenlet is not None:
+        counts.update(waiting_greenlets())
+    return dict(counts)
+
+
+def waiting_greenlets() -> Dict[str, int]:
+    """Collapsed stacks of every greenlet parked in a switch (one scan of the heap)"""
+    counts: Counter = Counter()
+    for obj in gc.get_objects():
+        if isinstance(obj, greenlet.greenlet) and obj.gr_frame is not None and not obj.dead:
+            counts[collapse(obj.gr_frame, '[waiting]')] += 1
+    return dict(counts)
+
+
+def format_collapsed(counts: Dict[str, int]) -> str:
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+
+# Signed requests
+
+def sign(key: str, method: str, path: str, expires: int) -> str:
+    """Value for the profiling header that lets `method path` be profiled until `expires` (epoch seconds)"""
+    message = f'{expires}:{method.upper()}:{path}'.encode()
+    return f'{expires}:{hmac.new(key.encode(), message, hashlib.sha256).hexdigest()}'
+
+
+def verify(key: str, method: str, path: str, value: str, now: Optional[float] = None) -> bool:
+    expires, _, _ = value.partition(':')
+    if not expires.isdigit() or int(expires) < (time.time() if now is None else now):
+        return False
+    return hmac.compare_digest(value, sign(key, method, path, int(expires)))
+
+
+class RequestProfiler:
+    """cProfile over one request; call start() and stop() from the request's own thread or greenlet"""
+
+    # Only one profiler can be active per thread, and gevent serves every
+    # request of a worker on the same thread
+    _busy = threading.Lock()
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self._owner = None
+        self._previous_trace = None
+        self._running = False
+
+    def start(self) -> bool:
+        """Begin profiling; False if another request in this process is already being profiled"""
+        if not self._busy.acquire(blocking=False):
+            return False
+        self._running = True
+        if greenlet is not None:
+            self._owner = greenlet.getcurrent()
+            self._previous_trace = greenlet.settrace(self._trace)
+        self.profile.enable()
+        return True
+
+    def stop(self) -> cProfile.Profile:
+        if self._running:
+            self.profile.disable()
+            if greenlet is not None:
+                greenlet.settrace(self._previous_trace)
+            self._running = False
+            self._busy.release()
+        return self.profile
+
+    def _trace(self, event, args):
+        if event in ('switch', 'throw'):
+            origin, target = args
+            if origin is self._owner:
+                self.profile.disable()
+            elif target is self._owner:
+                self.profile.enable()
+        if self._previous_trace is not None:
+            self._previous_trace(event, args)
@@ -0,0 +1,33 @@
+"""Count SQL statements issued through a SQLAlchemy engine."""
+from typing import List
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """Context manager recording every statement executed on `engine`.
+
+        with QueryCounter(db.engine) as counter:
+            client.get('/')
+        assert counter.count <= 8, counter.statements
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        return False
@@ -0,0 +1,156 @@
+"""Sliding-window rate limits shared by every worker process on a host.
+
+Counters live in a fixed-size hash table in a memory-mapped file (on
+/dev/shm where available), so all gunicorn workers see the same counts
+without a network round trip. Each active key costs one 24-byte slot, and a
+slot whose key has seen no hits for two windows is stale and gets reused by
+the next key that probes it, so memory never grows with the number of
+distinct clients.
+
+Limits use the sliding-window counter approximation: the previous fixed
+window's count, weighted by how much of it still overlaps the sliding
+window, plus the current window's count.
+
+The table is split into stripes of STRIPE_SLOTS slots. A key probes only
+its own stripe, under an fcntl byte-range lock on that stripe (between
+processes) and a thread lock (within one). So workers only contend when
+they hit the same stripe.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import NamedTuple
+
+MAGIC = b'RLIM'
+VERSION = 1
+STRIPE_SLOTS = 64
+
+_HEADER = struct.Struct('<4sII')  # magic, version, slot count
+_SLOT = struct.Struct('<QIIII')  # key hash, window number, current, previous, expires at (epoch s)
+_HEADER_SIZE = 64
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # seconds until a request would be allowed again; 0 if allowed
+
+
+def key_hash(key: str) -> int:
+    # Stable across processes, unlike hash(); 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class SharedRateLimiter:
+    """Sliding-window counters in a table of `slots` entries backed by the file at `path`"""
+
+    def __init__(self, path: str, slots: int = 65536):
+        self.path = path
+        self.stripes = max(1, slots // STRIPE_SLOTS)
+        self.slots = self.stripes * STRIPE_SLOTS
+        size = _HEADER_SIZE + self.slots * _SLOT.size
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) < _HEADER.size or _HEADER.unpack(header) != (MAGIC, VERSION, self.slots):
+                # New file, or one laid out for a different table size: start empty
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(MAGIC, VERSION, self.slots), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._thread_lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, period: int, cost: int = 1, now: float = None) -> Decision:
+        """Count a request for `key` against `limit` per `period` seconds, unless over the limit"""
+        now = time.time() if now is None else now
+        window = int(now // period)
+        elapsed = now - window * period
+        h = key_hash(key)
+        stripe = h % self.stripes
+        first = _HEADER_SIZE + stripe * STRIPE_SLOTS * _SLOT.size
+        start = (h // self.stripes) % STRIPE_SLOTS
+
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                offset, current, previous = self._find(h, first, start, window, int(now))
+                estimate = previous * (period - elapsed) / period + current
+                allowed = estimate + cost <= limit
+                if allowed:
+                    current += cost
+                    estimate += cost
+                _SLOT.pack_into(self._map, offset, h, window, current, previous, (window + 2) * period)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+
+        if allowed:
+            return Decision(True, limit, max(int(limit - estimate), 0), 0.0)
+        # The previous window's weight shrinks linearly; find when enough has expired
+        excess = estimate + cost - limit
+        if previous and excess <= previous * (period - elapsed) / period:
+            retry_after = excess * period / previous
+        else:
+            retry_after = period - elapsed
+        return Decision(False, limit, 0, retry_after)
+
+    def _find(self, h, first, start, window, now):
+        """Offset and (current, previous) counts of the slot for `h`, claiming one if needed"""
+        reusable = None
+        oldest = None
+        for i in range(STRIPE_SLOTS):
+            offset = first + ((start + i) % STRIPE_SLOTS) * _SLOT.size
+            slot_hash, slot_window, current, previous, expires = _SLOT.unpack_from(self._map, offset)
+            if slot_hash == h:
+                if slot_window == window:
+                    return offset, current, previous
+                if slot_window == window - 1:
+                    return offset, 0, current
+                return offset, 0, 0
+            if slot_hash == 0:
+                # Keys are never removed, only overwritten, so the probe ends here
+                return (reusable if reusable is not None else offset), 0, 0
+            if reusable is None and expires <= now:
+                reusable = offset
+            if oldest is None or expires < oldest[0]:
+                oldest = (expires, offset)
+        if reusable is not None:
+            return reusable, 0, 0
+        # Stripe full of live keys: evict the one closest to expiring
+        return oldest[1], 0, 0
+
+    def reset(self, key: str):
+        """Forget `key`'s counts"""
+        h = key_hash(key)
+        stripe = h % self.stripes
+        first = _HEADER_SIZE + stripe * STRIPE_SLOTS * _SLOT.size
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                for i in range(STRIPE_SLOTS):
+                    offset = first + i * _SLOT.size
+                    if _SLOT.unpack_from(self._map, offset)[0] == h:
+                        # Keep the hash so later probes for other keys continue past this slot
+                        _SLOT.pack_into(self._map, offset, h, 0, 0, 0, 0)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+def parse_policy(policy: str):
+    """'10/minute' or '100/3600' -> (limit, period in seconds)"""
+    count, _, per = policy.partition('/')
+    periods = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+    period = periods.get(per.strip().rstrip('s'), None)
+    return int(count), period if period is not None else int(per)
@@ -0,0 +1,87 @@
+"""Single-flight reads behind a short-lived cache, invalidated per table.
+
+ReadCache.get(key, tables, fetch) returns a cached value for `key` when
+there is one, joins the fetch already in flight for `key` when there is
+one, and only otherwise awaits `fetch()` itself. So a burst of identical
+reads (a popular beat page) costs one request.
+
+Each entry remembers the version of every table it was read from.
+invalidate('beats') bumps the beats version, which makes every entry that
+read beats stale at once without scanning for them. A fetch that was
+already running when its tables changed still answers its waiters but is
+not cached, and reads that start after the change begin a fresh fetch
+instead of joining the old one.
+
+Values are shared between callers: treat them as read-only.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Sequence
+
+from services.ttl_cache import TTLCache
+
+
+class ReadCache:
+    def __init__(self, maxsize: int = 2048, ttl: float = 5.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._versions: Dict[str, int] = {}
+        # invalidate() is also called from realtime listener threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get(self, key: Hashable, tables: Sequence[str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        version = self._version(tables)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+
+        loop = asyncio.get_running_loop()
+        flight = (loop, key, version)
+        task = self._inflight.get(flight)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # A task of its own, so a caller that gets cancelled does not cancel the others' fetch
+            task = self._inflight[flight] = loop.create_task(self._fetch(key, tables, version, fetch))
+            task.add_done_callback(lambda done: self._finish(flight, done))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, tables, version, fetch):
+        value = await fetch()
+        if self._version(tables) == version:
+            self._cache.set(key, (version, value))
+        return value
+
+    def _finish(self, flight, task):
+        self._inflight.pop(flight, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here if every waiter was cancelled
+
+    def _version(self, tables: Sequence[str]) -> tuple:
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+    def invalidate(self, *tables: str):
+        """Make every cached read of `tables` stale"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'invalidations': self.invalidations,
+            'size': len(self._cache),
+        }
@@ -0,0 +1,118 @@
+"""Canonical beat pattern hashes and a size-bounded disk cache of renders.
+
+Two patterns that sound the same should hash the same, however the browser
+happened to serialize them. So hashing goes through beat_render's normalized
+form (only what affects the sound), plus the style, with dict keys sorted,
+booleans as 0/1 and floats rounded to FLOAT_DIGITS.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Dict
+
+from services.beat_render import normalize_beat
+
+FLOAT_DIGITS = 4
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float):
+        value = round(value, FLOAT_DIGITS)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def canonical_pattern(beat: Dict[str, Any]) -> str:
+    """Stable JSON for a pattern: same sound and style, same string"""
+    inner = beat.get('pattern') if isinstance(beat.get('pattern'), dict) else {}
+    spec = dict(normalize_beat(beat), style=beat.get('style') or inner.get('style'))
+    return json.dumps(_canonical(spec), sort_keys=True, separators=(',', ':'))
+
+
+def pattern_hash(beat: Dict[str, Any]) -> str:
+    return hashlib.sha256(canonical_pattern(beat).encode()).hexdigest()
+
+
+class RenderCache:
+    """Rendered files by key, evicting least recently used beyond `max_bytes`.
+
+    Recency is the file mtime, refreshed on every hit, so the cache survives
+    restarts and is shared by all workers using the same directory.
+    """
+
+    def __init__(self, root: str, max_bytes: int, suffix: str = '.wav'):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f'{key}{self.suffix}')
+
+    def copy_to(self, key: str, dest: str) -> bool:
+        """Copy the entry for `key` to `dest`; False on a miss.
+
+        The copy is read from the file opened here, so another worker
+        evicting the entry meanwhile cannot cut it short.
+        """
+        try:
+            source = open(self.path(key), 'rb')
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        with source, open(dest, 'wb') as target:
+            os.utime(source.fileno())
+            shutil.copyfileobj(source, target)
+        self.hits += 1
+        return True
+
+    def add(self, key: str, source: str) -> str:
+        """Copy `source` into the cache under `key` and evict down to the size limit"""
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(key)
+        partial = f'{path}.{uuid.uuid4().hex}.partial'
+        shutil.copyfile(source, partial)
+        os.replace(partial, path)
+        self.evict()
+        return path
+
+    def evict(self) -> int:
+        """Delete least recently used entries until the cache fits; returns how many"""
+        with self._lock:
+            entries = []
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.name.endswith(self.suffix):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,127 @@
+"""Full-text search over users and posts backed by SQLite FTS5.
+
+The FTS tables are external-content indexes over the existing ``user`` and
+``post`` tables and are kept current by triggers, so every insert, update or
+delete re-indexes just the affected row. Triggers only fire for the
+searchable columns; counter and play-count updates never touch the index.
+
+Other databases do not get the FTS tables; `available()` returns False and
+callers fall back to plain LIKE matching. The Supabase schema has its own
+tsvector/GIN equivalent in migrations/versions/005_search.sql.
+"""
+import re
+from typing import List, Optional, Sequence
+
+from sqlalchemy import text
+
+# name -> (content table, indexed columns, bm25 column weights)
+INDEXES = {
+    'user_fts': ('user', ('username', 'genre', 'instrument'), (10.0, 3.0, 3.0)),
+    'post_fts': ('post', ('title', 'description', 'style'), (10.0, 1.0, 4.0)),
+}
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def _ddl(name: str) -> List[str]:
+    table, columns, weights = INDEXES[name]
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+
+        f'CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_values}); END',
+
+        f'CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON "{table}" BEGIN '
+        f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+
+        f'CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {cols} ON "{table}" BEGIN '
+        f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_values}); END',
+
+        # Stored in the index, so ORDER BY rank scores with these weights
+        f"INSERT INTO {name}({name}, rank) VALUES ('rank', 'bm25({', '.join(str(weight) for weight in weights)})')",
+    ]
+
+
+def available(engine) -> bool:
+    """True when the engine is SQLite with the FTS5 module compiled in"""
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect() as conn:
+        options = {row[0] for row in conn.exec_driver_sql('PRAGMA compile_options')}
+    return 'ENABLE_FTS5' in options
+
+
+def install(engine) -> List[str]:
+    """Create missing FTS tables and triggers; returns the indexes built from scratch"""
+    if not available(engine):
+        return []
+
+    built = []
+    with engine.begin() as conn:
+        existing = {row[0] for row in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )}
+        for name in INDEXES:
+            for statement in _ddl(name):
+                conn.exec_driver_sql(statement)
+            if name not in existing:
+                # Index rows that were written before the triggers existed
+                conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+                built.append(name)
+    return built
+
+
+def match_expression(query: str, column: Optional[str] = None) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression with prefix matching.
+
+    Every word must match (implicit AND) and is matched as a prefix, so
+    "tech hou" finds "techno house". Quoting each token keeps user input from
+    being parsed as FTS5 query syntax.
+    """
+    tokens = _TOKEN.findall(query.lower())
+    if not tokens:
+        return None
+    expression = ' '.join(f'"{token}"*' for token in tokens)
+    if column:
+        expression = f'{column} : ({expression})'
+    return expression
+
+
+def search_ids(session, index: str, query: str, column: Optional[str] = None,
+               limit: int = 20, offset: int = 0, window: Optional[int] = None) -> List[int]:
+    """Return matching row ids for `index`, best bm25 rank first.
+
+    Every match is ranked. Pass `window` to rank only the newest `window`
+    matches instead: cheaper for very broad queries, but older matches,
+    however good, are then never returned.
+    """
+    _, columns, _ = INDEXES[index]
+    if column is not None and column not in columns:
+        raise ValueError(f'{column!r} is not indexed in {index}')
+    expression = match_expression(query, column)
+    if expression is None:
+        return []
+
+    params = {'expression': expression, 'limit': limit, 'offset': offset}
+    if window is None:
+        statement = (f'SELECT rowid FROM {index} WHERE {index} MATCH :expression '
+                     f'ORDER BY rank LIMIT :limit OFFSET :offset')
+    else:
+        statement = (f'SELECT rowid FROM ('
+                     f'SELECT rowid, rank FROM {index} WHERE {index} MATCH :expression '
+                     f'ORDER BY rowid DESC LIMIT :window'
+                     f') ORDER BY rank LIMIT :limit OFFSET :offset')
+        params['window'] = max(window, offset + limit)
+    return [row[0] for row in session.execute(text(statement), params)]
+
+
+def in_order(rows: Sequence, ids: Sequence[int]) -> list:
+    """Reorder ORM rows loaded with `IN (ids)` to match the ranked id list"""
+    by_id = {row.id: row for row in rows}
+    return [by_id[row_id] for row_id in ids if row_id in by_id]
@@ -0,0 +1,61 @@
+"""Audio probing and normalization via ffmpeg.
+
+Uploads arrive in whatever format the user had (WAV, M4A, OGG, ...). They are
+re-encoded to constant-bitrate MP3, which every browser can stream and seek
+without downloading the whole file first. ffmpeg/ffprobe run as subprocesses;
+when they are not installed the original file is kept as-is and only what
+the standard library can read (WAV headers) is probed.
+"""
+import json
+import logging
+import shutil
+import subprocess
+import wave
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_EXTENSION = 'mp3'
+SAMPLE_RATE = 44100
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which('ffmpeg') is not None and shutil.which('ffprobe') is not None
+
+
+def probe(path: str) -> Dict[str, Optional[float]]:
+    """Return {'duration': seconds, 'bitrate': kbps} for an audio file; unknowns are None"""
+    if shutil.which('ffprobe'):
+        try:
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', path],
+                capture_output=True, check=True, timeout=60
+            )
+            fmt = json.loads(result.stdout).get('format', {})
+            duration = float(fmt['duration']) if fmt.get('duration') else None
+            bitrate = int(fmt['bit_rate']) // 1000 if fmt.get('bit_rate') else None
+            return {'duration': duration, 'bitrate': bitrate}
+        except (subprocess.SubprocessError, ValueError, KeyError) as e:
+            logger.warning('ffprobe failed for %s: %s', path, e)
+
+    try:
+        with wave.open(path, 'rb') as wav:
+            frames, rate = wav.getnframes(), wav.getframerate()
+            bits = rate * wav.getsampwidth() * 8 * wav.getnchannels()
+            return {'duration': frames / rate if rate else None, 'bitrate': bits // 1000}
+    except (wave.Error, EOFError, OSError):
+        return {'duration': None, 'bitrate': None}
+
+
+def normalize(source: str, destination: str, bitrate: str = '192k') -> bool:
+    """Re-encode `source` to CBR MP3 at `destination`; False if ffmpeg is unavailable"""
+    if not shutil.which('ffmpeg'):
+        return False
+    subprocess.run(
+        ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', source,
+         '-vn', '-map_metadata', '-1',
+         '-codec:a', 'libmp3lame', '-b:a', bitrate, '-ar', str(SAMPLE_RATE),
+         destination],
+        capture_output=True, check=True, timeout=600
+    )
+    return True
@@ -0,0 +1,170 @@
+"""Resumable, chunked uploads streamed straight to disk.
+
+Each upload gets an id, a ``<id>.part`` file that chunks are appended to and
+a ``<id>.json`` sidecar with its metadata. Chunks are copied from the request
+stream in fixed-size blocks, so memory use does not depend on file size, and
+the SHA-256 of the content is computed as the bytes go by. A client whose
+connection drops asks for the current offset and resumes from there.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised for chunks that do not fit the upload they are sent to"""
+
+
+class UploadNotFound(UploadError):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the upload currently ends"""
+
+    def __init__(self, offset: int, expected: int):
+        super().__init__(f'Chunk starts at {offset} but upload is at {expected}')
+        self.expected = expected
+
+
+class ChunkedUploadStore:
+    def __init__(self, root: str, max_size: int):
+        self.root = root
+        self.max_size = max_size
+        os.makedirs(root, exist_ok=True)
+        # upload id -> (running hash, bytes hashed) for uploads this process
+        # has seen; when another worker appended in between, the part file
+        # is re-hashed from disk instead
+        self._hashes: Dict[str, Tuple[Any, int]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        if not upload_id.isalnum():
+            raise UploadNotFound('Invalid upload id')
+        return os.path.join(self.root, f'{upload_id}.{suffix}')
+
+    def create(self, filename: str, size: int, owner_id: int, **metadata) -> str:
+        if size <= 0 or size > self.max_size:
+            raise UploadError(f'Upload size must be between 1 and {self.max_size} bytes')
+        upload_id = uuid.uuid4().hex
+        meta = dict(metadata, filename=filename, size=size, owner_id=owner_id)
+        with open(self._path(upload_id, 'json'), 'w') as f:
+            json.dump(meta, f)
+        open(self._path(upload_id, 'part'), 'wb').close()
+        with self._lock:
+            self._hashes[upload_id] = (hashlib.sha256(), 0)
+        return upload_id
+
+    def meta(self, upload_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._path(upload_id, 'json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFound('Upload not found')
+
+    def offset(self, upload_id: str) -> int:
+        try:
+            return os.path.getsize(self._path(upload_id, 'part'))
+        except FileNotFoundError:
+            raise UploadNotFound('Upload not found')
+
+    def append(self, upload_id: str, offset: int, stream: BinaryIO,
+               length: Optional[int] = None) -> int:
+        """Copy a chunk from `stream` to the end of the upload; returns the new offset"""
+        meta = self.meta(upload_id)
+        written = 0
+        with open(self._path(upload_id, 'part'), 'ab') as part:
+            # Two requests racing on one upload must not interleave their bytes
+            fcntl.flock(part, fcntl.LOCK_EX)
+            try:
+                current = part.seek(0, os.SEEK_END)
+                if offset != current:
+                    raise OffsetMismatch(offset, current)
+                digest = self._running_hash(upload_id, current)
+                while True:
+                    want = BLOCK_SIZE if length is None else min(BLOCK_SIZE, length - written)
+                    if want <= 0:
+                        break
+                    block = stream.read(want)
+                    if not block:
+                        break
+                    if current + written + len(block) > meta['size']:
+                        raise UploadError('Chunk runs past the declared upload size')
+                    part.write(block)
+                    digest.update(block)
+                    written += len(block)
+                part.flush()
+                # If the chunk broke off midway this is never stored, and the
+                # length mismatch makes the next append re-hash from disk
+                with self._lock:
+                    self._hashes[upload_id] = (digest, current + written)
+            finally:
+                fcntl.flock(part, fcntl.LOCK_UN)
+        return current + written
+
+    def complete(self, upload_id: str) -> Dict[str, Any]:
+        """Verify the upload is whole; returns its metadata plus path and sha256"""
+        meta = self.meta(upload_id)
+        size = self.offset(upload_id)
+        if size != meta['size']:
+            raise UploadError(f'Upload incomplete: {size} of {meta["size"]} bytes received')
+        digest = self._running_hash(upload_id, size)
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+        os.remove(self._path(upload_id, 'json'))
+        return dict(meta, path=self._path(upload_id, 'part'), sha256=digest.hexdigest())
+
+    def discard(self, upload_id: str):
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+        for suffix in ('part', 'json'):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def purge(self, max_age: float) -> int:
+        """Discard uploads with no new chunk in `max_age` seconds; returns how many"""
+        cutoff = time.time() - max_age
+        purged = 0
+        for name in os.listdir(self.root):
+            upload_id, _, suffix = name.partition('.')
+            if suffix != 'json':
+                continue
+            try:
+                last_write = os.path.getmtime(self._path(upload_id, 'part'))
+            except (FileNotFoundError, UploadError):
+                last_write = 0
+            if last_write < cutoff:
+                self.discard(upload_id)
+                purged += 1
+        return purged
+
+    def _running_hash(self, upload_id: str, length: int):
+        """SHA-256 state covering the first `length` bytes of the part file"""
+        with self._lock:
+            digest, hashed = self._hashes.get(upload_id, (None, 0))
+        if digest is None or hashed != length:
+            # Another worker appended since we last saw this upload, or a chunk broke off
+            digest = hashlib.sha256()
+            with open(self._path(upload_id, 'part'), 'rb') as part:
+                for block in iter(lambda: part.read(BLOCK_SIZE), b''):
+                    digest.update(block)
+        return digest.copy()
+
+
+def save_stream(stream: BinaryIO, path: str) -> str:
+    """Copy a file-like object to `path` in blocks and return its SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for block in iter(lambda: stream.read(BLOCK_SIZE), b''):
+            out.write(block)
+            digest.update(block)
+    return digest.hexdigest()
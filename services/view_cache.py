@@ -0,0 +1,91 @@
+"""Versioned page and fragment caching on top of Flask-Caching.
+
+Cached entries are keyed by the current version of every scope they depend
+on (for example ``user:3`` or ``post:17``). Invalidating a scope just bumps
+its version, so stale entries are never served again and simply age out of
+the backend. This works the same on every backend, including shared ones
+(filesystem, Redis) where deleting by prefix is not possible.
+
+Versions must outlive the entries keyed by them: one that is evicted falls
+back to 0 and matches pages cached before its first bump again. Keep them
+in a separate ``versions`` cache that never expires or prunes keys. Bumps
+use its inc(), which is atomic on Redis; give ``lock_path`` for backends
+where it is a get then set (filesystem), so concurrent bumps from several
+workers are not lost.
+"""
+import fcntl
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Optional
+
+
+class ViewCache:
+    def __init__(self, cache, versions=None, lock_path: Optional[str] = None,
+                 prefix: str = 'view', default_timeout: int = 300):
+        self.cache = cache
+        self.versions_cache = versions if versions is not None else cache
+        self.lock_path = lock_path
+        self.prefix = prefix
+        self.default_timeout = default_timeout
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+
+    def _version_key(self, scope: str) -> str:
+        return f'{self.prefix}:version:{scope}'
+
+    def versions(self, scopes: Iterable[str]) -> Dict[str, int]:
+        scopes = list(scopes)
+        if not scopes:
+            return {}
+        values = self.versions_cache.get_many(*[self._version_key(scope) for scope in scopes])
+        return {scope: value or 0 for scope, value in zip(scopes, values)}
+
+    def key(self, name: str, scopes: Iterable[str] = (), variant: str = '') -> str:
+        versions = self.versions(scopes)
+        stamp = ','.join(f'{scope}@{version}' for scope, version in sorted(versions.items()))
+        return f'{self.prefix}:{name}:{variant}:{stamp}'
+
+    def get_or_render(self, name: str, render: Callable[[], str], scopes: Iterable[str] = (),
+                      variant: str = '', timeout: Optional[int] = None) -> str:
+        """Return the cached fragment for `name`, rendering and storing it on a miss"""
+        key = self.key(name, scopes, variant)
+        value = self.cache.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        self._count('misses')
+        value = render()
+        self.cache.set(key, value, timeout=timeout or self.default_timeout)
+        return value
+
+    def invalidate(self, *scopes: str):
+        """Bump the version of each scope so dependent entries stop matching"""
+        for scope in set(scopes):
+            with self._bump_lock():
+                # Flask-Caching's Cache does not pass inc() through; its backend has it
+                self.versions_cache.cache.inc(self._version_key(scope))
+        self._count('invalidations', len(set(scopes)))
+
+    def _bump_lock(self):
+        return self._file_lock() if self.lock_path else nullcontext()
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
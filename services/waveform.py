@@ -0,0 +1,218 @@
+"""Waveform peaks, precomputed on the server.
+
+Players only need the min/max of each slice of samples to draw a waveform,
+so instead of every client downloading and decoding whole tracks we decode
+once, streaming, and reduce blocks of samples with vectorized NumPy min/max.
+Several zoom levels are kept (each 4x coarser than the last) and quantized to
+int8 or int16, which is a few tens of KB for a typical track.
+
+Binary layout (little-endian), served as-is by the peaks endpoint::
+
+    magic "WFPK", u8 version, u8 bits (8|16), u8 level count, u8 pad,
+    u32 sample rate
+    per level: u32 samples per peak, u32 peak count
+    per level: count (min, max) pairs as int8/int16
+
+Decoding goes through ffmpeg, which is required for anything but WAV.
+"""
+import base64
+import os
+import shutil
+import struct
+import subprocess
+import wave
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b'WFPK'
+VERSION = 1
+DECODE_RATE = 22050  # plenty for drawing; halves the decode work vs 44.1kHz
+BASE_SAMPLES_PER_PEAK = 256  # ~86 peaks per second at DECODE_RATE
+ZOOM_FACTORS = (1, 4, 16, 64)
+BLOCK_FRAMES = 1 << 16
+
+_HEADER = struct.Struct('<4sBBBxI')
+_LEVEL = struct.Struct('<II')
+
+Level = Tuple[int, np.ndarray, np.ndarray]  # samples per peak, mins, maxs
+
+
+def decode(path: str) -> Tuple[int, Iterator[np.ndarray]]:
+    """Return (sample rate, iterator of mono int16 sample blocks) for an audio file"""
+    if shutil.which('ffmpeg'):
+        return DECODE_RATE, _decode_ffmpeg(path)
+    return _decode_wav(path)
+
+
+def _decode_ffmpeg(path: str) -> Iterator[np.ndarray]:
+    process = subprocess.Popen(
+        ['ffmpeg', '-nostdin', '-v', 'error', '-i', path,
+         '-f', 's16le', '-ac', '1', '-ar', str(DECODE_RATE), '-'],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            chunk = process.stdout.read(BLOCK_FRAMES * 2)
+            if not chunk:
+                break
+            if len(chunk) % 2:
+                chunk += process.stdout.read(1)
+            yield np.frombuffer(chunk, dtype='<i2')
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise ValueError(f'ffmpeg could not decode {path}')
+
+
+def _decode_wav(path: str) -> Tuple[int, Iterator[np.ndarray]]:
+    wav = wave.open(path, 'rb')  # raises wave.Error for anything that is not WAV
+    width, channels = wav.getsampwidth(), wav.getnchannels()
+    if width not in (1, 2, 4):
+        wav.close()
+        raise ValueError(f'Unsupported WAV sample width: {width * 8} bits')
+
+    def blocks():
+        with wav:
+            while True:
+                frames = wav.readframes(BLOCK_FRAMES)
+                if not frames:
+                    break
+                if width == 1:
+                    samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.int16) - 128) << 8
+                elif width == 2:
+                    samples = np.frombuffer(frames, dtype='<i2')
+                else:
+                    samples = (np.frombuffer(frames, dtype='<i4') >> 16).astype(np.int16)
+                if channels > 1:
+                    samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+                yield samples
+
+    return wav.getframerate(), blocks()
+
+
+class PeakReducer:
+    """Streaming min/max reduction over fixed-size groups of samples"""
+
+    def __init__(self, samples_per_peak: int):
+        self.samples_per_peak = samples_per_peak
+        self._carry = np.empty(0, dtype=np.int16)
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+
+    def feed(self, samples: np.ndarray):
+        if len(self._carry):
+            samples = np.concatenate((self._carry, samples))
+        whole = len(samples) - len(samples) % self.samples_per_peak
+        if whole:
+            groups = samples[:whole].reshape(-1, self.samples_per_peak)
+            self._mins.append(groups.min(axis=1))
+            self._maxs.append(groups.max(axis=1))
+        self._carry = samples[whole:].copy()
+
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self._carry):
+            self._mins.append(self._carry.min(keepdims=True))
+            self._maxs.append(self._carry.max(keepdims=True))
+            self._carry = self._carry[:0]
+        if not self._mins:
+            return np.zeros(0, np.int16), np.zeros(0, np.int16)
+        return np.concatenate(self._mins), np.concatenate(self._maxs)
+
+
+def _downsample(mins: np.ndarray, maxs: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    if factor == 1 or not len(mins):
+        return mins, maxs
+    pad = -len(mins) % factor
+    if pad:
+        # Repeating the last peak leaves the partial group's min/max unchanged
+        mins = np.concatenate((mins, np.repeat(mins[-1:], pad)))
+        maxs = np.concatenate((maxs, np.repeat(maxs[-1:], pad)))
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def compute_peaks(path: str) -> Tuple[int, List[Level]]:
+    """Decode `path` once and return (sample rate, [(samples per peak, mins, maxs), ...])"""
+    sample_rate, blocks = decode(path)
+    reducer = PeakReducer(BASE_SAMPLES_PER_PEAK)
+    for block in blocks:
+        reducer.feed(block)
+    mins, maxs = reducer.finish()
+    levels = []
+    for factor in ZOOM_FACTORS:
+        level_mins, level_maxs = _downsample(mins, maxs, factor)
+        levels.append((BASE_SAMPLES_PER_PEAK * factor, level_mins, level_maxs))
+    return sample_rate, levels
+
+
+def _quantize(values: np.ndarray, bits: int) -> np.ndarray:
+    return (values >> 8).astype(np.int8) if bits == 8 else values.astype('<i2')
+
+
+def encode_peaks(sample_rate: int, levels: List[Level], bits: int = 8) -> bytes:
+    if bits not in (8, 16):
+        raise ValueError('bits must be 8 or 16')
+    parts = [_HEADER.pack(MAGIC, VERSION, bits, len(levels), sample_rate)]
+    parts += [_LEVEL.pack(samples_per_peak, len(mins)) for samples_per_peak, mins, _ in levels]
+    for _, mins, maxs in levels:
+        pairs = np.empty(len(mins) * 2, dtype=np.int8 if bits == 8 else '<i2')
+        pairs[0::2] = _quantize(mins, bits)
+        pairs[1::2] = _quantize(maxs, bits)
+        parts.append(pairs.tobytes())
+    return b''.join(parts)
+
+
+def decode_peaks(data: bytes) -> Dict:
+    """Parse encode_peaks() output into {'bits', 'sample_rate', 'levels': [...]}"""
+    magic, version, bits, count, sample_rate = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a peaks file')
+    offset = _HEADER.size
+    shapes = []
+    for _ in range(count):
+        shapes.append(_LEVEL.unpack_from(data, offset))
+        offset += _LEVEL.size
+    dtype = np.int8 if bits == 8 else '<i2'
+    levels = []
+    for samples_per_peak, length in shapes:
+        pairs = np.frombuffer(data, dtype=dtype, count=length * 2, offset=offset)
+        offset += pairs.nbytes
+        levels.append({'samples_per_peak': samples_per_peak, 'length': length, 'data': pairs})
+    return {'bits': bits, 'sample_rate': sample_rate, 'levels': levels}
+
+
+def peaks_to_json(data: bytes) -> Dict:
+    """JSON-safe form for a jsonb column: the same int arrays, base64-encoded"""
+    peaks = decode_peaks(data)
+    return {
+        'format': 'wfpk',
+        'version': VERSION,
+        'bits': peaks['bits'],
+        'sample_rate': peaks['sample_rate'],
+        'levels': [
+            {'samples_per_peak': level['samples_per_peak'], 'length': level['length'],
+             'data': base64.b64encode(level['data'].tobytes()).decode('ascii')}
+            for level in peaks['levels']
+        ],
+    }
+
+
+def peaks_path(audio_path: str) -> str:
+    return f'{audio_path}.peaks'
+
+
+def write_peaks(audio_path: str, bits: int = 8) -> Optional[str]:
+    """Compute and store the peaks file next to `audio_path`; None if it cannot be decoded.
+
+    A top-level function so it can run in a process pool.
+    """
+    try:
+        sample_rate, levels = compute_peaks(audio_path)
+    except (ValueError, wave.Error, EOFError, OSError):
+        return None
+    target = peaks_path(audio_path)
+    partial = f'{target}.{os.getpid()}.partial'
+    with open(partial, 'wb') as f:
+        f.write(encode_peaks(sample_rate, levels, bits))
+    os.replace(partial, target)
+    return target
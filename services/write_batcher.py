@@ -0,0 +1,79 @@
+"""Coalesce single-row writes from concurrent callers into multi-row requests.
+
+Callers submit(key, row) and await the result for their row. Rows with the
+same key that arrive within `window` seconds of the first one (or until
+`max_batch` rows have queued) are handed to `send(key, rows)` together,
+which makes one request for all of them and returns one result per row,
+in order. The key says what kind of write it is, e.g. ('likes', 'beat_id,user_id').
+
+When a batch fails and `isolate(error)` says the error may be down to one
+bad row (a constraint violation rather than an outage), its rows are
+resent one by one, so one bad row fails only its own caller.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+Send = Callable[[Hashable, List[Any]], Awaitable[List[Any]]]
+
+
+class WriteBatcher:
+    def __init__(self, send: Send, window: float = 0.005, max_batch: int = 500,
+                 isolate: Optional[Callable[[BaseException], bool]] = None):
+        self.send = send
+        self.window = window
+        self.max_batch = max_batch
+        self.isolate = isolate or (lambda error: True)
+        self._pending: Dict[tuple, List[tuple]] = {}  # (loop, key) -> [(row, future)]
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, key: Hashable, row: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        slot = (loop, key)
+        future = loop.create_future()
+        pending = self._pending.get(slot)
+        if pending is None:
+            pending = self._pending[slot] = []
+            loop.call_later(self.window, self._flush, slot, pending)
+        pending.append((row, future))
+        if len(pending) >= self.max_batch:
+            self._flush(slot, pending)
+        # The batch is sent by its own task, so a cancelled caller leaves the others' write alone
+        return await asyncio.shield(future)
+
+    def _flush(self, slot, pending):
+        if self._pending.get(slot) is not pending:
+            return  # already sent (max_batch reached before the timer fired)
+        del self._pending[slot]
+        slot[0].create_task(self._send(slot[1], pending))
+
+    async def _send(self, key, pending):
+        rows = [row for row, _ in pending]
+        self.batches += 1
+        self.rows += len(rows)
+        try:
+            results = await self.send(key, rows)
+            if len(results) != len(rows):
+                raise RuntimeError(f'send() returned {len(results)} results for {len(rows)} rows')
+        except Exception as e:
+            if len(rows) > 1 and self.isolate(e):
+                await asyncio.gather(*(self._send(key, [item]) for item in pending))
+            else:
+                for _, future in pending:
+                    _settle(future, error=e)
+            return
+        for (_, future), result in zip(pending, results):
+            _settle(future, result)
+
+    def stats(self) -> Dict[str, float]:
+        return {'batches': self.batches, 'rows': self.rows,
+                'rows_per_batch': self.rows / self.batches if self.batches else 0.0}
+
+
+def _settle(future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None):
+    if future.done():  # shield()ed away by a cancelled caller
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
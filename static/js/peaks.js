@@ -0,0 +1,47 @@
+// Precomputed waveform peaks (see services/waveform.py for the format), so
+// players can draw a track without downloading and decoding all of it
+
+// Resolves to WaveSurfer-style interleaved [max, min, ...] floats for the
+// coarsest zoom level that still has at least `width` peaks, or null
+async function fetchPeaks(url, width) {
+    const response = await fetch(url);
+    if (!response.ok) return null;
+    const buffer = await response.arrayBuffer();
+    const view = new DataView(buffer);
+    if (String.fromCharCode(...new Uint8Array(buffer, 0, 4)) !== 'WFPK') return null;
+
+    const bits = view.getUint8(5);
+    const levelCount = view.getUint8(6);
+    const levels = [];
+    let offset = 12;
+    for (let i = 0; i < levelCount; i++) {
+        levels.push({length: view.getUint32(offset + 4, true)});
+        offset += 8;
+    }
+    const bytesPerValue = bits / 8;
+    for (const level of levels) {
+        level.offset = offset;
+        offset += level.length * 2 * bytesPerValue;
+    }
+
+    const level = levels.slice().reverse().find(l => l.length >= width) || levels[0];
+    if (!level || !level.length) return null;
+    const Values = bits === 8 ? Int8Array : Int16Array;
+    // Int16Array needs an aligned offset; slice() copies into a fresh buffer
+    const pairs = new Values(buffer.slice(level.offset, level.offset + level.length * 2 * bytesPerValue));
+    const scale = bits === 8 ? 128 : 32768;
+    const peaks = new Float32Array(pairs.length);
+    for (let i = 0; i < pairs.length; i += 2) {
+        peaks[i] = pairs[i + 1] / scale;  // max
+        peaks[i + 1] = pairs[i] / scale;  // min
+    }
+    return Array.from(peaks);
+}
+
+// Load a WaveSurfer (MediaElement backend) with server peaks when they exist;
+// without them WaveSurfer downloads and decodes the track itself
+function loadWithPeaks(wavesurfer, container) {
+    fetchPeaks(container.dataset.peaks, container.clientWidth)
+        .catch(() => null)
+        .then(peaks => wavesurfer.load(container.dataset.src, peaks || undefined));
+}